@@ -0,0 +1,493 @@
+"""Classes base da API REST (Django Rest Framework) utilizadas pelas views geradas pelo build.
+
+O BaseModelViewSet aceita listas de registros no create (POST) e no endpoint bulk (PUT/PATCH),
+gravados em lote (bulk_create e UPDATE com executemany) em uma única transação. Cada item é validado pelo
+serializer da view e os erros são retornados com o índice do item na lista, ex:
+
+    {"results": [{"index": 0, "id": "..."}], "errors": [{"index": 1, "errors": {"nome": ["..."]}}]}
+
+Os campos retornados podem ser escolhidos com ?fields=a,b&expand=fk (ver core/serializers.py) e os
+relacionamentos utilizados pelo serializer são carregados com select_related e prefetch_related.
+O list e o retrieve possuem ETag e respondem 304 quando os registros não foram alterados
+(If-None-Match). O endpoint sync (GET) devolve apenas os registros alterados e excluídos desde a última sincronização
+(ver core/sync.py), utilizado pelos clientes offline.
+"""
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError as DjangoValidationError
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied, ValidationError
+from rest_framework.pagination import _positive_int
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.viewsets import ModelViewSet
+
+from .cache import bump_model_version, get_versions_key
+from .search import update_generic_search_texts, update_search_documents
+from .serializers import get_field_selection, narrow_queryset, select_related_fields
+from .settings import use_default_manager
+from .sync import InvalidSyncCursor, get_sync_page, parse_since
+
+
+class CachedRelatedQuerySet(object):
+    """Substitui a queryset dos PrimaryKeyRelatedField durante a validação de uma lista de itens,
+    os registros relacionados são recuperados com uma única consulta (in_bulk) ao invés de
+    uma consulta por item
+    """
+
+    def __init__(self, model, objects):
+        self.model = model
+        self.objects = objects
+
+    def all(self):
+        return self
+
+    def get(self, **kwargs):
+        value = next(iter(kwargs.values()))
+        try:
+            value = self.model._meta.pk.to_python(value)
+        except Exception:
+            # o PrimaryKeyRelatedField retorna o erro incorrect_type
+            raise ValueError(value)
+        if value not in self.objects:
+            raise self.model.DoesNotExist()
+        return self.objects[value]
+
+
+def _related_ids(model, values):
+    ids = set()
+    for value in values:
+        try:
+            ids.add(model._meta.pk.to_python(value))
+        except Exception:
+            continue
+    return ids
+
+
+def prefetch_related_fields(serializer, items):
+    """Carrega em uma consulta por campo os registros relacionados (ForeignKey e ManyToMany)
+    informados em todos os itens, substituindo a queryset dos campos do serializer
+
+    Arguments:
+        serializer {ModelSerializer} -- Serializer utilizado na validação dos itens
+        items {List} -- Itens recebidos na requisição
+    """
+    for name, field in serializer.fields.items():
+        if field.read_only:
+            continue
+        many = isinstance(field, ManyRelatedField)
+        relation = field.child_relation if many else field
+        if not isinstance(relation, PrimaryKeyRelatedField) or relation.queryset is None:
+            continue
+        if isinstance(relation.queryset, CachedRelatedQuerySet):
+            continue
+        values = []
+        for item in items:
+            value = item.get(field.field_name) if isinstance(item, dict) else None
+            if many and isinstance(value, (list, tuple)):
+                values.extend(value)
+            elif value is not None and not many:
+                values.append(value)
+        queryset = relation.get_queryset()
+        objects = queryset.in_bulk(list(_related_ids(queryset.model, values))) if values else {}
+        relation.queryset = CachedRelatedQuerySet(queryset.model, objects)
+
+
+def get_batch_size(model, objects, batch_size):
+    """Limita o batch_size ao máximo aceito pelo banco, o bulk_create (Django 3.0) não faz essa
+    limitação quando o batch_size é informado (ex: SQLite aceita 999 parâmetros por comando)
+    """
+    connection = connections[model._default_manager.db]
+    fields = [field for field in model._meta.concrete_fields]
+    return max(min(batch_size, connection.ops.bulk_batch_size(fields, objects)), 1)
+
+
+def bulk_update_rows(model, objects, fields, batch_size):
+    """Altera os campos informados de todos os registros com um UPDATE parametrizado executado
+    em lote (executemany), o bulk_update do Django monta um CASE WHEN por campo e registro
+    que fica mais lento que a própria gravação em listas grandes. Os campos herdados de outro
+    model (herança multi-tabela) são alterados na tabela do model em que foram declarados
+
+    Arguments:
+        model {Model} -- Classe do model
+        objects {List} -- Registros com os valores já alterados
+        fields {List} -- Nomes dos campos alterados
+        batch_size {int} -- Quantidade de registros enviados por vez
+    """
+    connection = connections[model._default_manager.db]
+    quote = connection.ops.quote_name
+    # campos agrupados pela tabela, ex: {Model: [campos], ModelPai: [campos herdados]}
+    tabelas = {}
+    for name in fields:
+        campo = model._meta.get_field(name)
+        if campo.primary_key:
+            continue
+        tabelas.setdefault(campo.model._meta.concrete_model, []).append(campo)
+    with connection.cursor() as cursor:
+        for tabela, campos in tabelas.items():
+            pk = tabela._meta.pk
+            sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+                quote(tabela._meta.db_table), ', '.join('{} = %s'.format(quote(campo.column)) for campo in campos),
+                quote(pk.column))
+            for first in range(0, len(objects), batch_size):
+                cursor.executemany(sql, [
+                    [campo.get_db_prep_save(getattr(obj, campo.attname), connection) for campo in campos] +
+                    [pk.get_db_prep_save(getattr(obj, pk.attname), connection)]
+                    for obj in objects[first:first + batch_size]])
+
+
+def split_many_to_many(model, validated_data):
+    """Separa os campos ManyToMany dos dados validados, gravados após o bulk_create/bulk_update"""
+    many = {}
+    for name in list(validated_data):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.many_to_many and field.concrete:
+            many[name] = validated_data.pop(name)
+    return many
+
+
+def set_many_to_many(model, objects, many_values, batch_size, replace=False):
+    """Grava os ManyToMany de todos os registros com um bulk_create por campo na tabela intermediária
+
+    Arguments:
+        model {Model} -- Classe do model
+        objects {List} -- Registros gravados
+        many_values {List} -- Dicionário {campo: [registros relacionados]} de cada registro
+
+    Keyword Arguments:
+        batch_size {int} -- Quantidade de linhas gravadas por vez
+        replace {Bool} -- Remove os relacionamentos existentes dos campos informados (default: {False})
+    """
+    names = {name for values in many_values for name in values}
+    for name in names:
+        field = model._meta.get_field(name)
+        through = field.remote_field.through
+        source = '{}_id'.format(field.m2m_field_name())
+        target = '{}_id'.format(field.m2m_reverse_field_name())
+        pks = [obj.pk for obj, values in zip(objects, many_values) if name in values]
+        if replace and pks:
+            through._default_manager.filter(**{'{}__in'.format(source): pks}).delete()
+        rows = [through(**{source: obj.pk, target: related.pk})
+                for obj, values in zip(objects, many_values) if name in values
+                for related in values[name]]
+        through._default_manager.bulk_create(rows, batch_size=get_batch_size(through, rows, batch_size))
+
+
+def after_bulk_save(model, objects, batch_size):
+    """Executa o que o Base.save() faria para os registros, o bulk_create/bulk_update não chama o save().
+    Os documentos de pesquisa são gravados em lote, algumas consultas por lote de batch_size registros
+    """
+    bump_model_version(model)
+    for first in range(0, len(objects), batch_size):
+        update_search_documents(model, objects[first:first + batch_size])
+        update_generic_search_texts(model, objects[first:first + batch_size])
+
+
+class BulkModelMixin(object):
+    """Mixin que adiciona a criação e alteração em lote ao ModelViewSet
+
+    POST na listagem com uma lista -- cria os registros com bulk_create
+    PUT/PATCH em bulk/ com uma lista -- altera os registros (identificados pela pk de cada item) em lote
+
+    Os registros sem permissão de objeto (check_object_permissions) são retornados nos erros dos itens
+    """
+    # quantidade de registros gravados por comando no banco
+    bulk_batch_size = 1000
+    # quantidade máxima de itens por requisição
+    bulk_max_items = 10000
+    # se True nenhum item é gravado quando algum item for inválido, caso contrário os itens válidos são gravados
+    bulk_atomic = True
+
+    def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_save(request.data)
+        return super(BulkModelMixin, self).create(request, *args, **kwargs)
+
+    @action(methods=['put', 'patch'], detail=False, url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Informe uma lista de registros.'}, status=status.HTTP_400_BAD_REQUEST)
+        return self.bulk_save(request.data, update=True, partial=request.method == 'PATCH')
+
+    def get_bulk_instances(self, items):
+        """Retorna os registros dos itens da alteração em lote com uma única consulta"""
+        queryset = self.get_queryset()
+        pk_name = queryset.model._meta.pk.name
+        ids = [item.get(pk_name, item.get('pk')) for item in items if isinstance(item, dict)]
+        return queryset.in_bulk(list(_related_ids(queryset.model, [pk for pk in ids if pk is not None])))
+
+    def bulk_save(self, items, update=False, partial=False):
+        """Valida e grava os itens em lote
+
+        Arguments:
+            items {List} -- Itens recebidos na requisição
+
+        Keyword Arguments:
+            update {Bool} -- Altera os registros existentes ao invés de criar (default: {False})
+            partial {Bool} -- Alteração parcial (PATCH) (default: {False})
+
+        Returns:
+            Response -- Índice e pk dos itens gravados e erros de cada item inválido
+        """
+        if len(items) > self.bulk_max_items:
+            return Response({'detail': 'Máximo de {} registros por requisição.'.format(self.bulk_max_items)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        model = self.get_queryset().model
+        pk_name = model._meta.pk.name
+        # um único serializer valida todos os itens, evitando montar os campos a cada item
+        serializer = self.get_serializer(partial=partial)
+        prefetch_related_fields(serializer, items)
+        instances = self.get_bulk_instances(items) if update else {}
+
+        valid = []
+        errors = []
+        for index, item in enumerate(items):
+            instance = None
+            if update:
+                pk = item.get(pk_name, item.get('pk')) if isinstance(item, dict) else None
+                ids = _related_ids(model, [pk]) if pk is not None else set()
+                instance = instances.get(ids.pop()) if ids else None
+                if instance is None:
+                    errors.append({'index': index, 'errors': {pk_name: ['Registro não encontrado.']}})
+                    continue
+                # as permissões de objeto da view (has_object_permission) são verificadas em cada registro,
+                # como no update de um único registro
+                try:
+                    self.check_object_permissions(self.request, instance)
+                except (NotAuthenticated, PermissionDenied) as error:
+                    errors.append({'index': index, 'errors': {'detail': [error.detail]}})
+                    continue
+            serializer.instance = instance
+            serializer.initial_data = item
+            try:
+                valid.append((index, instance, serializer.run_validation(item)))
+            except ValidationError as error:
+                errors.append({'index': index, 'errors': error.detail})
+
+        if errors and self.bulk_atomic:
+            return Response({'results': [], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                objects = self.perform_bulk_save(model, valid, update)
+        except IntegrityError as error:
+            return Response({'results': [], 'errors': errors, 'detail': str(error)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = [{'index': index, 'id': obj.pk} for (index, instance, data), obj in zip(valid, objects)]
+        if errors:
+            # com o bulk_atomic = False parte dos itens pode ter sido gravada
+            response_status = status.HTTP_207_MULTI_STATUS if results else status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_200_OK if update else status.HTTP_201_CREATED
+        return Response({'results': results, 'errors': errors}, status=response_status)
+
+    def perform_bulk_save(self, model, valid, update):
+        """Grava os itens validados com bulk_create ou bulk_update_rows
+
+        Returns:
+            List -- Registros gravados, na mesma ordem dos itens validados
+        """
+        objects = []
+        many_values = []
+        fields = set()
+        for index, instance, data in valid:
+            many_values.append(split_many_to_many(model, data))
+            if update:
+                for name, value in data.items():
+                    setattr(instance, name, value)
+                fields.update(data)
+                objects.append(instance)
+            else:
+                objects.append(model(**data))
+
+        if update:
+            # o bulk_update não preenche os campos auto_now (ex: updated_on)
+            agora = timezone.now()
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    for obj in objects:
+                        setattr(obj, field.attname, agora)
+                    fields.add(field.name)
+            if objects and fields:
+                bulk_update_rows(model, objects, sorted(fields), self.bulk_batch_size)
+        else:
+            model._default_manager.bulk_create(objects, batch_size=get_batch_size(model, objects,
+                                                                                  self.bulk_batch_size))
+
+        set_many_to_many(model, objects, many_values, self.bulk_batch_size, replace=update)
+        after_bulk_save(model, objects, self.bulk_batch_size)
+        return objects
+
+
+class SyncModelMixin(object):
+    """Mixin que adiciona ao ModelViewSet o endpoint da sincronização incremental
+
+    GET em sync/?since=<data ISO 8601> ou sync/?cursor=<cursor> -- registros alterados (results),
+    pk dos registros excluídos (deleted), o cursor da próxima requisição e se existem mais páginas (has_more)
+    """
+    # quantidade de registros por página da sincronização, pode ser alterada com ?limit=
+    sync_page_size = 500
+    sync_max_page_size = 5000
+
+    def get_sync_queryset(self):
+        """Retorna os registros sincronizados, incluindo os marcados como deleted.
+
+        O get_queryset da view é executado a partir do objects_all, assim os filtros da view
+        (ex: registros do usuário) também são aplicados na sincronização. As exclusões só são
+        enviadas com o soft delete, sem ele (USE_DEFAULT_MANAGER = True) os registros são removidos
+        do banco de dados e a sincronização não é executada
+
+        Raises:
+            ImproperlyConfigured -- Caso o model não utilize o soft delete ou a view não possua o atributo queryset
+        """
+        queryset = self.queryset
+        if use_default_manager or queryset is None or not hasattr(queryset.model, 'objects_all'):
+            raise ImproperlyConfigured(
+                'A sincronização de {} depende do soft delete e do atributo queryset da view, '
+                'ou sobrescreva o get_sync_queryset.'.format(self.__class__.__name__))
+        self.queryset = queryset.model.objects_all.all()
+        try:
+            return self.get_queryset()
+        finally:
+            self.queryset = queryset
+
+    @action(methods=['get'], detail=False, url_path='sync')
+    def sync(self, request, *args, **kwargs):
+        try:
+            limit = _positive_int(request.query_params.get('limit', self.sync_page_size), strict=True,
+                                  cutoff=self.sync_max_page_size)
+        except (TypeError, ValueError):
+            limit = self.sync_page_size
+        queryset = self.get_sync_queryset()
+        if hasattr(self, 'select_related_fields'):
+            queryset = self.select_related_fields(queryset)
+        try:
+            since = request.query_params.get('since')
+            page = get_sync_page(queryset, since=parse_since(since) if since else None,
+                                 cursor=request.query_params.get('cursor'), limit=limit)
+        except InvalidSyncCursor:
+            raise ValidationError({'cursor': ['Cursor ou data (since) inválido.']})
+        serializer = self.get_serializer(page.changed, many=True)
+        return Response({
+            'results': serializer.data,
+            'deleted': page.deleted,
+            'cursor': page.cursor,
+            'has_more': page.has_more,
+        })
+
+
+class VersionedModelMixin(object):
+    """Mixin que expõe a versão do model da view (core/cache.py) para compor as chaves de cache"""
+    # models adicionais dos quais as respostas dependem (ex: models dos serializers aninhados)
+    version_models = ()
+
+    def get_version_scope(self):
+        """Escopo da versão do model (ex: empresa do usuário), ver Meta.version_scope"""
+        return None
+
+    def get_versions_key(self):
+        """Retorna as versões do model da view e dos version_models em um único texto"""
+        return get_versions_key(self.get_queryset().model, *self.version_models, scope=self.get_version_scope())
+
+
+class ConditionalModelMixin(object):
+    """Mixin que adiciona o ETag (fraco) às respostas do list e do retrieve
+
+    O ETag é calculado com uma única consulta agregada (COUNT e MAX(updated_on)) sobre a queryset
+    filtrada, junto com a url e a versão do model e dos version_models (no escopo da view). As requisições
+    com If-None-Match igual ao ETag atual recebem 304 sem serializar os registros
+    """
+    # campo alterado a cada gravação do registro, utilizado no ETag
+    conditional_field = 'updated_on'
+
+    def get_etag(self, queryset):
+        """Retorna o ETag da queryset ou None caso o model não possua o conditional_field"""
+        try:
+            queryset.model._meta.get_field(self.conditional_field)
+        except FieldDoesNotExist:
+            return None
+        totais = queryset.order_by().aggregate(total=Count('pk'), alterado=Max(self.conditional_field))
+        partes = [
+            self.request.get_full_path(),
+            '{}'.format(totais['total']),
+            totais['alterado'].isoformat() if totais['alterado'] else '',
+            # versões no escopo da view (ex: empresa do usuário), ver VersionedModelMixin
+            self.get_versions_key() if hasattr(self, 'get_versions_key') else '',
+            self.request.accepted_renderer.format if getattr(self.request, 'accepted_renderer', None) else '',
+        ]
+        return 'W/"{}"'.format(hashlib.md5('|'.join(partes).encode('utf-8')).hexdigest())
+
+    def conditional_response(self, queryset, function, request, *args, **kwargs):
+        etag = self.get_etag(queryset)
+        if etag is not None:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+        response = function(request, *args, **kwargs)
+        if etag is not None and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.filter_queryset(self.get_queryset()),
+                                         super(ConditionalModelMixin, self).list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (DjangoValidationError, TypeError, ValueError):
+            # pk inválida, o retrieve retorna 404
+            return super(ConditionalModelMixin, self).retrieve(request, *args, **kwargs)
+        return self.conditional_response(queryset, super(ConditionalModelMixin, self).retrieve,
+                                         request, *args, **kwargs)
+
+
+class SparseFieldsMixin(object):
+    """Mixin que limita a consulta aos campos escolhidos nos parâmetros fields e expand
+    (ver core/serializers.py), apenas nas requisições de leitura (GET)
+    """
+
+    def get_queryset(self):
+        queryset = super(SparseFieldsMixin, self).get_queryset()
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET' or self.action == 'sync':
+            return queryset
+        return narrow_queryset(queryset, get_field_selection(request))
+
+
+class RelatedFieldsMixin(object):
+    """Mixin que aplica na consulta o select_related e o prefetch_related dos relacionamentos utilizados
+    pelos campos do serializer da view, evitando uma consulta por registro (ver get_related_lookups)
+    """
+    # False quando o get_queryset da view já carrega os relacionamentos
+    auto_related = True
+
+    def select_related_fields(self, queryset, selection=None):
+        if not self.auto_related:
+            return queryset
+        return select_related_fields(queryset, self.get_serializer_class(), selection)
+
+    def get_queryset(self):
+        queryset = super(RelatedFieldsMixin, self).get_queryset()
+        request = getattr(self, 'request', None)
+        selection = None
+        if request is not None and request.method == 'GET':
+            # os campos não escolhidos em ?fields= não são carregados
+            selection = get_field_selection(request)
+        return self.select_related_fields(queryset, selection)
+
+
+class BaseModelViewSet(BulkModelMixin, SyncModelMixin, ConditionalModelMixin, VersionedModelMixin,
+                       SparseFieldsMixin, RelatedFieldsMixin, ModelViewSet):
+    """ModelViewSet padrão das APIs geradas pelo build"""
@@ -0,0 +1,125 @@
+"""Contadores de versão por model utilizados na invalidação dos caches do core.
+
+Ao invés de apagar cada chave armazenada, as chaves dos caches incluem a versão do model,
+que é incrementada (cache.incr, atômico no Memcached e no Redis) sempre que um registro é salvo
+ou excluído. As chaves antigas deixam de ser utilizadas e expiram normalmente pelo timeout.
+
+Os models podem ter também uma versão por escopo (ex: por empresa ou por usuário), informando no
+Meta o campo do escopo (version_scope = 'empresa'). Cada registro salvo incrementa apenas a versão
+do seu escopo e as alterações em lote, em que o escopo dos registros não é conhecido, incrementam
+a geração dos escopos, invalidando todos eles:
+
+    chave = get_versions_key(Produto, Categoria, scope=request.user.empresa_id)
+"""
+import time
+
+from django.core.cache import cache
+
+PREFIXO_CACHE = 'nuvols'
+
+
+def get_version_key(model, scope=None):
+    label = model._meta.concrete_model._meta.label_lower
+    if scope is None:
+        return '{}:versao:{}'.format(PREFIXO_CACHE, label)
+    return '{}:versao:{}:escopo:{}'.format(PREFIXO_CACHE, label, scope)
+
+
+def get_generation_key(model):
+    return '{}:versao:{}:geracao'.format(PREFIXO_CACHE, model._meta.concrete_model._meta.label_lower)
+
+
+def get_version_scope_field(model):
+    """Retorna o nome do campo do escopo das versões (Meta.version_scope) ou None"""
+    return getattr(model._meta, 'version_scope', None)
+
+
+def get_version_scope(obj):
+    """Retorna o valor do escopo da versão do registro (ex: pk da empresa) ou None"""
+    name = get_version_scope_field(obj.__class__)
+    if not name:
+        return None
+    return getattr(obj, obj._meta.get_field(name).attname, None)
+
+
+def _initial_version():
+    # caso o contador seja removido do cache a nova versão não repete as anteriores
+    return int(time.time() * 1000)
+
+
+def _get_counter(key):
+    versao = cache.get(key)
+    if versao is None:
+        cache.add(key, _initial_version(), None)
+        versao = cache.get(key) or _initial_version()
+    return versao
+
+
+def _bump_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # outro processo pode ter criado o contador entre o incr e o add
+        if not cache.add(key, _initial_version(), None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                pass
+
+
+def get_model_version(model, scope=None):
+    """Retorna a versão atual dos registros do model
+
+    Keyword Arguments:
+        scope {object} -- Escopo da versão (ex: pk da empresa), None ou um model sem o Meta.version_scope
+                          retornam a versão de todos os registros (default: {None})
+
+    Returns:
+        int ou str -- Versão do model ou '<geração>.<versão do escopo>'
+    """
+    if scope is None or not get_version_scope_field(model):
+        return _get_counter(get_version_key(model))
+    return '{}.{}'.format(_get_counter(get_generation_key(model)), _get_counter(get_version_key(model, scope)))
+
+
+def bump_model_version(model, scope=None):
+    """Incrementa a versão do model, invalidando os caches que dependem dos seus registros
+
+    Keyword Arguments:
+        scope {object} -- Escopo do registro alterado, quando None e o model possuir o
+                          Meta.version_scope todos os escopos são invalidados (default: {None})
+    """
+    _bump_counter(get_version_key(model))
+    if scope is not None:
+        _bump_counter(get_version_key(model, scope))
+    elif get_version_scope_field(model):
+        _bump_counter(get_generation_key(model))
+
+
+def get_model_versions(models, scope=None):
+    """Retorna a versão atual de cada model com uma única leitura do cache
+
+    Returns:
+        List -- Versões na mesma ordem dos models
+    """
+    if scope is not None and any(get_version_scope_field(model) for model in models):
+        return [get_model_version(model, scope) for model in models]
+    keys = [get_version_key(model) for model in models]
+    versoes = cache.get_many(keys)
+    return [versoes[key] if key in versoes else get_model_version(model) for key, model in zip(keys, models)]
+
+
+def get_versions_key(*models, scope=None):
+    """Retorna as versões dos models em um único texto, utilizado na composição das chaves
+    dos caches das views, templates ({% model_version %}) e viewsets
+
+    Arguments:
+        models {Model} -- Classes dos models dos quais o cache depende
+
+    Keyword Arguments:
+        scope {object} -- Escopo das versões (ex: pk da empresa) (default: {None})
+
+    Returns:
+        str -- Versões separadas por ponto, ex: '1592000000000.1592000000123'
+    """
+    return '.'.join('{}'.format(versao) for versao in get_model_versions(models, scope))
@@ -0,0 +1,326 @@
+"""Campos exibidos nas páginas de detalhe e exclusão (BaseDetailView e BaseDeleteView).
+
+O plano de campos de cada model é montado a partir do _meta apenas na primeira requisição e
+reaproveitado pelas demais. Os campos simples são lidos do próprio objeto (as ForeignKey e
+OneToOne reversos são carregados junto com ele pelo select_related) e cada relacionamento com
+vários registros (ManyToMany, ForeignKey reverso e GenericRelation) é carregado com uma consulta
+limitada, assim a página não depende da quantidade de registros relacionados.
+"""
+import threading
+
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRel
+from django.db.models import (AutoField, BooleanField, Count, FileField,
+                              ImageField, IntegerField, OneToOneRel, OuterRef,
+                              Subquery)
+from django.db.models.functions import Coalesce
+from django.utils.html import format_html
+
+from .listing import get_source_path
+from .permissions import get_perm_name
+
+# Campos de controle que não são exibidos
+HIDDEN_FIELDS = ('enabled', 'deleted')
+
+# Plano de campos de cada model, ex: {(Model, ('campo',)): DetailPlan}
+_plan_cache = {}
+_plan_lock = threading.Lock()
+
+# Tipos dos campos do plano
+SCALAR = 'scalar'
+BOOLEAN = 'boolean'
+FILE = 'file'
+IMAGE = 'image'
+ONE = 'one'
+MANY = 'many'
+
+
+class DetailField(object):
+    """Campo compilado da página de detalhe
+
+    Attributes:
+        name {str} -- Nome do atributo no objeto (accessor nos relacionamentos reversos)
+        label {str} -- Texto exibido
+        kind {str} -- Tipo do campo (SCALAR, BOOLEAN, FILE, IMAGE, ONE ou MANY)
+        field {Field} -- Campo do _meta
+    """
+    __slots__ = ('name', 'label', 'kind', 'field')
+
+    def __init__(self, name, label, kind, field=None):
+        self.name = name
+        self.label = label
+        self.kind = kind
+        self.field = field
+
+
+class DetailPlan(object):
+    """Plano da página de detalhe com os campos na ordem do _meta
+
+    Attributes:
+        fields {List} -- Campos simples (incluindo ForeignKey e OneToOne)
+        many_fields {List} -- Relacionamentos com vários registros
+        select_related {List} -- ForeignKey e OneToOne reversos carregados junto com o objeto
+    """
+
+    def __init__(self, fields, many_fields, select_related):
+        self.fields = fields
+        self.many_fields = many_fields
+        self.select_related = select_related
+
+
+class RelatedPreview(object):
+    """Registros de um relacionamento limitados a `limit` itens
+
+    Pode ser utilizado no template da mesma forma que o manager do relacionamento ({% for obj in field.1.all %})
+    """
+
+    def __init__(self, manager, limit):
+        self.manager = manager
+        self.limit = limit
+        self._items = None
+        self._has_more = False
+
+    def _load(self):
+        if self._items is None:
+            # um registro a mais indica se existem outros além do limite, sem COUNT(*)
+            items = list(self.manager.all()[:self.limit + 1])
+            self._has_more = len(items) > self.limit
+            self._items = items[:self.limit]
+        return self._items
+
+    @property
+    def has_more(self):
+        """Indica se existem mais registros além do limite"""
+        self._load()
+        return self._has_more
+
+    def all(self):
+        return self._load()
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+
+def _verbose_name(field):
+    return getattr(field, 'verbose_name', None) or field.name
+
+
+def _is_auto_date(field):
+    return getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+
+
+def build_detail_plan(model, exclude=()):
+    """Monta o plano de campos da página de detalhe analisando o _meta do model
+
+    Arguments:
+        model {Model} -- Classe do model
+
+    Keyword Arguments:
+        exclude {List} -- Campos que não devem ser exibidos (default: {()})
+
+    Returns:
+        DetailPlan -- Plano de campos
+    """
+    fields = []
+    many_fields = []
+    select_related = []
+    for field in model._meta.get_fields(include_parents=True):
+        if field.name in HIDDEN_FIELDS or field.name in exclude:
+            continue
+        # Desconsiderando o AutoField e os campos preenchidos automaticamente (auto_now e auto_now_add)
+        if isinstance(field, AutoField) or _is_auto_date(field):
+            continue
+
+        if isinstance(field, GenericRel):
+            # o GenericRel é o lado reverso da GenericRelation, exibido pelo próprio campo
+            continue
+        if field.many_to_many or field.one_to_many:
+            if field.concrete or not hasattr(field, 'get_accessor_name'):
+                name, label = field.name, _verbose_name(field)
+            else:
+                name, label = field.get_accessor_name(), field.related_model._meta.verbose_name_plural or field.name
+            many_fields.append(DetailField(name, label, MANY, field))
+        elif isinstance(field, OneToOneRel):
+            select_related.append(field.name)
+            fields.append(DetailField(field.get_accessor_name(), field.related_model._meta.verbose_name or field.name,
+                                      ONE))
+        elif isinstance(field, GenericForeignKey):
+            fields.append(DetailField(field.name, field.name, ONE))
+        elif isinstance(field, BooleanField):
+            fields.append(DetailField(field.name, _verbose_name(field), BOOLEAN))
+        elif isinstance(field, ImageField):
+            fields.append(DetailField(field.name, _verbose_name(field), IMAGE))
+        elif isinstance(field, FileField):
+            fields.append(DetailField(field.name, _verbose_name(field), FILE))
+        else:
+            if field.is_relation and field.concrete:
+                select_related.append(field.name)
+            fields.append(DetailField(field.name, _verbose_name(field), SCALAR))
+    return DetailPlan(fields, many_fields, select_related)
+
+
+def get_detail_plan(model, exclude=()):
+    """Retorna o plano de campos do model, montando-o apenas na primeira chamada"""
+    key = (model, tuple(exclude or ()))
+    plan = _plan_cache.get(key)
+    if plan is None:
+        with _plan_lock:
+            plan = build_detail_plan(model, exclude)
+            _plan_cache[key] = plan
+    return plan
+
+
+def _render_file(value, image):
+    if not value or not value.name:
+        return ''
+    nome = value.name.split('.')[0]
+    if image:
+        return format_html('<img width="100px" src="{}" alt="{}" />', value.url, nome)
+    return format_html('<a  href="{}" > <i class="fas fa-file"></i> {}</a>', value.url, nome)
+
+
+def get_detail_fields(obj, exclude=(), limit=20):
+    """Retorna os campos do registro no formato utilizado pelos templates de detalhe e exclusão
+
+    Arguments:
+        obj {Model} -- Registro exibido
+
+    Keyword Arguments:
+        exclude {List} -- Campos que não devem ser exibidos (default: {()})
+        limit {int} -- Quantidade máxima de registros carregados de cada relacionamento (default: {20})
+
+    Returns:
+        Tuple -- Lista de (label, valor) dos campos simples e lista de (label, RelatedPreview) dos relacionamentos
+    """
+    plan = get_detail_plan(obj.__class__, exclude)
+    object_list = []
+    for field in plan.fields:
+        try:
+            value = getattr(obj, field.name)
+        except Exception:
+            # OneToOne reverso sem registro relacionado
+            continue
+        if field.kind == BOOLEAN:
+            value = "Sim" if value else "Não"
+        elif field.kind in (FILE, IMAGE):
+            value = _render_file(value, field.kind == IMAGE)
+        object_list.append((field.label, value))
+
+    many_fields = [(field.label, RelatedPreview(getattr(obj, field.name), limit)) for field in plan.many_fields]
+    return object_list, many_fields
+
+
+class RelatedPanel(object):
+    """Painel de um relacionamento exibido nas páginas de detalhe e exclusão, os registros
+    são carregados sob demanda pelo endpoint core:related-objects
+
+    Attributes:
+        name {str} -- Nome do relacionamento (accessor)
+        label {str} -- Texto exibido
+        count {int} -- Quantidade de registros relacionados
+    """
+    __slots__ = ('name', 'label', 'count')
+
+    def __init__(self, name, label, count):
+        self.name = name
+        self.label = label
+        self.count = count
+
+
+def get_related_counts(obj, fields):
+    """Retorna a quantidade de registros de cada relacionamento com uma única consulta,
+    utilizando uma subconsulta agrupada (COUNT) para cada relacionamento
+
+    Arguments:
+        obj {Model} -- Registro exibido
+        fields {List} -- Relacionamentos do plano (DetailField do tipo MANY)
+
+    Returns:
+        Dict -- Dicionário no formato {nome_do_relacionamento: quantidade}
+    """
+    annotations = {}
+    counts = {}
+    for index, field in enumerate(fields):
+        path = get_source_path(field.field)
+        if path is None:
+            # GenericRelation, não possui o caminho de volta para o model
+            counts[field.name] = getattr(obj, field.name).count()
+            continue
+        subquery = (field.field.related_model._default_manager.filter(**{path: OuterRef('pk')}).order_by()
+                    .values(path).annotate(total=Count('pk')).values('total'))
+        annotations['related_count_{}'.format(index)] = Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+    if annotations:
+        totais = obj.__class__._base_manager.filter(pk=obj.pk).values(**annotations).first() or {}
+        for index, field in enumerate(fields):
+            chave = 'related_count_{}'.format(index)
+            if chave in annotations:
+                counts[field.name] = totais.get(chave, 0)
+    return counts
+
+
+def has_related_permission(snapshot, detail_field):
+    """Verifica se o usuário pode visualizar os registros do relacionamento, é necessária a
+    permissão de visualizar ou alterar o model relacionado
+    """
+    model = detail_field.field.related_model
+    return snapshot.has_any_perm([get_perm_name(model, 'view'), get_perm_name(model, 'change')])
+
+
+def get_related_panels(obj, exclude=(), snapshot=None):
+    """Retorna os painéis dos relacionamentos do registro com a quantidade de registros de cada um
+
+    Keyword Arguments:
+        snapshot {PermissionSnapshot} -- Permissões do usuário, os relacionamentos cujo model o usuário
+                                         não pode visualizar não são exibidos (default: {None})
+    """
+    fields = get_detail_plan(obj.__class__, exclude).many_fields
+    if snapshot is not None:
+        fields = [field for field in fields if has_related_permission(snapshot, field)]
+    counts = get_related_counts(obj, fields)
+    return [RelatedPanel(field.name, field.label, counts.get(field.name, 0)) for field in fields]
+
+
+def get_related_field(model, name, exclude=()):
+    """Retorna o relacionamento com vários registros do plano pelo nome (accessor)
+
+    Raises:
+        LookupError -- Caso o relacionamento não faça parte do plano do model
+    """
+    for field in get_detail_plan(model, exclude).many_fields:
+        if field.name == name:
+            return field
+    raise LookupError(name)
+
+
+def get_related_page(obj, name, page=1, per_page=20, exclude=()):
+    """Retorna uma página dos registros de um relacionamento do plano
+
+    Arguments:
+        obj {Model} -- Registro exibido
+        name {str} -- Nome do relacionamento (accessor), ex: 'filho_set'
+
+    Keyword Arguments:
+        page {int} -- Número da página (default: {1})
+        per_page {int} -- Quantidade de registros por página (default: {20})
+        exclude {List} -- Campos que não devem ser exibidos (default: {()})
+
+    Raises:
+        LookupError -- Caso o relacionamento não faça parte do plano do model
+
+    Returns:
+        Tuple -- Lista com os registros da página e se existe uma próxima página
+    """
+    get_related_field(obj.__class__, name, exclude)
+    inicio = (max(page, 1) - 1) * per_page
+    # um registro a mais indica se existe a próxima página, sem COUNT(*)
+    queryset = getattr(obj, name).all()
+    if not queryset.ordered:
+        # sem ordenação as páginas podem repetir registros
+        queryset = queryset.order_by('pk')
+    items = list(queryset[inicio:inicio + per_page + 1])
+    return items[:per_page], len(items) > per_page
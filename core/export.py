@@ -0,0 +1,298 @@
+"""Exportação das listagens do BaseListView em CSV e XLSX.
+
+Os registros são percorridos com queryset.iterator(chunk_size) e cada bloco é convertido em linhas
+utilizando as mesmas colunas compiladas da listagem HTML (listing.get_columns). O arquivo é
+enviado ao navegador enquanto é gerado (StreamingHttpResponse), assim a memória utilizada não
+depende da quantidade de registros exportados.
+
+O XLSX é montado diretamente com o zipfile da biblioteca padrão (SpreadsheetML com inlineStr),
+sem dependências externas. Como o Excel aceita no máximo 1.048.576 linhas por planilha, as
+exportações maiores são divididas em várias planilhas do mesmo arquivo.
+"""
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .listing import fetch_lookup_values
+
+# Formatos disponíveis, ex: ?export=csv
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Quantidade máxima de linhas de uma planilha do Excel (incluindo o cabeçalho)
+XLSX_MAX_ROWS = 1048576
+
+# Caracteres iniciais que fazem o Excel e o LibreOffice tratarem o valor do CSV como fórmula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+NUMBER_RE = re.compile(r'^[-+]?[\d.,]+$')
+
+
+class Echo(object):
+    """Buffer que apenas devolve o valor escrito, utilizado pelo csv.writer
+    para gerar as linhas sem acumulá-las em memória
+    """
+
+    def write(self, value):
+        return value
+
+
+class StreamBuffer(object):
+    """Buffer sem seek utilizado pelo zipfile, os bytes escritos são retirados
+    a cada linha e enviados na resposta
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_objects(queryset, chunk_size, prefetch_related=None):
+    """Percorre a queryset em blocos de chunk_size registros
+
+    O iterator() ignora o prefetch_related, por isso os relacionamentos
+    são carregados em cada bloco com o prefetch_related_objects
+
+    Returns:
+        Generator -- Listas com no máximo chunk_size registros
+    """
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            if prefetch_related:
+                prefetch_related_objects(chunk, *prefetch_related)
+            yield chunk
+            chunk = []
+    if chunk:
+        if prefetch_related:
+            prefetch_related_objects(chunk, *prefetch_related)
+        yield chunk
+
+
+def iter_rows(view, queryset, columns, chunk_size=2000, prefetch_related=None):
+    """Retorna as linhas da exportação com o valor de cada coluna compilada do list_display
+
+    Arguments:
+        view {BaseListView} -- Instância da view, utilizada pelas colunas que são métodos da view
+        queryset {QuerySet} -- Registros filtrados pela pesquisa e pelos filtros da listagem
+        columns {List} -- Colunas compiladas (listing.Column)
+
+    Keyword Arguments:
+        chunk_size {int} -- Quantidade de registros carregados por vez (default: {2000})
+        prefetch_related {List} -- Relacionamentos carregados em cada bloco (default: {None})
+
+    Returns:
+        Generator -- Lista com os valores de cada linha
+    """
+    model = queryset.model
+    lookups = [column.name for column in columns if column.lookup]
+    for chunk in iter_objects(queryset, chunk_size, prefetch_related):
+        # uma única consulta por bloco para os campos de relacionamento (ex: pai__nome)
+        lookup_values = fetch_lookup_values(model, [obj.pk for obj in chunk], lookups)
+        for obj in chunk:
+            row = []
+            for column in columns:
+                try:
+                    row.append(column.render(view, obj, lookup_values))
+                except Exception:
+                    row.append('')
+            yield row
+
+
+def escape_formula(value):
+    """Adiciona o apóstrofo aos textos que o Excel e o LibreOffice executariam como fórmula
+    (iniciados por =, +, -, @, tabulação ou quebra de linha), os números são mantidos
+    """
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES) and not NUMBER_RE.match(value):
+        return "'" + value
+    return value
+
+
+def stream_csv(headers, rows, delimiter=','):
+    """Gera o arquivo CSV linha a linha, iniciando pelo BOM para o Excel reconhecer o UTF-8.
+    No XLSX as células são sempre texto (inlineStr), apenas o CSV precisa do escape_formula
+    """
+    writer = csv.writer(Echo(), delimiter=delimiter)
+    yield '\ufeff' + writer.writerow([escape_formula(value) for value in headers])
+    for row in rows:
+        yield writer.writerow([escape_formula(value) for value in row])
+
+
+def _column_name(index):
+    """Converte o índice da coluna (0, 1, ...) na letra utilizada pelo Excel (A, B, ..., AA)"""
+    name = ''
+    index += 1
+    while index:
+        index, resto = divmod(index - 1, 26)
+        name = chr(65 + resto) + name
+    return name
+
+
+def _xlsx_row(number, values):
+    cells = []
+    for index, value in enumerate(values):
+        if value is None or value == '':
+            continue
+        cells.append('<c r="{}{}" t="inlineStr"><is><t xml:space="preserve">{}</t></is></c>'.format(
+            _column_name(index), number, escape(_clean_xml(value))))
+    return '<row r="{}">{}</row>'.format(number, ''.join(cells))
+
+
+def _clean_xml(value):
+    # remove os caracteres de controle que não são aceitos no XML
+    return ''.join(char for char in '{}'.format(value) if char >= ' ' or char in '\t\n\r')
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{}'
+    '</Types>'
+)
+XLSX_SHEET_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{}</sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{}</Relationships>'
+)
+XLSX_SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_FOOTER = '</sheetData></worksheet>'
+
+
+def stream_xlsx(headers, rows, sheet_title='Planilha'):
+    """Gera o arquivo XLSX enquanto as linhas são percorridas
+
+    As planilhas são gravadas primeiro e o workbook.xml por último, quando a quantidade
+    de planilhas já é conhecida (a ordem dos arquivos dentro do zip não importa para o Excel)
+    """
+    buffer = StreamBuffer()
+    arquivo = zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED)
+    sheets = 0
+    sheet = None
+    number = XLSX_MAX_ROWS
+    rows = iter(rows)
+    while True:
+        row = next(rows, None)
+        if row is None and sheet is not None:
+            break
+        if number >= XLSX_MAX_ROWS:
+            if sheet is not None:
+                sheet.write(XLSX_SHEET_FOOTER.encode('utf-8'))
+                sheet.close()
+            sheets += 1
+            sheet = arquivo.open('xl/worksheets/sheet{}.xml'.format(sheets), mode='w', force_zip64=True)
+            sheet.write(XLSX_SHEET_HEADER.encode('utf-8'))
+            sheet.write(_xlsx_row(1, headers).encode('utf-8'))
+            number = 1
+        if row is None:
+            break
+        number += 1
+        sheet.write(_xlsx_row(number, row).encode('utf-8'))
+        data = buffer.pop()
+        if data:
+            yield data
+    sheet.write(XLSX_SHEET_FOOTER.encode('utf-8'))
+    sheet.close()
+
+    # o nome da planilha não aceita os caracteres []:*?/\ e tem no máximo 31 caracteres
+    titulo = ''.join(' ' if char in '[]:*?/\\' else char for char in _clean_xml(sheet_title))[:25]
+    titulo = escape(titulo, {'"': '&quot;'})
+    arquivo.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES.format(
+        ''.join(XLSX_SHEET_TYPE.format(index) for index in range(1, sheets + 1))))
+    arquivo.writestr('_rels/.rels', XLSX_RELS)
+    arquivo.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(''.join(
+        '<sheet name="{} {}" sheetId="{}" r:id="rId{}"/>'.format(titulo, index, index, index)
+        if sheets > 1 else '<sheet name="{}" sheetId="1" r:id="rId1"/>'.format(titulo)
+        for index in range(1, sheets + 1))))
+    arquivo.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS.format(''.join(
+        '<Relationship Id="rId{0}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet{0}.xml"/>'.format(index) for index in range(1, sheets + 1))))
+    arquivo.close()
+    yield buffer.pop()
+
+
+def get_export_filename(model, extension):
+    return '{}_{}.{}'.format(model._meta.model_name, timezone.now().strftime('%Y%m%d_%H%M%S'), extension)
+
+
+def export_response(view, queryset, list_display, export_format, chunk_size=2000):
+    """Retorna a resposta com o arquivo da exportação gerado sob demanda
+
+    Arguments:
+        view {BaseListView} -- Instância da view da listagem
+        queryset {QuerySet} -- Registros filtrados pela pesquisa e pelos filtros da listagem
+        list_display {List} -- Campos exportados
+        export_format {str} -- Formato do arquivo, 'csv' ou 'xlsx'
+
+    Keyword Arguments:
+        chunk_size {int} -- Quantidade de registros carregados por vez (default: {2000})
+
+    Returns:
+        StreamingHttpResponse -- Resposta com o arquivo
+    """
+    plan = view.get_query_plan(list_display)
+    # o prefetch_related é aplicado em cada bloco pelo iter_objects
+    if plan.select_related:
+        queryset = queryset.select_related(*plan.select_related)
+    if plan.only:
+        queryset = queryset.only(*plan.only)
+
+    headers = view.list_display_verbose_name(list_display)
+    rows = iter_rows(view, queryset, view.get_columns(list_display), chunk_size, plan.prefetch_related)
+    if export_format == 'xlsx':
+        content = stream_xlsx(headers, rows, sheet_title='{}'.format(
+            queryset.model._meta.verbose_name_plural).title())
+    else:
+        content = stream_csv(headers, rows, delimiter=view.export_csv_delimiter)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+        get_export_filename(queryset.model, export_format))
+    return response
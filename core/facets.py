@@ -0,0 +1,190 @@
+"""Opções dos filtros (list_filter) do BaseListView com a quantidade de registros de cada opção.
+
+Cada filtro é calculado com uma única consulta agrupada (GROUP BY) sobre os registros da listagem
+(get_queryset da view, independente da pesquisa e dos filtros da requisição), e armazenado no cache
+do Django até que algum registro do model (ou do model relacionado) seja salvo ou excluído.
+As listagens que limitam os registros (ex: por usuário) armazenam os filtros por escopo ou usuário,
+e cada listagem do mesmo model possui os seus próprios filtros.
+Os filtros com muitas opções retornam apenas as mais utilizadas, as demais são
+carregadas sob demanda pelo endpoint core:facet-options.
+"""
+from django.core.cache import cache
+from django.db.models import (BooleanField, CharField, Count, DateField,
+                              DateTimeField, ForeignKey, Q, TextField)
+
+from .cache import PREFIXO_CACHE, get_model_version
+from .settings import facets_cache_timeout
+
+# Operadores disponíveis nos filtros de data
+DATE_OPERATORS = (
+    {'choice_id': '__exact', 'choice_label': 'Igual'},
+    {'choice_id': '__not_exact', 'choice_label': 'Diferente'},
+    {'choice_id': '__lt', 'choice_label': 'Menor que'},
+    {'choice_id': '__gt', 'choice_label': 'Maior que'},
+    {'choice_id': '__lte', 'choice_label': 'Menor Igual a'},
+    {'choice_id': '__gte', 'choice_label': 'Maior Igual a'},
+)
+
+
+class FacetOption(object):
+    """Opção de um filtro, pode ser utilizada no template da mesma forma que
+    os registros do model relacionado ({{ item.pk }} e {{ item }})
+    """
+    __slots__ = ('value', 'label', 'count')
+
+    def __init__(self, value, label, count):
+        self.value = value
+        self.label = label
+        self.count = count
+
+    @property
+    def pk(self):
+        return self.value
+
+    @property
+    def id(self):
+        return self.value
+
+    def __str__(self):
+        return self.label
+
+    def as_dict(self):
+        return {'id': str(self.value), 'label': self.label, 'count': self.count}
+
+
+def get_label(field):
+    """Retorna o label do filtro a partir do verbose_name do campo"""
+    if getattr(field, 'verbose_name', None):
+        return field.verbose_name
+    return ' '.join(str(field.name).split('_')).title()
+
+
+def get_type_filter(field):
+    if isinstance(field, ForeignKey):
+        return 'ForeignKey'
+    if isinstance(field, BooleanField):
+        return 'BooleanFieldModel'
+    if field.choices:
+        return 'ChoiceField'
+    return type(field).__name__
+
+
+def _base_queryset(queryset):
+    # o order_by() vazio impede que os campos da ordenação sejam incluídos no GROUP BY
+    return queryset.order_by()
+
+
+def _grouped_counts(queryset, field):
+    """Consulta agrupada com a quantidade de registros por valor do campo"""
+    return (_base_queryset(queryset).filter(**{'{}__isnull'.format(field.attname): False})
+            .values_list(field.attname).annotate(total=Count('pk')))
+
+
+def _related_search(related_model, term):
+    """Filtro pelo termo em todos os campos texto do model relacionado"""
+    filtro = Q()
+    for related_field in related_model._meta.concrete_fields:
+        if isinstance(related_field, (CharField, TextField)) and not related_field.choices:
+            filtro |= Q(**{'{}__icontains'.format(related_field.name): term})
+    return filtro
+
+
+def get_facet_options(queryset, field, limit=None, offset=0, term=None):
+    """Retorna as opções do filtro ordenadas pela quantidade de registros
+
+    Arguments:
+        queryset {QuerySet} -- Registros da listagem, sem a pesquisa e os filtros da requisição
+        field {Field} -- Campo do list_filter (ForeignKey ou campo simples)
+
+    Keyword Arguments:
+        limit {int} -- Quantidade máxima de opções (default: {None})
+        offset {int} -- Quantidade de opções ignoradas, utilizado no carregamento sob demanda (default: {0})
+        term {str} -- Termo para filtrar as opções (default: {None})
+
+    Returns:
+        Tuple -- Lista de FacetOption e se existem mais opções além do limite
+    """
+    queryset = _grouped_counts(queryset, field)
+    if term:
+        if isinstance(field, ForeignKey):
+            related_ids = field.related_model._base_manager.filter(
+                _related_search(field.related_model, term)).values('pk')
+            queryset = queryset.filter(**{'{}__in'.format(field.attname): related_ids})
+        else:
+            queryset = queryset.filter(**{'{}__icontains'.format(field.attname): term})
+    queryset = queryset.order_by('-total', field.attname)
+    if limit is not None:
+        queryset = queryset[offset:offset + limit + 1]
+    elif offset:
+        queryset = queryset[offset:]
+
+    rows = list(queryset)
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit] if limit is not None else rows
+
+    if isinstance(field, ForeignKey):
+        related = field.related_model._base_manager.in_bulk([value for value, total in rows])
+        options = [FacetOption(value, str(related[value]) if value in related else str(value), total)
+                   for value, total in rows]
+        options.sort(key=lambda option: option.label.lower())
+    else:
+        options = [FacetOption(value, str(value), total) for value, total in rows]
+        options.sort(key=lambda option: option.value)
+    return options, has_more
+
+
+def build_facet(queryset, field, limit):
+    """Monta o filtro no formato utilizado pelos templates (label, list e type_filter)"""
+    facet = {'label': get_label(field), 'type_filter': get_type_filter(field), 'has_more': False}
+    if isinstance(field, BooleanField):
+        facet['list'] = ['True', 'False']
+    elif isinstance(field, (DateField, DateTimeField)):
+        facet['list'] = [dict(operador) for operador in DATE_OPERATORS]
+    elif field.choices and not isinstance(field, ForeignKey):
+        counts = dict(_grouped_counts(queryset, field))
+        facet['list'] = [{'choice_id': value, 'choice_label': label, 'count': counts.get(value, 0)}
+                         for value, label in field.flatchoices]
+    else:
+        facet['list'], facet['has_more'] = get_facet_options(queryset, field, limit)
+    return facet
+
+
+def get_facet_cache_key(model, field, limit, scope=None, user=None, view=None):
+    versoes = [get_model_version(model, scope)]
+    if field.is_relation and field.related_model is not None:
+        versoes.append(get_model_version(field.related_model, scope))
+    return '{}:facet:{}:{}:{}:{}:{}:{}:{}'.format(PREFIXO_CACHE, model._meta.label_lower, field.name, limit,
+                                                 view or '', '' if scope is None else scope,
+                                                 '' if user is None else getattr(user, 'pk', None),
+                                                 '.'.join(str(versao) for versao in versoes))
+
+
+def get_facets(queryset, list_filter, limit=50, scope=None, user=None, view=None):
+    """Retorna os filtros do list_filter, utilizando o cache enquanto os registros não forem alterados
+
+    Arguments:
+        queryset {QuerySet} -- Registros da listagem, sem a pesquisa e os filtros da requisição
+        list_filter {List} -- Campos utilizados como filtro
+
+    Keyword Arguments:
+        limit {int} -- Quantidade máxima de opções carregadas por filtro (default: {50})
+        scope {object} -- Escopo da versão do model (ex: pk da empresa), ver core/cache.py (default: {None})
+        user {User} -- Usuário, informado quando os registros da listagem dependem do usuário (default: {None})
+        view {str} -- Identificador da view, as listagens do mesmo model podem limitar os registros
+                      de formas diferentes (default: {None})
+
+    Returns:
+        List -- Lista de dicionários {nome_do_campo: {'label', 'list', 'type_filter', 'has_more'}}
+    """
+    model = queryset.model
+    facets = []
+    for field in model._meta.fields:
+        if field.name not in list_filter:
+            continue
+        key = get_facet_cache_key(model, field, limit, scope, user, view)
+        facet = cache.get(key)
+        if facet is None:
+            facet = build_facet(queryset, field, limit)
+            cache.set(key, facet, facets_cache_timeout)
+        facets.append({field.name: facet})
+    return facets
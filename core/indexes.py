@@ -0,0 +1,195 @@
+"""Índices parciais para as colunas do soft delete e sugestão de índices para as listagens.
+
+Todas as consultas do BaseManager filtram deleted = False e são ordenadas pelo Meta.ordering,
+por isso o índice mais útil para os models que herdam de Base é um índice parcial
+(WHERE deleted = false) com os campos da ordenação acrescidos da pk, a mesma ordenação
+utilizada pela paginação por cursor.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Q
+from django.urls import get_resolver
+from django.urls.resolvers import URLPattern, URLResolver
+
+from .pagination import get_keyset_ordering
+from .settings import soft_delete_indexes, sync_indexes
+
+# Sugestão de índice com o motivo pelo qual foi sugerido
+IndexProposal = namedtuple('IndexProposal', ['model', 'index', 'reason'])
+
+
+def get_index_name(model, fields, sufixo):
+    """Gera o nome do índice respeitando o limite de 30 caracteres do Django"""
+    chave = '{}:{}:{}'.format(model._meta.db_table, ','.join(fields), sufixo)
+    return '{}_{}_{}'.format(model._meta.db_table[:17], hashlib.md5(chave.encode('utf-8')).hexdigest()[:8], sufixo)
+
+
+def is_soft_delete_index_enabled(model):
+    """Verifica se o model deve possuir o índice parcial do soft delete,
+    utilizando o Meta.soft_delete_index ou o SOFT_DELETE_INDEXES do settings
+    """
+    option = getattr(model._meta, 'soft_delete_index', None)
+    return soft_delete_indexes if option is None else bool(option)
+
+
+def get_soft_delete_index(model):
+    """Retorna o índice parcial com os campos da ordenação do model
+    e a pk apenas para os registros com deleted = False
+
+    Arguments:
+        model {Model} -- Classe do model
+
+    Returns:
+        Index -- Índice parcial
+    """
+    fields = ['{}{}'.format('-' if descending else '', field.name) for field, descending in get_keyset_ordering(model)]
+    return models.Index(fields=fields, name=get_index_name(model, fields, 'sd'), condition=Q(deleted=False))
+
+
+def is_sync_index_enabled(model):
+    """Verifica se o model deve possuir o índice da sincronização,
+    utilizando o Meta.sync_index ou o SYNC_INDEXES do settings
+    """
+    option = getattr(model._meta, 'sync_index', None)
+    return sync_indexes if option is None else bool(option)
+
+
+def get_sync_index(model):
+    """Retorna o índice (updated_on, pk) percorrido pela sincronização (core/sync.py),
+    sem condição pois os registros excluídos (deleted = True) também são sincronizados
+    """
+    fields = ['updated_on', model._meta.pk.name]
+    return models.Index(fields=fields, name=get_index_name(model, fields, 'sy'))
+
+
+def get_filter_index(model, name):
+    """Retorna o índice parcial para o campo utilizado no list_filter ou None
+    caso o campo já possua índice ou não seja um campo do próprio model
+    """
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.concrete or field.many_to_many or field.primary_key or field.unique or field.db_index:
+        return None
+    return models.Index(fields=[field.name], name=get_index_name(model, [field.name], 'lf'),
+                        condition=Q(deleted=False))
+
+
+def get_search_index(model, name, connection):
+    """Retorna o índice trigram (PostgreSQL com a extensão pg_trgm) para o campo
+    utilizado no search_fields, as buscas com icontains não utilizam índices B-tree
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not isinstance(field, (models.CharField, models.TextField)):
+        return None
+    from django.contrib.postgres.indexes import GinIndex
+    return GinIndex(fields=[field.name], name=get_index_name(model, [field.name], 'sf'), opclasses=['gin_trgm_ops'])
+
+
+def get_index_columns(model, index):
+    """Retorna as colunas do índice na ordem em que foram declaradas"""
+    return [model._meta.get_field(field.lstrip('-')).column for field in index.fields]
+
+
+def get_existing_indexes(model, connection):
+    """Retorna as colunas de todos os índices existentes no banco de dados para a tabela do model
+
+    Returns:
+        Dict -- Dicionário com o nome do índice e a lista de colunas
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return {nome: dados['columns'] for nome, dados in constraints.items()
+            if dados['index'] or dados['primary_key'] or dados['unique']}
+
+
+def is_index_covered(model, index, existing):
+    """Verifica se já existe um índice com o mesmo nome ou que comece pelas mesmas colunas"""
+    if index.name in existing:
+        return True
+    columns = get_index_columns(model, index)
+    return any(list(colunas[:len(columns)]) == columns for colunas in existing.values())
+
+
+def propose_indexes(model, connection, list_filter=(), search_fields=()):
+    """Sugere os índices para o model a partir do Meta.ordering, list_filter e search_fields
+
+    Arguments:
+        model {Model} -- Classe do model
+        connection {Connection} -- Conexão com o banco de dados que será analisado
+
+    Keyword Arguments:
+        list_filter {List} -- Campos utilizados nos filtros da listagem (default: {()})
+        search_fields {List} -- Campos utilizados na pesquisa da listagem (default: {()})
+
+    Returns:
+        List -- Lista de IndexProposal com os índices que ainda não existem no banco de dados
+    """
+    candidatos = []
+    soft_delete = hasattr(model, 'deleted')
+    if soft_delete:
+        candidatos.append((get_soft_delete_index(model), 'Meta.ordering com deleted = False'))
+    for name in list_filter:
+        index = get_filter_index(model, name) if soft_delete else None
+        if index is not None:
+            candidatos.append((index, 'list_filter: {}'.format(name)))
+    for name in search_fields:
+        index = get_search_index(model, name, connection)
+        if index is not None:
+            candidatos.append((index, 'search_fields: {}'.format(name)))
+
+    existing = get_existing_indexes(model, connection)
+    proposals = []
+    for index, reason in candidatos:
+        if not is_index_covered(model, index, existing):
+            proposals.append(IndexProposal(model, index, reason))
+            existing[index.name] = get_index_columns(model, index)
+    return proposals
+
+
+def get_registered_views(base_class, patterns=None):
+    """Retorna as views registradas nas urls que herdam da classe informada"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    views = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            views.extend(view for view in get_registered_views(base_class, pattern.url_patterns) if view not in views)
+        elif isinstance(pattern, URLPattern):
+            view_class = getattr(pattern.callback, 'view_class', None)
+            if view_class is not None and issubclass(view_class, base_class) and view_class not in views:
+                views.append(view_class)
+    return views
+
+
+def get_list_views(patterns=None):
+    """Retorna as views registradas nas urls que herdam de BaseListView"""
+    from .views import BaseListView
+
+    return get_registered_views(BaseListView, patterns)
+
+
+def get_view_path(view_class):
+    """Identificador da view (módulo e nome da classe), utilizado nos endpoints que dependem
+    da view que montou a página (ex: opções dos filtros e painéis dos relacionamentos)
+    """
+    return '{}.{}'.format(view_class.__module__, view_class.__qualname__)
+
+
+def get_registered_view(path, base_class):
+    """Retorna a view registrada nas urls com o identificador informado (get_view_path) ou None,
+    apenas as views das urls podem ser utilizadas, o identificador não é importado
+    """
+    for view_class in get_registered_views(base_class):
+        if get_view_path(view_class) == path:
+            return view_class
+    return None
@@ -0,0 +1,556 @@
+"""Funções auxiliares utilizadas pelo BaseListView para montar as linhas da listagem.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import pytz
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.db import connections
+from django.db.models import Count, DateField, DateTimeField, F, Window
+from django.db.models.functions import RowNumber
+
+# Caches por classe de view/model. Como são montados a partir do código das views e do _meta
+# dos models só precisam ser descartados quando o código é recarregado (reinício do processo)
+# Colunas compiladas de cada view, ex: {(View, Model, ('pk', 'nome')): [Column, ...]}
+_columns_cache = {}
+_columns_lock = threading.Lock()
+# list_display ordenado e validado de cada view, ex: {(View, Model, ('nome',)): (('pk', 'nome'), ())}
+_list_display_cache = {}
+# Cabeçalhos da tabela, ex: {(View, Model, ('pk', 'nome'), False): ['pk', 'Nome']}
+_headers_cache = {}
+# Plano de consulta, ex: {(Model, ('pk', 'nome')): QueryPlan}
+_plan_cache = {}
+
+
+def has_fk_attr(classe=None, attr=None):
+    try:
+        classe.objects.values(attr)
+    except Exception as e:
+        return False
+    return True
+
+
+def is_lookup(name):
+    """Verifica se o campo do list_display é um caminho de relacionamento, ex: pai__nome"""
+    return '__' in name and name != '__str__'
+
+
+def fetch_lookup_values(model, pks, lookups):
+    """Recupera em uma única consulta os valores dos campos de relacionamento (__)
+    de todos os registros da página
+
+    Arguments:
+        model {Model} -- Classe do model da listagem
+        pks {List} -- Lista com as pks dos registros da página
+        lookups {List} -- Lista com os caminhos dos campos, ex: ['pai__nome', 'pai__avo__nome']
+
+    Returns:
+        Dict -- Dicionário no formato {pk: {lookup: 'valor'}}. Caso o relacionamento
+                retorne mais de um valor (ManyToMany) os valores são separados por vírgula
+    """
+    if not pks or not lookups:
+        return {}
+
+    valores = OrderedDict((pk, OrderedDict((lookup, []) for lookup in lookups)) for pk in pks)
+    for item in model._base_manager.filter(pk__in=pks).values_list('pk', *lookups):
+        linha = valores.get(item[0])
+        if linha is None:
+            continue
+        for lookup, valor in zip(lookups, item[1:]):
+            if valor is not None and valor not in linha[lookup]:
+                linha[lookup].append(valor)
+
+    return {pk: {lookup: ', '.join('{}'.format(valor) for valor in lista)
+                 for lookup, lista in linha.items()}
+            for pk, linha in valores.items()}
+
+
+def get_relation_map(model):
+    """Retorna um dicionário com os campos do model indexados pelo nome do atributo
+    utilizado no objeto, incluindo os relacionamentos reversos (ex: filho_set)
+    """
+    campos = {}
+    for field in model._meta.get_fields(include_parents=True):
+        if field.auto_created and not field.concrete and hasattr(field, 'get_accessor_name'):
+            campos[field.get_accessor_name()] = field
+        else:
+            campos[field.name] = field
+    return campos
+
+
+def is_multi_valued_path(model, path):
+    """Verifica se o caminho (ex: filhos__nome) passa por algum relacionamento
+    que retorna mais de um registro (ManyToMany ou ForeignKey reverso)
+    """
+    for name in path.split('__'):
+        if model is None:
+            return False
+        try:
+            field = model._meta.get_field(name)
+        except Exception:
+            return False
+        if field.many_to_many or field.one_to_many:
+            return True
+        model = field.related_model if field.is_relation else None
+    return False
+
+
+def get_source_path(field):
+    """Retorna o caminho do model relacionado até o model da listagem (ex: Tag -> produto),
+    ou None quando o campo não é um ManyToMany ou relacionamento reverso
+    """
+    if not (field.many_to_many or field.one_to_many) or getattr(field, 'related_model', None) is None:
+        return None
+    if field.concrete:
+        # ManyToManyField declarado no próprio model
+        return field.related_query_name()
+    if hasattr(field, 'get_accessor_name'):
+        # ForeignKey ou ManyToManyField reverso (filho_set)
+        return field.field.name
+    return None
+
+
+def get_many_fields(model, list_display):
+    """Retorna as colunas do list_display que são ManyToMany ou relacionamentos reversos (ex: filho_set)"""
+    campos = get_relation_map(model)
+    return [name for name in list_display if name in campos and get_source_path(campos[name])]
+
+
+def format_many(labels, total):
+    """Junta os valores do relacionamento, indicando a quantidade de valores não exibidos, ex: 'a, b, c +12'"""
+    texto = ', '.join(labels)
+    if total > len(labels):
+        texto = '{} +{}'.format(texto, total - len(labels))
+    return texto
+
+
+def fetch_many_values(model, pks, names, limit):
+    """Recupera os valores das colunas ManyToMany de todos os registros da página com uma única
+    consulta por coluna, retornando no máximo limit valores de cada registro
+
+    A limitação é feita no banco com as window functions ROW_NUMBER() e COUNT() OVER (PARTITION BY ...),
+    sem carregar todos os registros relacionados. Caso o banco não suporte window functions
+    os valores são limitados após a consulta
+
+    Arguments:
+        model {Model} -- Classe do model da listagem
+        pks {List} -- Lista com as pks dos registros da página
+        names {List} -- Colunas ManyToMany do list_display, ex: ['tags', 'filho_set']
+        limit {int} -- Quantidade máxima de valores exibidos por registro
+
+    Returns:
+        Dict -- Dicionário no formato {pk: {coluna: 'a, b, c +12'}}
+    """
+    if not pks or not names:
+        return {}
+
+    campos = get_relation_map(model)
+    labels = {pk: {name: [] for name in names} for pk in pks}
+    totais = {pk: {name: 0 for name in names} for pk in pks}
+    for name in names:
+        field = campos[name]
+        related_model = field.related_model
+        path = get_source_path(field)
+        manager = related_model._default_manager
+        queryset = manager.filter(**{'{}__in'.format(path): pks}).annotate(many_source=F(path))
+        connection = connections[queryset.db]
+        if connection.features.supports_over_clause:
+            ordering = [F(campo[1:]).desc() if campo.startswith('-') else F(campo).asc()
+                        for campo in (related_model._meta.ordering or ['pk']) if isinstance(campo, str)]
+            queryset = queryset.annotate(
+                many_position=Window(RowNumber(), partition_by=[F(path)], order_by=ordering or [F('pk').asc()]),
+                many_total=Window(Count('pk'), partition_by=[F(path)])).order_by()
+            sql, params = queryset.query.sql_with_params()
+            objetos = manager.raw(
+                'SELECT * FROM ({}) many_values WHERE many_position <= %s '
+                'ORDER BY many_source, many_position'.format(sql), tuple(params) + (limit,))
+        else:
+            objetos = queryset.order_by(*(related_model._meta.ordering or ['pk']))
+        for obj in objetos:
+            source = model._meta.pk.to_python(obj.many_source)
+            if source not in labels:
+                continue
+            totais[source][name] = getattr(obj, 'many_total', totais[source][name] + 1)
+            if len(labels[source][name]) < limit:
+                labels[source][name].append('{}'.format(obj))
+
+    return {pk: {name: format_many(labels[pk][name], totais[pk][name]) for name in names} for pk in pks}
+
+
+class QueryPlan(object):
+    """Plano de consulta da listagem com os relacionamentos que devem ser
+    carregados junto com os registros e as colunas que devem ser recuperadas
+
+    Attributes:
+        select_related {List} -- ForeignKey e OneToOne exibidos no list_display
+        prefetch_related {List} -- ManyToMany e relacionamentos reversos exibidos no list_display
+        only {List} -- Colunas carregadas, None quando não é seguro restringir as colunas
+    """
+
+    def __init__(self, select_related=None, prefetch_related=None, only=None):
+        self.select_related = select_related or []
+        self.prefetch_related = prefetch_related or []
+        self.only = only
+
+    def apply(self, queryset, skip_prefetch=()):
+        """Aplica o plano na queryset informada
+
+        Keyword Arguments:
+            skip_prefetch {List} -- Relacionamentos que não devem ser carregados pelo prefetch_related,
+                                    ex: colunas ManyToMany recuperadas pelo fetch_many_values (default: {()})
+        """
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        prefetch_related = [name for name in self.prefetch_related if name not in skip_prefetch]
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+def get_query_plan(model, list_display):
+    """Retorna o plano de consulta do list_display, montando-o apenas na primeira chamada"""
+    key = (model, tuple(list_display))
+    plan = _plan_cache.get(key)
+    if plan is None:
+        plan = plan_queryset(model, list_display)
+        _plan_cache[key] = plan
+    return plan
+
+
+def plan_queryset(model, list_display):
+    """Monta o plano de consulta da listagem analisando o list_display e o _meta do model
+
+    - ForeignKey/OneToOne exibidos são carregados com select_related
+    - ManyToMany e relacionamentos reversos exibidos são carregados com prefetch_related
+    - Caso todas as colunas exibidas sejam campos do model apenas elas são carregadas (only).
+      Se houver __str__ ou métodos (do model ou da view) não é possível saber quais campos
+      são utilizados e todas as colunas são carregadas
+
+    Arguments:
+        model {Model} -- Classe do model da listagem
+        list_display {List} -- Campos exibidos na listagem
+
+    Returns:
+        QueryPlan -- Plano de consulta
+    """
+    campos = get_relation_map(model)
+    select_related = []
+    prefetch_related = []
+    only = [model._meta.pk.name]
+    restringir_colunas = True
+
+    for name in list_display:
+        if name in ('pk', model._meta.pk.name):
+            continue
+        if is_lookup(name):
+            # os campos de relacionamento (pai__nome) são recuperados em uma consulta separada
+            continue
+        field = campos.get(name)
+        if field is None:
+            # __str__, properties e métodos do model ou da view podem acessar qualquer campo
+            restringir_colunas = False
+            continue
+        if field.many_to_many or field.one_to_many:
+            prefetch_related.append(name)
+        elif field.is_relation and field.concrete:
+            select_related.append(name)
+            only.append(name)
+        elif field.one_to_one and field.auto_created:
+            # OneToOne reverso
+            select_related.append(name)
+        elif field.is_relation:
+            # GenericForeignKey depende dos campos content_type e object_id
+            prefetch_related.append(name)
+            restringir_colunas = False
+        elif field.concrete:
+            only.append(field.name)
+        else:
+            restringir_colunas = False
+
+    return QueryPlan(select_related=select_related, prefetch_related=prefetch_related,
+                     only=only if restringir_colunas else None)
+
+
+class Column(object):
+    """Coluna compilada do list_display
+
+    Attributes:
+        name {str} -- Nome da coluna no list_display
+        render {Callable} -- Função render(view, obj, lookup_values) que retorna o valor da célula
+        lookup {Bool} -- True quando é um campo de relacionamento (pai__nome), recuperado por fetch_lookup_values
+        many {Bool} -- True quando é um ManyToMany ou relacionamento reverso, que pode ser recuperado por fetch_many_values
+    """
+    __slots__ = ('name', 'render', 'lookup', 'many')
+
+    def __init__(self, name, render, lookup=False, many=False):
+        self.name = name
+        self.render = render
+        self.lookup = lookup
+        self.many = many
+
+
+def _render_text(obj, value):
+    return "{}".format(value.__str__())
+
+
+def _render_many(obj, value):
+    # pega uma string feita com o str de cada objeto da lista
+    return ', '.join('{}'.format(sub_obj) for sub_obj in value.all())
+
+
+def _make_render_choice(name):
+    metodo_choice = 'get_{nome}_display'.format(nome=name)
+
+    def render_choice(obj, value):
+        return "{}".format(getattr(obj, metodo_choice)().__str__())
+    return render_choice
+
+
+def _make_render_datetime():
+    tz = pytz.timezone(settings.TIME_ZONE)
+    formato = settings.DATETIME_INPUT_FORMATS[0] or "%d/%m/%Y %H:%M"
+
+    def render_datetime(obj, value):
+        return "{}".format(tz.normalize(value).strftime(formato))
+    return render_datetime
+
+
+def _make_render_date():
+    formato = settings.DATE_INPUT_FORMATS[0] or "%d/%m/%Y"
+
+    def render_date(obj, value):
+        return "{}".format(value.strftime(formato))
+    return render_date
+
+
+def _make_render_dynamic():
+    """Renderer para atributos que não são campos do model (properties),
+    o tipo do valor só é conhecido no momento da renderização
+    """
+    render_datetime = _make_render_datetime()
+    render_date = _make_render_date()
+
+    def render_dynamic(obj, value):
+        if type(value) == datetime:
+            return render_datetime(obj, value)
+        elif type(value) == date:
+            return render_date(obj, value)
+        elif hasattr(value, 'all'):
+            return _render_many(obj, value)
+        return _render_text(obj, value)
+    return render_dynamic
+
+
+def _make_render_attr(name, render_value):
+    def render_attr(view, obj, lookup_values):
+        try:
+            value = getattr(obj, name)
+        except ObjectDoesNotExist:
+            # OneToOne reverso sem registro relacionado
+            value = None
+        # no caso de campos None ele coloca para aparecer vazio
+        if value is None:
+            return ""
+        return render_value(obj, value)
+    return render_attr
+
+
+def compile_column(view_class, model, name, campos=None):
+    """Compila a coluna do list_display em uma função especializada de acordo com
+    o tipo do campo: choice, datetime, date, ManyToMany, caminho de relacionamento,
+    método da view ou __str__
+
+    Arguments:
+        view_class {View} -- Classe da view da listagem
+        model {Model} -- Classe do model da listagem
+        name {str} -- Nome da coluna no list_display
+
+    Returns:
+        Column -- Coluna compilada ou None caso não seja possível exibir a coluna
+    """
+    if campos is None:
+        campos = get_relation_map(model)
+
+    if is_lookup(name) and has_fk_attr(model, name):
+        def render_lookup(view, obj, lookup_values):
+            return lookup_values.get(obj.pk, {}).get(name, "")
+        return Column(name, render_lookup, lookup=True)
+
+    if name == '__str__':
+        def render_str(view, obj, lookup_values):
+            return "{}".format(obj.__str__())
+        return Column(name, render_str)
+
+    if hasattr(model, name):
+        field = campos.get(name)
+        if hasattr(model, 'get_{nome}_display'.format(nome=name)):
+            render_value = _make_render_choice(name)
+        elif isinstance(field, DateTimeField):
+            render_value = _make_render_datetime()
+        elif isinstance(field, DateField):
+            render_value = _make_render_date()
+        elif field is not None and (field.many_to_many or field.one_to_many):
+            render_attr = _make_render_attr(name, _render_many)
+
+            def render_many(view, obj, lookup_values):
+                # valores limitados recuperados pelo fetch_many_values, junto com os campos de relacionamento
+                valores = lookup_values.get(obj.pk)
+                if valores is not None and name in valores:
+                    return valores[name]
+                return render_attr(view, obj, lookup_values)
+            return Column(name, render_many, many=get_source_path(field) is not None)
+        elif field is not None:
+            render_value = _render_text
+        else:
+            render_value = _make_render_dynamic()
+        return Column(name, _make_render_attr(name, render_value))
+
+    if hasattr(view_class, name):
+        # verifica se existe alguma função feita na view e usada no display
+        # então usa o retorno da função para aparecer na lista
+        def render_view_method(view, obj, lookup_values):
+            return getattr(view, name)(obj)
+        return Column(name, render_view_method)
+
+    return None
+
+
+def get_columns(view_class, model, list_display):
+    """Retorna as colunas compiladas do list_display, compilando-as apenas
+    na primeira chamada de cada view
+
+    Arguments:
+        view_class {View} -- Classe da view da listagem
+        model {Model} -- Classe do model da listagem
+        list_display {List} -- Campos exibidos na listagem
+
+    Returns:
+        List -- Lista de Column na ordem do list_display
+    """
+    key = (view_class, model, tuple(list_display))
+    columns = _columns_cache.get(key)
+    if columns is None:
+        with _columns_lock:
+            campos = get_relation_map(model)
+            columns = [column for column in (compile_column(view_class, model, name, campos)
+                                             for name in list_display)
+                       if column is not None]
+            _columns_cache[key] = columns
+    return columns
+
+
+def _normalize_list_display(model, list_display):
+    """Define os campos padrões e ordena para que o pk sempre venha primeiro e o id em seguida"""
+    list_display = list(list_display or [])
+    # define os campos padrões
+    if not list_display:
+        list_display = ['pk', '__str__']
+    # define os campos padrões
+    if 'pk' in list_display and len(list_display) <= 1 and hasattr(model, '__str__'):
+        list_display += ['__str__']
+
+    # ordena para que o id sempre venha primeiro ou em segundo caso tenha o pk
+    if 'id' in list_display:
+        list_display.remove('id')
+        list_display = ['id'] + list_display
+    # ordena para que o pk sempre venha primeiro
+    if 'pk' in list_display:
+        list_display.remove('pk')
+    return ['pk'] + list_display
+
+
+def _validate_list_display(view_class, model, list_display):
+    """Faz a checagem dos campos do list_display
+
+    Returns:
+        Tuple -- (campos válidos, mensagens de erro)
+    """
+    names = []
+    errors = []
+    for name in list_display:
+        # verifica casos onde pega campos dos filhos ex: pai__name
+        if is_lookup(name) and not has_fk_attr(model, name):
+            errors.append("%s ou a View não tem nenhum campo chamado '%s'" % (model._meta.model_name, name))
+        elif '__' not in name and not hasattr(model, name) and not hasattr(view_class, name):
+            errors.append("%s ou a View não tem nenhum campo chamado '%s'" % (model._meta.model_name, name))
+            continue
+        elif '__' not in name and not hasattr(model, name) and hasattr(view_class, name) and \
+                not getattr(getattr(view_class, name), 'allow_tags', False):
+            errors.append("%s não tem nenhum campo chamado '%s'" % (model._meta.model_name, name))
+            continue
+
+        if name not in names:
+            names.append(name)
+    return tuple(names), tuple(errors)
+
+
+def resolve_list_display(view_class, model, list_display):
+    """Retorna o list_display ordenado e validado, processando-o apenas
+    na primeira chamada de cada view
+
+    Arguments:
+        view_class {View} -- Classe da view da listagem
+        model {Model} -- Classe do model da listagem
+        list_display {List} -- list_display configurado na view
+
+    Returns:
+        Tuple -- (campos válidos, mensagens de erro dos campos inválidos)
+    """
+    key = (view_class, model, tuple(list_display or ()))
+    resolved = _list_display_cache.get(key)
+    if resolved is None:
+        resolved = _validate_list_display(view_class, model, _normalize_list_display(model, list_display))
+        _list_display_cache[key] = resolved
+    return resolved
+
+
+def _get_header(view_class, model, name, plural):
+    if name == '__str__':
+        return getattr(model._meta, 'verbose_name_plural' if plural else 'verbose_name')
+    if is_lookup(name) and has_fk_attr(model, name):
+        list_name = name.split('__')
+        list_name.reverse()
+        return ' '.join(list_name).title()
+    if name in ('pk', 'id'):
+        return name
+    # verifica se existe alguma função feita na view e usada no display
+    # verifica se é do tipo allow_tags
+    # e verifica se tem o short_description para usa-lo no cabeçalho da tabela do list
+    metodo = getattr(view_class, name, None)
+    if metodo is not None and getattr(metodo, 'allow_tags', False) and hasattr(metodo, 'short_description'):
+        return metodo.short_description
+    if hasattr(model, name):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise FieldDoesNotExist("%s não tem nenhum campo chamado '%s'" % (model._meta.model_name, name))
+        atributo = 'verbose_name_plural' if plural else 'verbose_name'
+        if hasattr(field, atributo):
+            return getattr(field, atributo).title()
+    return name
+
+
+def get_headers(view_class, model, list_display, plural=False):
+    """Retorna os cabeçalhos da tabela da listagem, montando-os apenas na primeira chamada
+
+    Arguments:
+        view_class {View} -- Classe da view da listagem
+        model {Model} -- Classe do model da listagem
+        list_display {List} -- Campos exibidos na listagem
+
+    Keyword Arguments:
+        plural {Bool} -- Utiliza o verbose_name_plural (default: {False})
+
+    Returns:
+        List -- Lista com o cabeçalho de cada coluna
+    """
+    key = (view_class, model, tuple(list_display), plural)
+    headers = _headers_cache.get(key)
+    if headers is None:
+        headers = [_get_header(view_class, model, name, plural) for name in list_display]
+        _headers_cache[key] = headers
+    return list(headers)
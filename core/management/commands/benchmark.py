@@ -0,0 +1,329 @@
+"""Manager responsible for running performance benchmarks of the core components
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import date, datetime
+
+import pytz
+from django.apps import apps
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from rest_framework import serializers
+from rest_framework.request import Request
+
+from nuvols.core.api import BaseModelViewSet
+from nuvols.core.listing import fetch_lookup_values, has_fk_attr
+from nuvols.core.management.commands.utils import Utils
+from nuvols.core.search import (IContainsSearchBackend, get_document_text,
+                                get_search_backend, get_terms)
+from nuvols.core.uuids import uuid7
+
+
+def render_rows_legacy(view, object_list, list_display):
+    """Row formatting as it was done by BaseListView before the compiled column pipeline,
+    kept only as the baseline of the render benchmark
+    """
+    list_item = []
+    for obj in object_list:
+        field_dict = {}
+        for field_display in list_display:
+            try:
+                if '__' in field_display and field_display != '__str__' and has_fk_attr(obj.__class__,
+                                                                                        field_display):
+                    for item_fk in object_list.values('id', field_display):
+                        if item_fk['id'] == obj.id:
+                            field_dict[field_display] = "{}".format(item_fk[field_display])
+                elif hasattr(obj, field_display) and field_display != '__str__':
+                    if obj.__getattribute__(field_display) is not None:
+                        str_metodo_choice = 'get_{nome}_display'.format(nome=field_display)
+                        if hasattr(obj, str_metodo_choice):
+                            field_dict[field_display] = "{}".format(getattr(obj, str_metodo_choice)().__str__())
+                        elif type(getattr(obj, field_display)) == datetime:
+                            tz = pytz.timezone(settings.TIME_ZONE)
+                            date_tz = tz.normalize(getattr(obj, field_display))
+                            field_dict[field_display] = "{}".format(
+                                date_tz.strftime(settings.DATETIME_INPUT_FORMATS[0] or "%d/%m/%Y %H:%M"))
+                        elif type(getattr(obj, field_display)) == date:
+                            field_dict[field_display] = "{}".format(
+                                getattr(obj, field_display).strftime(settings.DATE_INPUT_FORMATS[0] or "%d/%m/%Y"))
+                        elif hasattr(getattr(obj, field_display), 'all'):
+                            field_dict[field_display] = ', '.join(
+                                '{}'.format(sub_obj) for sub_obj in getattr(obj, field_display).all())
+                        else:
+                            field_dict[field_display] = "{}".format(getattr(obj, field_display).__str__())
+                    else:
+                        field_dict[field_display] = ""
+                elif field_display == '__str__':
+                    field_dict[field_display] = "{}".format(getattr(obj, field_display)())
+                elif hasattr(view, field_display) and view.__getattribute__(field_display):
+                    field_dict[field_display] = getattr(view, field_display)(obj)
+            except Exception:
+                continue
+        list_item.append(field_dict)
+    return list_item
+
+
+def render_rows_compiled(view, object_list, list_display):
+    """Row formatting using the compiled columns of BaseListView"""
+    columns = view.get_columns(list_display)
+    lookups = [column.name for column in columns if column.lookup]
+    lookup_values = fetch_lookup_values(view.model, [obj.pk for obj in object_list], lookups)
+    list_item = []
+    for obj in object_list:
+        field_dict = {}
+        for column in columns:
+            try:
+                field_dict[column.name] = column.render(view, obj, lookup_values)
+            except Exception:
+                continue
+        list_item.append(field_dict)
+    return list_item
+
+
+class Command(BaseCommand):
+    help = "Manager responsible for running performance benchmarks of the core components"
+
+    def add_arguments(self, parser):
+        """Method for adding positional arguments (required) and optional arguments
+        """
+        parser.add_argument('Benchmark', type=str, choices=['render', 'uuid', 'search', 'bulk'])
+        parser.add_argument('App', type=str, nargs='?')
+        parser.add_argument('Model', type=str, nargs='?')
+
+        parser.add_argument(
+            '--rows',
+            type=int,
+            dest='rows',
+            default=1000,
+            help='Quantidade de registros utilizados no benchmark'
+        )
+        parser.add_argument(
+            '--term',
+            type=str,
+            dest='term',
+            default=None,
+            help='Termo pesquisado no benchmark search'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            dest='repeat',
+            default=5,
+            help='Quantidade de repetições de cada medição'
+        )
+
+    def __get_list_view(self, app, model):
+        """Method responsible for instantiating the BaseListView registered for the model
+
+        Returns:
+            BaseListView instance or None
+        """
+        try:
+            view_class = resolve(reverse('{}:{}-list'.format(app.lower(), model.lower()))).func.view_class
+            view = view_class()
+            view.request = RequestFactory().get('/')
+            view.request._messages = CookieStorage(view.request)
+            view.kwargs = {}
+            return view
+        except Exception as error:
+            Utils.show_message(f"Error in __get_list_view: {error}", error=True)
+            return None
+
+    def __measure(self, function, repeat):
+        """Method that returns the best execution time (in seconds) of the function"""
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def __benchmark_render(self, options):
+        """Compares the per-page row formatting time of the legacy loop and the compiled columns
+        """
+        if not options['App'] or not options['Model']:
+            Utils.show_message("Informe a App e o Model da listagem.", error=True)
+            return
+        view = self.__get_list_view(options['App'], options['Model'])
+        if view is None:
+            return
+        list_display = view.get_list_display()
+        queryset = view.get_query_plan(list_display).apply(view.model.objects.all())
+        page = queryset[:options['rows']]
+        object_list = list(page)
+        Utils.show_message("Registros: {} Colunas: {}".format(len(object_list), len(list_display)))
+
+        legacy = self.__measure(lambda: render_rows_legacy(view, page, list_display), options['repeat'])
+        compiled = self.__measure(lambda: render_rows_compiled(view, object_list, list_display), options['repeat'])
+        Utils.show_message("Loop original: {:.2f} ms por página".format(legacy * 1000))
+        Utils.show_message("Colunas compiladas: {:.2f} ms por página".format(compiled * 1000))
+        if compiled:
+            Utils.show_message("Ganho: {:.1f}x".format(legacy / compiled))
+
+    def __insert_sqlite(self, keys, batch):
+        """Method that inserts the keys in batches into a new SQLite file database
+
+        Returns:
+            Tuple -- Elapsed time (in seconds) and size (in bytes) of the database file
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'benchmark.sqlite3')
+            connection = sqlite3.connect(path)
+            # mesma estrutura gerada pelo Django para o UUIDField no SQLite
+            connection.execute('CREATE TABLE "registro" ("id" char(32) NOT NULL PRIMARY KEY, '
+                               '"created_on" datetime NOT NULL, "name" varchar(50) NOT NULL)')
+            created_on = datetime.now().isoformat(' ')
+            start = time.perf_counter()
+            for first in range(0, len(keys), batch):
+                with connection:
+                    connection.executemany('INSERT INTO "registro" VALUES (?, ?, ?)',
+                                           [(key, created_on, 'registro') for key in keys[first:first + batch]])
+            elapsed = time.perf_counter() - start
+            connection.close()
+            return elapsed, os.path.getsize(path)
+
+    def __benchmark_uuid(self, options):
+        """Compares the bulk insert throughput of random (v4) and time-ordered (v7) primary keys
+        """
+        rows = options['rows']
+        Utils.show_message("Registros: {} (lotes de 10000, SQLite em arquivo)".format(rows))
+        results = {}
+        for name, generator in (('UUIDv4', uuid.uuid4), ('UUIDv7', uuid7)):
+            # as chaves são geradas antes para medir apenas a inserção no índice
+            keys = [generator().hex for _ in range(rows)]
+            best = None
+            for _ in range(options['repeat']):
+                elapsed, size = self.__insert_sqlite(keys, 10000)
+                best = (elapsed, size) if best is None or elapsed < best[0] else best
+            results[name] = best
+            Utils.show_message("{}: {:.2f} s, {:.0f} registros/s, arquivo {:.1f} MB".format(
+                name, best[0], rows / best[0], best[1] / 1024 / 1024))
+        if results['UUIDv7'][0]:
+            Utils.show_message("Ganho: {:.1f}x".format(results['UUIDv4'][0] / results['UUIDv7'][0]))
+
+    def __benchmark_search(self, options):
+        """Compares the icontains search with the configured search backend (SEARCH_BACKEND)
+        on the records of the model, using the search_fields of its BaseListView
+        """
+        if not options['App'] or not options['Model']:
+            Utils.show_message("Informe a App e o Model da listagem.", error=True)
+            return
+        view = self.__get_list_view(options['App'], options['Model'])
+        if view is None:
+            return
+        model = view.model
+        backend = get_search_backend(model, view.search_fields)
+        if not backend.full_text:
+            Utils.show_message("O SEARCH_BACKEND configurado não é de texto completo.", error=True)
+            return
+        if not backend.document_fields:
+            Utils.show_message("Nenhum campo do search_fields é pesquisado no SearchDocument.", error=True)
+            return
+        term = options['term']
+        if not term:
+            # primeira palavra do primeiro registro, para que a pesquisa encontre algum registro
+            obj = model._default_manager.first()
+            words = get_terms(get_document_text(obj, backend.document_fields)) if obj is not None else []
+            term = words[0] if words else 'a'
+        icontains = IContainsSearchBackend(model, view.search_fields)
+        Utils.show_message("Registros: {} Termo: {} Backend: {}".format(
+            model._default_manager.count(), term, backend.__class__.__name__))
+
+        searches = (
+            ('icontains', lambda: model._default_manager.filter(icontains.get_filter(term)).count()),
+            ('match', lambda: len(list(backend.match(term)))),
+            ('{} (search_fields)'.format(backend.__class__.__name__),
+             lambda: model._default_manager.filter(backend.get_filter(term)).count()),
+        )
+        results = {}
+        for name, function in searches:
+            total = function()
+            results[name] = self.__measure(function, options['repeat'])
+            Utils.show_message("{}: {:.2f} ms ({} registros encontrados)".format(name, results[name] * 1000, total))
+        last = searches[-1][0]
+        if results[last]:
+            Utils.show_message("Ganho: {:.1f}x".format(results['icontains'] / results[last]))
+
+    def __get_bulk_view(self, model):
+        """Method responsible for instantiating a BaseModelViewSet with a ModelSerializer of all fields
+
+        Returns:
+            BaseModelViewSet instance
+        """
+        meta = type('Meta', (), {'model': model, 'fields': '__all__'})
+        serializer_class = type('BenchmarkSerializer', (serializers.ModelSerializer,), {'Meta': meta})
+        view = BaseModelViewSet(queryset=model.objects.all(), serializer_class=serializer_class)
+        view.request = Request(RequestFactory().patch('/'))
+        view.format_kwarg = None
+        view.kwargs = {}
+        return view
+
+    def __run_rollback(self, function):
+        """Method that runs the function inside a transaction that is always rolled back
+
+        Returns:
+            Tuple -- Elapsed time (in seconds) and number of queries
+        """
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with transaction.atomic():
+            with connection.execute_wrapper(count):
+                start = time.perf_counter()
+                function()
+                elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return elapsed, len(queries)
+
+    def __benchmark_bulk(self, options):
+        """Compares saving the existing records one by one with the serializer and in batches with the
+        BaseModelViewSet.bulk_save, both inside a transaction that is rolled back
+        """
+        if not options['App'] or not options['Model']:
+            Utils.show_message("Informe a App e o Model da API.", error=True)
+            return
+        try:
+            model = apps.get_model(options['App'], options['Model'])
+        except LookupError as error:
+            Utils.show_message(f"Error in __benchmark_bulk: {error}", error=True)
+            return
+        view = self.__get_bulk_view(model)
+        objects = list(model.objects.all()[:options['rows']])
+        items = view.get_serializer(objects, many=True).data
+        Utils.show_message("Registros: {} (alteração com PATCH)".format(len(items)))
+
+        def one_by_one():
+            for obj, item in zip(objects, items):
+                serializer = view.get_serializer(obj, data=item, partial=True)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+
+        results = {}
+        for name, function in (('Um por vez', one_by_one),
+                               ('Em lote', lambda: view.bulk_save(items, update=True, partial=True))):
+            results[name] = self.__run_rollback(function)
+            Utils.show_message("{}: {:.2f} s, {} consultas".format(name, *results[name]))
+        if results['Em lote'][0]:
+            Utils.show_message("Ganho: {:.1f}x".format(results['Um por vez'][0] / results['Em lote'][0]))
+
+    def handle(self, *args, **options):
+        if options['Benchmark'] == 'render':
+            self.__benchmark_render(options)
+        elif options['Benchmark'] == 'uuid':
+            self.__benchmark_uuid(options)
+        elif options['Benchmark'] == 'search':
+            self.__benchmark_search(options)
+        elif options['Benchmark'] == 'bulk':
+            self.__benchmark_bulk(options)
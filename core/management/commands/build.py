@@ -486,11 +486,18 @@ class Command(BaseCommand):
                 Utils.show_message("O model informado já possui serializer configurado.")
                 return
 
-            if self.__check_content(self.path_serializer, "from rest_framework.serializers import ModelSerializer"):
+            has_base_import = self.__check_content(self.path_serializer,
+                                                   "from nuvols.core.serializers import BaseModelSerializer")
+            if has_base_import or self.__check_content(self.path_serializer,
+                                                       "from rest_framework.serializers import ModelSerializer"):
+                base_import = content_urls.split("\n")[0]
                 content_urls = content_urls.split("\n")[1]
                 arquivo = open(self.path_serializer, "r")
                 data = []
                 for line in arquivo:
+                    # arquivos gerados antes do BaseModelSerializer
+                    if not has_base_import and line.startswith('from rest_framework.serializers import ModelSerializer'):
+                        line = '{}{}\n'.format(line, base_import)
                     if line.startswith('from .models import'):
                         models = line.split('import')[-1].rstrip()
                         import_model = ', ' + content_urls.split()[-1]
@@ -941,8 +941,8 @@ class Command(BaseCommand):
                 return
 
             content = ParserContent(
-                ["$ModelClass$", "$modelClass$", "$project$"],
-                [app.model_name, app.model_name_lower, self.flutter_project],
+                ["$ModelClass$", "$modelClass$", "$project$", "$App$", "$Model$"],
+                [app.model_name, app.model_name_lower, self.flutter_project, app.app_name, app.model_name_lower],
                 self.__get_snippet(f"{self.snippet_dir}data.txt"), ).replace()
 
             with open(__data_file, "w", encoding="utf-8") as data_helper:
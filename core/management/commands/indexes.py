@@ -0,0 +1,98 @@
+"""Manager responsible for proposing and creating the indexes used by the list views
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from nuvols.core.indexes import get_list_views, propose_indexes
+from nuvols.core.management.commands.utils import Utils
+
+
+class Command(BaseCommand):
+    help = "Manager responsible for proposing and creating the indexes used by the list views"
+
+    def add_arguments(self, parser):
+        """Method for adding positional arguments (required) and optional arguments
+        """
+        parser.add_argument('App', type=str, nargs='?')
+        parser.add_argument('Model', type=str, nargs='?')
+
+        parser.add_argument(
+            '--database',
+            type=str,
+            dest='database',
+            default='default',
+            help='Banco de dados analisado'
+        )
+        parser.add_argument(
+            '--sql',
+            action='store_true',
+            dest='sql',
+            help='Exibe o SQL de criação dos índices sugeridos'
+        )
+        parser.add_argument(
+            '--create',
+            action='store_true',
+            dest='create',
+            help='Cria no banco de dados os índices sugeridos'
+        )
+
+    def __get_targets(self, app, model):
+        """Method responsible for collecting the models, filters and search fields of the registered list views
+
+        Returns:
+            Dict -- Model as key and a tuple (list_filter, search_fields) as value
+        """
+        targets = {}
+        for view in get_list_views():
+            _model = view.model
+            if app and _model._meta.app_label.lower() != app.lower():
+                continue
+            if model and _model._meta.model_name != model.lower():
+                continue
+            list_filter, search_fields = targets.get(_model, ([], []))
+            list_filter.extend(name for name in view.list_filter if name not in list_filter)
+            search_fields.extend(name for name in view.search_fields if name not in search_fields)
+            targets[_model] = (list_filter, search_fields)
+        return targets
+
+    def __format_index(self, index):
+        """Method that returns the declaration of the index to be added to the Meta.indexes of the model"""
+        path, args, kwargs = index.deconstruct()
+        if kwargs.get('condition') is not None:
+            kwargs['condition'] = 'Q({})'.format(', '.join('{}={!r}'.format(*item) for item in kwargs['condition'].children))
+        params = ', '.join('{}={}'.format(key, value if key == 'condition' else repr(value))
+                           for key, value in kwargs.items())
+        return '{}({})'.format(path.rsplit('.', 1)[-1], params)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        targets = self.__get_targets(options['App'], options['Model'])
+        if not targets:
+            Utils.show_message("Nenhuma listagem (BaseListView) encontrada nas urls.")
+            return
+
+        total = 0
+        for model, (list_filter, search_fields) in targets.items():
+            proposals = propose_indexes(model, connection, list_filter, search_fields)
+            if not proposals:
+                continue
+            Utils.show_message("Model {}".format(model._meta.label))
+            for proposal in proposals:
+                total += 1
+                Utils.show_message("    {}  # {}".format(self.__format_index(proposal.index), proposal.reason))
+                if options['create']:
+                    with connection.schema_editor() as editor:
+                        if options['sql']:
+                            Utils.show_message("    {}".format(proposal.index.create_sql(model, editor)))
+                        editor.add_index(model, proposal.index)
+                elif options['sql']:
+                    with connection.schema_editor(collect_sql=True) as editor:
+                        editor.add_index(model, proposal.index)
+                    for sql in editor.collected_sql:
+                        Utils.show_message("    {}".format(sql))
+
+        if not total:
+            Utils.show_message("Todos os índices sugeridos já existem no banco de dados.")
+        elif options['create']:
+            Utils.show_message("{} índice(s) criado(s).".format(total))
@@ -0,0 +1,130 @@
+"""Manager responsible for rebuilding the search documents (full-text and generic relations) of the list views
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+
+from nuvols.core.indexes import get_list_views
+from nuvols.core.management.commands.utils import Utils
+from nuvols.core.models import GenericSearchText, SearchDocument
+from nuvols.core.search import (get_document_fields, get_document_text, get_generic_search_specs,
+                                get_generic_text, get_search_backend_class)
+from nuvols.core.settings import generic_search_index
+
+
+class Command(BaseCommand):
+    help = "Manager responsible for rebuilding the search documents (full-text and generic relations) of the list views"
+
+    def add_arguments(self, parser):
+        """Method for adding positional arguments (required) and optional arguments
+        """
+        parser.add_argument('App', type=str, nargs='?')
+        parser.add_argument('Model', type=str, nargs='?')
+
+        parser.add_argument(
+            '--batch',
+            type=int,
+            dest='batch',
+            default=2000,
+            help='Quantidade de documentos gravados por vez'
+        )
+
+    def __get_models(self, app, model):
+        """Method that returns the models of the registered list views"""
+        models = []
+        for view in get_list_views():
+            _model = view.model
+            if app and _model._meta.app_label.lower() != app.lower():
+                continue
+            if model and _model._meta.model_name != model.lower():
+                continue
+            if _model not in models:
+                models.append(_model)
+        return models
+
+    def __rebuild(self, model, batch):
+        """Method that replaces all the search documents of the model
+
+        Returns:
+            int -- Amount of documents created
+        """
+        fields = get_document_fields(model)
+        content_type = ContentType.objects.get_for_model(model)
+        total = 0
+        with transaction.atomic():
+            SearchDocument.objects.filter(content_type=content_type).delete()
+            documents = []
+            for instance in model._base_manager.only('pk', *fields).iterator(chunk_size=batch):
+                documents.append(SearchDocument(content_type=content_type, object_id=instance.pk,
+                                                text=get_document_text(instance, fields)))
+                if len(documents) >= batch:
+                    SearchDocument.objects.bulk_create(documents)
+                    total += len(documents)
+                    documents = []
+            if documents:
+                SearchDocument.objects.bulk_create(documents)
+                total += len(documents)
+        return total
+
+    def __create_generic(self, content_type, instances, relation, paths):
+        """Method that creates the searchable text of a batch of instances, loading the
+        related objects with one query per content type
+
+        Returns:
+            int -- Amount of rows created
+        """
+        prefetch_related_objects(instances, relation)
+        rows = []
+        for instance in instances:
+            try:
+                target = getattr(instance, relation)
+            except Exception:
+                target = None
+            rows.append(GenericSearchText(content_type=content_type, object_id=instance.pk, field=relation,
+                                          text=get_generic_text(target, paths)))
+        GenericSearchText.objects.bulk_create(rows)
+        return len(rows)
+
+    def __rebuild_generic(self, model, relations, batch):
+        """Method that replaces the searchable text of the generic relations of the model
+
+        Returns:
+            int -- Amount of rows created
+        """
+        content_type = ContentType.objects.get_for_model(model)
+        total = 0
+        with transaction.atomic():
+            GenericSearchText.objects.filter(content_type=content_type).delete()
+            for relation, paths in relations.items():
+                instances = []
+                for instance in model._base_manager.iterator(chunk_size=batch):
+                    instances.append(instance)
+                    if len(instances) >= batch:
+                        total += self.__create_generic(content_type, instances, relation, paths)
+                        instances = []
+                if instances:
+                    total += self.__create_generic(content_type, instances, relation, paths)
+        return total
+
+    def handle(self, *args, **options):
+        full_text = get_search_backend_class().full_text
+        if not full_text and not generic_search_index:
+            Utils.show_message("O SEARCH_BACKEND e o GENERIC_SEARCH_INDEX configurados não utilizam "
+                               "os documentos de pesquisa.")
+            return
+        models = self.__get_models(options['App'], options['Model'])
+        specs = get_generic_search_specs() if generic_search_index else {}
+        total = 0
+        for model in models:
+            if full_text and get_document_fields(model):
+                total += 1
+                Utils.show_message("{}: {} documento(s)".format(model._meta.label,
+                                                                self.__rebuild(model, options['batch'])))
+            if model in specs:
+                total += 1
+                Utils.show_message("{}: {} texto(s) de relações genéricas".format(
+                    model._meta.label, self.__rebuild_generic(model, specs[model], options['batch'])))
+        if not total:
+            Utils.show_message("Nenhuma listagem (BaseListView) com search_fields encontrada.")
@@ -0,0 +1,77 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+from nuvols.core.settings import search_config
+
+# Tabela virtual FTS5 com o conteúdo do SearchDocument, mantida pelas triggers
+SQLITE_FTS = (
+    "CREATE VIRTUAL TABLE core_searchdocument_fts USING fts5("
+    "text, content='core_searchdocument', content_rowid='id')",
+    "CREATE TRIGGER core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER core_searchdocument_au AFTER UPDATE ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO core_searchdocument_fts(rowid, text) VALUES (new.id, new.text); END",
+)
+SQLITE_FTS_REVERSE = (
+    "DROP TRIGGER IF EXISTS core_searchdocument_au",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ai",
+    "DROP TABLE IF EXISTS core_searchdocument_fts",
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """Cria o índice de texto completo de acordo com o banco de dados"""
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX core_searchdocument_text_gin ON core_searchdocument "
+            "USING GIN (to_tsvector('%s'::regconfig, text))" % search_config)
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                # sem FTS5 a pesquisa continua utilizando o icontains
+                return
+        for sql in SQLITE_FTS:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_searchdocument_text_gin")
+    elif connection.vendor == 'sqlite':
+        for sql in SQLITE_FTS_REVERSE:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.UUIDField()),
+                ('text', models.TextField(blank=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                   to='contenttypes.ContentType')),
+            ],
+            options={
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations, models, transaction
+from django.db.utils import DatabaseError
+import django.db.models.deletion
+
+# Tabela virtual FTS5 com tokenizer trigram, permite o LIKE '%termo%' utilizar o índice
+SQLITE_FTS = (
+    "CREATE VIRTUAL TABLE core_genericsearchtext_fts USING fts5("
+    "text, content='core_genericsearchtext', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER core_genericsearchtext_ai AFTER INSERT ON core_genericsearchtext BEGIN "
+    "INSERT INTO core_genericsearchtext_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER core_genericsearchtext_ad AFTER DELETE ON core_genericsearchtext BEGIN "
+    "INSERT INTO core_genericsearchtext_fts(core_genericsearchtext_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER core_genericsearchtext_au AFTER UPDATE ON core_genericsearchtext BEGIN "
+    "INSERT INTO core_genericsearchtext_fts(core_genericsearchtext_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO core_genericsearchtext_fts(rowid, text) VALUES (new.id, new.text); END",
+)
+SQLITE_FTS_REVERSE = (
+    "DROP TRIGGER IF EXISTS core_genericsearchtext_au",
+    "DROP TRIGGER IF EXISTS core_genericsearchtext_ad",
+    "DROP TRIGGER IF EXISTS core_genericsearchtext_ai",
+    "DROP TABLE IF EXISTS core_genericsearchtext_fts",
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Cria o índice trigram de acordo com o banco de dados, caso não seja possível
+    (sem permissão para a extensão pg_trgm ou SQLite sem o tokenizer trigram)
+    a pesquisa continua funcionando com o icontains na tabela
+    """
+    connection = schema_editor.connection
+    try:
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == 'postgresql':
+                schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                # o icontains do Django utiliza UPPER(coluna) LIKE UPPER(%s)
+                schema_editor.execute(
+                    "CREATE INDEX core_genericsearchtext_trgm ON core_genericsearchtext "
+                    "USING GIN (UPPER(text) gin_trgm_ops)")
+            elif connection.vendor == 'sqlite':
+                for sql in SQLITE_FTS:
+                    schema_editor.execute(sql)
+    except DatabaseError:
+        pass
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_genericsearchtext_trgm")
+    elif connection.vendor == 'sqlite':
+        for sql in SQLITE_FTS_REVERSE:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenericSearchText',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.UUIDField()),
+                ('field', models.CharField(max_length=100)),
+                ('text', models.TextField(blank=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                   to='contenttypes.ContentType')),
+            ],
+            options={
+                'unique_together': {('content_type', 'object_id', 'field')},
+            },
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
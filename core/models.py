@@ -1,18 +1,26 @@
-import uuid
-
-from django.contrib.auth import get_permission_codename
-from django.contrib.contenttypes.fields import GenericForeignKey, GenericRel
+from django.contrib.contenttypes.fields import GenericRel
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
 from django.db import transaction
-from django.db.models import (AutoField, ManyToManyField,
-                              ManyToOneRel, ManyToManyRel,
-                              OneToOneRel, BooleanField,
-                              FileField, ImageField)
+from django.db.models import (ManyToManyField,
+                              ManyToOneRel, ManyToManyRel)
+from django.db.models.signals import class_prepared, m2m_changed
+from django.utils import timezone
 from rest_framework.pagination import PageNumberPagination
 
-from .settings import use_default_manager
+from .cache import bump_model_version, get_version_scope
+from .detail import get_detail_fields
+from .indexes import (get_soft_delete_index, get_sync_index,
+                      is_soft_delete_index_enabled, is_sync_index_enabled)
+from .permissions import get_permission_snapshot
+from .search import (delete_search_document, update_generic_search_text,
+                     update_search_document)
+from .settings import soft_delete_depth, use_default_manager
+from .uuids import get_uuid_default
 
-models.options.DEFAULT_NAMES += ('fk_fields_modal', 'fields_display', 'fk_inlines')
+models.options.DEFAULT_NAMES += ('fk_fields_modal', 'fields_display', 'fk_inlines', 'soft_delete_index', 'sync_index',
+                                 'version_scope', 'search_document_fields')
 
 
 class PaginacaoCustomizada(PageNumberPagination):
@@ -27,7 +35,132 @@ class PaginacaoCustomizada(PageNumberPagination):
     max_page_size = 100000
 
 
-class BaseManager(models.Manager):
+# Indica que a profundidade do soft delete deve ser a configurada no settings
+_DEPTH_SETTINGS = object()
+# Quantidade de pks por UPDATE ao marcar os registros relacionados, abaixo do limite de parâmetros do SQLite
+SOFT_DELETE_BATCH_SIZE = 500
+
+
+def _is_soft_deletable(model):
+    """Verifica se o model possui os campos deleted e enabled utilizados no soft delete"""
+    try:
+        model._meta.get_field('deleted')
+        model._meta.get_field('enabled')
+        return True
+    except FieldDoesNotExist:
+        return False
+
+
+def _soft_delete_values(model):
+    """Valores atribuídos pelo soft delete, o updated_on também é alterado para que
+    a sincronização (core/sync.py) envie a exclusão aos clientes
+    """
+    values = {'deleted': True, 'enabled': False}
+    try:
+        model._meta.get_field('updated_on')
+        values['updated_on'] = timezone.now()
+    except FieldDoesNotExist:
+        pass
+    return values
+
+
+def _get_related_querysets(model, queryset):
+    """Método para retornar os registros relacionados aos registros da queryset,
+    percorrendo os mesmos relacionamentos utilizados pelo Base.delete()
+
+    Arguments:
+        model {Model} -- Classe do model dos registros
+        queryset {QuerySet} -- Registros que estão sendo marcados como deleted
+
+    Returns:
+        List -- Lista de tuplas (model relacionado, queryset) sem o filtro de deleted,
+                para que a subconsulta continue válida após o UPDATE
+    """
+    pks = queryset.values('pk')
+    related = []
+    for field in model._meta.get_fields(include_parents=True):
+        related_model = field.related_model
+        if related_model is None or not _is_soft_deletable(related_model):
+            continue
+        manager = related_model._base_manager.using(queryset.db)
+        if type(field) is ManyToManyField:
+            filtro = {'{}__in'.format(field.related_query_name()): pks}
+        elif type(field) is ManyToOneRel or type(field) is ManyToManyRel:
+            filtro = {'{}__in'.format(field.field.name): pks}
+        elif type(field) is GenericRel:
+            # o object_id geralmente é texto, por isso os ids são recuperados antes da consulta
+            relation = field.field
+            content_type = ContentType.objects.db_manager(queryset.db).get_for_model(
+                model, for_concrete_model=relation.for_concrete_model)
+            filtro = {relation.content_type_field_name: content_type,
+                      '{}__in'.format(relation.object_id_field_name): [str(pk) for pk in
+                                                                        pks.values_list('pk', flat=True)]}
+        else:
+            continue
+        related.append((related_model, manager.filter(**filtro)))
+    return related
+
+
+def _soft_delete_related(model, queryset, depth, counts):
+    """Marca como deleted os registros relacionados, nível a nível, com um UPDATE por relacionamento
+
+    Os níveis mais profundos são processados apenas a partir dos registros marcados no nível
+    anterior, os registros que já estavam marcados como deleted não repassam a exclusão aos seus
+    relacionamentos, e um ramo deixa de ser percorrido quando nenhum registro novo foi marcado.
+    """
+    if depth is not None and depth <= 0:
+        return
+    for related_model, related in _get_related_querysets(model, queryset):
+        # as pks são recuperadas antes do UPDATE, depois dele não é possível diferenciar
+        # os registros marcados agora dos que já estavam marcados
+        pks = list(related.filter(deleted=False).values_list('pk', flat=True))
+        if not pks:
+            continue
+        manager = related_model._base_manager.using(queryset.db)
+        values = _soft_delete_values(related_model)
+        for first in range(0, len(pks), SOFT_DELETE_BATCH_SIZE):
+            marked = manager.filter(pk__in=pks[first:first + SOFT_DELETE_BATCH_SIZE])
+            marked.update(**values)
+            _soft_delete_related(related_model, marked, None if depth is None else depth - 1, counts)
+        label = related_model._meta.label
+        counts[label] = counts.get(label, 0) + len(pks)
+        bump_model_version(related_model)
+
+
+class BaseQuerySet(models.QuerySet):
+    """QuerySet com as operações em lote dos models que herdam de Base"""
+
+    def soft_delete(self, depth=_DEPTH_SETTINGS):
+        """Marca os registros como deleted = True e enabled = False, assim como
+        os registros relacionados, sem excluí-los do banco de dados.
+
+        Todas as alterações são feitas em uma única transação e com um
+        UPDATE ... WHERE fk IN (subconsulta) por relacionamento, sem carregar os registros.
+
+        Keyword Arguments:
+            depth {int} -- Quantidade de níveis de relacionamentos percorridos, 0 marca apenas os
+                           registros da queryset e None percorre todos os níveis
+                           (default: {settings.SOFT_DELETE_DEPTH ou 1})
+
+        Returns:
+            Dict -- Quantidade de registros marcados por model, ex: {'app.Model': 10}
+        """
+        if depth is _DEPTH_SETTINGS:
+            depth = soft_delete_depth
+        counts = {}
+        with transaction.atomic(using=self.db):
+            # os relacionados são marcados antes, enquanto a queryset ainda retorna os registros,
+            # a partir apenas dos registros que ainda não estavam marcados
+            _soft_delete_related(self.model, self.filter(deleted=False), depth, counts)
+            total = self.filter(deleted=False).update(**_soft_delete_values(self.model))
+        if total:
+            label = self.model._meta.label
+            counts[label] = counts.get(label, 0) + total
+            bump_model_version(self.model)
+        return counts
+
+
+class BaseManager(models.Manager.from_queryset(BaseQuerySet)):
     """Sobrescrevendo o Manager padrão. Nesse Manager 
     os registros não são apagados do banco de dados
     apenas desativados, atribuindo ao campo deleted = True e
@@ -53,7 +186,7 @@ class Base(models.Model):
     objects_all [Manager auxiliar para retornar todos os registro
                  mesmo que o use_default_manager esteja como True]
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=get_uuid_default(), editable=False)
     enabled = models.BooleanField('Ativo', default=True)
     deleted = models.BooleanField(default=False)
     created_on = models.DateTimeField(auto_now_add=True)
@@ -63,109 +196,77 @@ class Base(models.Model):
     if use_default_manager is False:
         objects = BaseManager()
     else:
-        objects = models.Manager()
+        objects = BaseQuerySet.as_manager()
 
     # Manager auxiliar para retornar todos os registro indepentende
     # da configuraçao do use_default_manager
-    objects_all = models.Manager()
+    objects_all = BaseQuerySet.as_manager()
 
-    def get_all_related_fields(self):
+    def get_all_related_fields(self, exclude=None, limit=20):
         """Método para retornar todos os campos que fazem referência ao 
         registro que está sendo manipulado
-        
+
+        Os campos são obtidos do plano de campos do model (detail.get_detail_plan), montado apenas
+        na primeira chamada, e cada relacionamento carrega no máximo `limit` registros
+
+        Keyword Arguments:
+            exclude {List} -- Campos que não devem ser exibidos, se None utiliza o atributo exclude do model
+            limit {int} -- Quantidade máxima de registros de cada relacionamento (default: {20})
+
         Returns:
             [Listas] -- [São retornadas duas listas a primeira com
                          os campos 'comuns' e a segunda lista os campos que 
                          possuem relacionamento ManyToMany ou ForeignKey]
         """
+        if exclude is None:
+            exclude = getattr(self, 'exclude', ())
+        return get_detail_fields(self, exclude, limit)
 
-        try:
-            # Lista para retornar os campos que não são de relacionamento
-            object_list = []
-
-            # Lista para retornar os campos com relacionamento
-            many_fields = []
-
-            for field in self._meta.get_fields(include_parents=True):
-                # Verificando se existe o atributo exclude no atributo que está sendo analisado
-                if hasattr(self, 'exclude'):
-                    if field.name in Base().get_exclude_hidden_fields() or field.name in self.exclude:
-                        continue
-                # Desconsiderando o campo do tipo AutoField da análise
-                if isinstance(field, AutoField):
-                    continue
-                # Desconsiderando os campos com atributos auto_now_add ou now_add da análise
-                if hasattr(field, "auto_now_add") or hasattr(field, "now_add"):
-                    continue
-
-                # Verificando o tipo do relacionamento entre os campos
-                if type(field) is ManyToManyField:
-                    many_fields.append((
-                        field.verbose_name or field.name,
-                        self.__getattribute__(field.name).all() or None
-                    ))
-                elif type(field) is ManyToOneRel or type(field) is ManyToManyRel:
-                    many_fields.append((field.related_model._meta.verbose_name_plural or field.name,
-                                        self.__getattribute__(
-                                            (field.related_name or '{}_set'.format(field.name))
-                                        )))
-                elif type(field) is GenericRel or type(field) is GenericForeignKey:
-                    many_fields.append(((field.verbose_name if hasattr(field, 'verbose_name') else None) or field.name,
-                                        self.object.__getattribute__(field.name)))
-                elif type(field) is OneToOneRel:
-                    try:
-                        object_list.append((field.related_model._meta.verbose_name or field.name,
-                                            self.object.__getattribute__(field.name)))
-                    except Exception:
-                        pass
-                elif type(field) is BooleanField:
-                    object_list.append(((field.verbose_name if hasattr(field, 'verbose_name') else None) or field.name,
-                                        "Sim" if self.__getattribute__(field.name) else "Nâo"))
-                elif type(field) is ImageField or type(field) is FileField:
-                    tag = ''
-                    if self.__getattribute__(field.name).name:
-                        if type(field) is ImageField:
-                            tag = '<img width="100px" src="{url}" alt="{nome}" />'
-                        elif type(field) is FileField:
-                            tag = '<a  href="{url}" > <i class="fas fa-file"></i> {nome}</a>'
-                        if tag:
-                            tag = tag.format(url=self.__getattribute__(field.name).url,
-                                             nome=self.__getattribute__(field.name).name.split('.')[0])
-
-                    object_list.append(((field.verbose_name if hasattr(field, 'verbose_name') else None) or field.name,
-                                        tag))
-                else:
-                    object_list.append(((field.verbose_name if hasattr(field, 'verbose_name') else None) or field.name,
-                                        self.__getattribute__(field.name)))
-
-        finally:
-            # Retornando as listas
-            return object_list, many_fields
-
-    def delete(self, using='default', keep_parents=False):
+    def save(self, *args, **kwargs):
+        """Sobrescrevendo o método para invalidar os caches (ex: filtros das listagens)
+        que dependem dos registros do model
+        """
+        super(Base, self).save(*args, **kwargs)
+        bump_model_version(self.__class__, get_version_scope(self))
+        update_search_document(self)
+        update_generic_search_text(self)
+
+    def delete(self, using='default', keep_parents=False, depth=_DEPTH_SETTINGS):
         """Sobrescrevendo o método para marcar os campos
         deleted como True e enabled como False. Assim o
         item não é excluído do banco de dados.
+
+        Keyword Arguments:
+            depth {int} -- Quantidade de níveis de relacionamentos marcados como deleted,
+                           ver BaseQuerySet.soft_delete() (default: {settings.SOFT_DELETE_DEPTH ou 1})
+
+        Returns:
+            Dict -- Quantidade de registros marcados por model, ex: {'app.Model': 1}
         """
         # Verificando se deve ser utilizado o manager costumizado
         if use_default_manager is False:
 
             # Iniciando uma transação para garantir a integridade dos dados
-            with transaction.atomic():
+            with transaction.atomic(using=using):
 
-                # Recuperando as listas com os campos do objeto
-                object_list, many_fields = self.get_all_related_fields()
+                # Marcando os registros relacionados em lote
+                counts = {}
+                queryset = self.__class__._base_manager.using(using).filter(pk=self.pk)
+                if depth is _DEPTH_SETTINGS:
+                    depth = soft_delete_depth
+                _soft_delete_related(self.__class__, queryset, depth, counts)
 
-                # Percorrendo todos os campos que possuem relacionamento com o objeto
-                for obj, values in many_fields:
-                    if values is not None and values.all():
-                        values.all().update(deleted=True, enabled=False)
                 # Atualizando o registro 
                 self.deleted = True
                 self.enabled = False
-                self.save(update_fields=['deleted', 'enabled'])
+                self.save(update_fields=['deleted', 'enabled', 'updated_on'])
+                counts[self._meta.label] = counts.get(self._meta.label, 0) + 1
+            return counts
         else:
+            delete_search_document(self)
+            scope = get_version_scope(self)
             super(Base, self).delete()
+            bump_model_version(self.__class__, scope)
 
     class Meta:
         """ Configure abstract class """
@@ -183,9 +284,7 @@ class Base(models.Model):
         Returns True if the given request has permission to add an object.
         Can be overridden by the user in subclasses.
         """
-        opts = self._meta
-        codename = get_permission_codename('add', opts)
-        return request.user.has_perm("%s.%s" % (opts.app_label, codename))
+        return get_permission_snapshot(request).has_add_permission(self)
 
     def has_change_permission(self, request, obj=None):
         """
@@ -197,9 +296,7 @@ class Base(models.Model):
         model instance. If `obj` is None, this should return True if the given
         request has permission to change *any* object of the given type.
         """
-        opts = self._meta
-        codename = get_permission_codename('change', opts)
-        return request.user.has_perm("%s.%s" % (opts.app_label, codename))
+        return get_permission_snapshot(request).has_change_permission(self)
 
     def has_delete_permission(self, request, obj=None):
         """
@@ -211,9 +308,90 @@ class Base(models.Model):
         model instance. If `obj` is None, this should return True if the given
         request has permission to delete *any* object of the given type.
         """
-        opts = self._meta
-        codename = get_permission_codename('delete', opts)
-        return request.user.has_perm("%s.%s" % (opts.app_label, codename))
+        return get_permission_snapshot(request).has_delete_permission(self)
 
     def __str__(self):
         return self.updated_on.strftime('%d/%m/%Y %H:%M:%S')
+
+
+class SearchDocument(models.Model):
+    """Texto dos campos do search_fields de cada registro, utilizado pelos
+    backends de pesquisa de texto completo (ver core/search.py).
+    Os índices (GIN no PostgreSQL e a tabela virtual FTS5 no SQLite) são criados na migration
+    """
+    # declarado para que o DEFAULT_AUTO_FIELD do projeto não gere migrations no pacote
+    id = models.AutoField(primary_key=True, verbose_name='ID')
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.UUIDField()
+    text = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ('content_type', 'object_id')
+
+
+class GenericSearchText(models.Model):
+    """Texto pesquisável dos registros referenciados pelas relações genéricas
+    (GenericForeignKey) utilizadas no search_fields, ex: content_object__nome.
+    Cada linha pertence ao registro que possui a relação genérica (content_type/object_id)
+    e é atualizada pelo Base.save() de ambos os lados da relação (ver core/search.py)
+    """
+    # declarado pelo mesmo motivo do SearchDocument.id
+    id = models.AutoField(primary_key=True, verbose_name='ID')
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.UUIDField()
+    field = models.CharField(max_length=100)
+    text = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ('content_type', 'object_id', 'field')
+
+
+def add_soft_delete_index(sender, **kwargs):
+    """Adiciona o índice parcial do soft delete aos models concretos que herdam de Base,
+    caso habilitado no Meta.soft_delete_index ou no SOFT_DELETE_INDEXES do settings.
+    O índice passa a fazer parte do estado do model e é gerado pelo makemigrations
+    """
+    if not issubclass(sender, Base) or sender._meta.abstract or sender._meta.proxy:
+        return
+    if not is_soft_delete_index_enabled(sender):
+        return
+    index = get_soft_delete_index(sender)
+    if any(item.name == index.name for item in sender._meta.indexes):
+        return
+    sender._meta.indexes = list(sender._meta.indexes) + [index]
+    # o makemigrations considera apenas os índices presentes nos atributos originais do Meta
+    sender._meta.original_attrs['indexes'] = sender._meta.indexes
+
+
+class_prepared.connect(add_soft_delete_index)
+
+
+def add_sync_index(sender, **kwargs):
+    """Adiciona o índice (updated_on, pk) utilizado pela sincronização aos models concretos que herdam
+    de Base, caso habilitado no Meta.sync_index ou no SYNC_INDEXES do settings
+    """
+    if not issubclass(sender, Base) or sender._meta.abstract or sender._meta.proxy:
+        return
+    if not is_sync_index_enabled(sender):
+        return
+    index = get_sync_index(sender)
+    if any(item.name == index.name for item in sender._meta.indexes):
+        return
+    sender._meta.indexes = list(sender._meta.indexes) + [index]
+    sender._meta.original_attrs['indexes'] = sender._meta.indexes
+
+
+class_prepared.connect(add_sync_index)
+
+
+def bump_many_to_many_version(sender, instance, action, model, **kwargs):
+    """Invalida os caches dos dois lados do ManyToMany, o add/remove/clear não chama o save()"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Base):
+        bump_model_version(instance.__class__, get_version_scope(instance))
+    if model is not None and issubclass(model, Base):
+        bump_model_version(model)
+
+
+m2m_changed.connect(bump_many_to_many_version)
@@ -0,0 +1,114 @@
+"""Registro de navegação com as apps e models utilizados nos menus dos templates.
+
+O registro de apps do Django é imutável após a inicialização, por isso a estrutura
+com os nomes e urls de cada app/model é montada apenas uma vez por processo e
+reaproveitada em todas as requisições, sendo filtrada apenas pelas permissões
+do usuário logado.
+"""
+import logging
+import threading
+
+from django.apps import apps
+
+from .permissions import get_perm_name
+
+# Configurando o logger
+logger = logging.getLogger(__name__)
+
+# Apps que não devem aparecer nos menus do sistema
+APPS_IGNORADAS = ('django', 'rest_framework', 'core', 'ckeditor', 'corsheaders')
+
+_registry = None
+_lock = threading.Lock()
+
+
+def _get_model_perms(model):
+    """Retorna as permissões (add, change e delete) do model no formato app_label.codename"""
+    return tuple(get_perm_name(model, action) for action in ('add', 'change', 'delete'))
+
+
+def build_registry():
+    """Método para montar a estrutura de navegação com todas as apps e models
+
+    Returns:
+        List -- Lista com as apps no mesmo formato utilizado pelos templates
+                (name_app, models_app, index_url_app, real_name_app e real_name_model)
+    """
+    _apps = []
+    for app in apps.get_app_configs():
+        try:
+            if any(nome in app.name.lower() for nome in APPS_IGNORADAS):
+                continue
+            _models = []
+            for model in app.get_models():
+                _models.append({'name_model': model._meta.verbose_name,
+                                'url_list_model': '/{app}/{model}/'.format(
+                                    app=model._meta.app_label,
+                                    model=model._meta.model_name),
+                                'path_url': '{app}:{model}-list'.format(
+                                    app=model._meta.app_label.lower(),
+                                    model=model._meta.model_name.lower()
+                                ),
+                                'real_name_model': model._meta.model_name,
+                                'perms': _get_model_perms(model)
+                                })
+            # Apps sem models não possuem página inicial para ser referenciada no menu
+            if not _models:
+                continue
+            _apps.append({'name_app': '%s' % app.verbose_name,
+                          'models_app': _models,
+                          'index_url_app': '{}:{}-index'.format(model._meta.app_label,
+                                                                model._meta.app_label),
+                          'real_name_app': app.name,
+                          'real_name_model': model._meta.model_name})
+        except Exception as error:
+            logger.error('Erro: %s; No Metodo: %s' % (error, 'build_registry()'))
+            continue
+    return _apps
+
+
+def get_registry():
+    """Retorna o registro de navegação, montando-o apenas na primeira chamada
+    após o carregamento das apps do Django.
+    """
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                registry = build_registry()
+                # Enquanto as apps não estiverem carregadas o registro não é armazenado
+                if not apps.ready:
+                    return registry
+                _registry = registry
+    return _registry
+
+
+def clear_registry():
+    """Descarta o registro de navegação para que seja montado novamente na próxima chamada"""
+    global _registry
+    with _lock:
+        _registry = None
+
+
+def get_apps_user(snapshot):
+    """Método para recuperar as apps e models que o usuário tem acesso
+
+    Arguments:
+        snapshot {PermissionSnapshot} -- Permissões do usuário logado
+
+    Returns:
+        List -- Lista com as apps que o usuário tem acesso
+    """
+    if not snapshot.is_active:
+        return []
+    if snapshot.is_superuser:
+        return get_registry()
+
+    _apps = []
+    for app in get_registry():
+        _models = [model for model in app['models_app'] if snapshot.has_any_perm(model['perms'])]
+        if _models:
+            _app = dict(app)
+            _app['models_app'] = _models
+            _apps.append(_app)
+    return _apps
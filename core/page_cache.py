@@ -0,0 +1,146 @@
+"""Cache das páginas de listagem e detalhe (BaseListView e BaseDetailView).
+
+Habilitado em cada view com page_cache = True. São armazenados apenas os blocos com o conteúdo
+da página (linhas e paginação da listagem, campos e relacionamentos do detalhe), o restante do
+template (menu, usuário, mensagens e csrf) continua sendo renderizado a cada requisição.
+
+As chaves incluem a versão do model e dos models relacionados (core/cache.py), a url com a
+query string e as permissões do usuário, assim os usuários com as mesmas permissões compartilham
+os blocos e qualquer registro salvo ou excluído invalida as páginas sem apagar as chaves. As listagens
+que sobrescrevem o get_queryset sem o escopo da versão (get_version_scope) armazenam os blocos por usuário.
+
+As respostas possuem o ETag (e o Last-Modified no detalhe) e as requisições condicionais
+(If-None-Match) recebem 304 sem nenhuma consulta ao banco de dados quando nada foi alterado.
+No detalhe o If-Modified-Since sem o If-None-Match consulta apenas o registro (updated_on).
+As listagens variam com o cabeçalho HX-Request (Vary), a página completa e as linhas do HTMX
+possuem ETags diferentes.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.template import RequestContext
+from django.template.base import NodeList, TextNode
+from django.template.loader import select_template
+from django.template.loader_tags import (BLOCK_CONTEXT_KEY, BlockContext,
+                                         BlockNode)
+
+from .cache import PREFIXO_CACHE, get_versions_key
+from .permissions import get_permission_snapshot
+from .settings import page_cache_timeout
+
+# Models dos quais as páginas de cada model dependem, ex: {Model: [Model, Pai, Filho]}
+_related_models_cache = {}
+
+
+def get_related_models(model):
+    """Retorna o model e os models dos seus relacionamentos (diretos e reversos), cujos
+    registros podem ser exibidos nas páginas de listagem e detalhe
+    """
+    models = _related_models_cache.get(model)
+    if models is None:
+        models = [model]
+        for field in model._meta.get_fields(include_hidden=False):
+            related = getattr(field, 'related_model', None)
+            if related is not None and not isinstance(related, str) and related not in models:
+                models.append(related)
+        _related_models_cache[model] = models
+    return models
+
+
+def get_permission_key(request):
+    """Identifica o conjunto de permissões do usuário, os usuários com as mesmas permissões
+    recebem os mesmos blocos
+    """
+    snapshot = get_permission_snapshot(request)
+    if not snapshot.is_active:
+        return 'anonimo'
+    if snapshot.is_superuser:
+        return 'superuser'
+    return hashlib.md5(','.join(sorted(snapshot.perms)).encode('utf-8')).hexdigest()
+
+
+def get_query_key(request, ignore=()):
+    """Retorna a query string ordenada, desconsiderando os parâmetros informados"""
+    itens = sorted((key, value) for key, values in request.GET.lists() if key not in ignore for value in values)
+    return '&'.join('{}={}'.format(key, value) for key, value in itens)
+
+
+def get_page_cache_key(request, template_names, models, ignore=(), scope=None, partial_mode=None, user=None):
+    """Monta a chave do cache dos blocos da página
+
+    Arguments:
+        request {HttpRequest} -- Requisição
+        template_names {List} -- Templates da view
+        models {List} -- Models dos quais a página depende
+
+    Keyword Arguments:
+        ignore {List} -- Parâmetros da query string que não alteram os blocos (default: {()})
+        scope {object} -- Escopo da versão do model da página, ver core/cache.py (default: {None})
+        partial_mode {str} -- Modo da renderização parcial (HTMX), a página completa e as linhas
+                              possuem chaves e ETags diferentes (default: {None})
+        user {User} -- Usuário, informado quando os registros da página dependem do usuário (default: {None})
+
+    Returns:
+        str -- Chave do cache
+    """
+    partes = [
+        request.path,
+        get_query_key(request, ignore),
+        get_permission_key(request),
+        ','.join(template_names),
+        get_versions_key(*models, scope=scope),
+        partial_mode or '',
+        '' if user is None else '{}'.format(getattr(user, 'pk', None)),
+    ]
+    return '{}:pagina:{}'.format(PREFIXO_CACHE, hashlib.md5('|'.join(partes).encode('utf-8')).hexdigest())
+
+
+def get_etag(request, key):
+    """Gera o ETag da página, o restante da página (ex: nome do usuário) depende do usuário logado"""
+    user = getattr(request, 'user', None)
+    chave = '{}:{}'.format(key, getattr(user, 'pk', None))
+    return '"{}"'.format(hashlib.md5(chave.encode('utf-8')).hexdigest())
+
+
+def has_pending_messages(request):
+    """Verifica se existem mensagens (django.contrib.messages) a serem exibidas, nesse caso
+    a página é renderizada mesmo que não tenha sido alterada
+    """
+    try:
+        return len(get_messages(request)) > 0
+    except Exception:
+        return False
+
+
+def get_cached_blocks(key):
+    return cache.get(key)
+
+
+def set_cached_blocks(key, blocks, timeout=None):
+    cache.set(key, {name: '{}'.format(html) for name, html in blocks.items()},
+              page_cache_timeout if timeout is None else timeout)
+
+
+def get_cached_block_node(name, html):
+    """Bloco do template com o HTML armazenado no cache"""
+    return BlockNode(name, NodeList([TextNode(html)]))
+
+
+def render_with_blocks(template_names, context, blocks, request=None):
+    """Renderiza o template substituindo os blocos informados pelo HTML armazenado no cache
+
+    Os blocos são adicionados ao BlockContext antes dos blocos do template, assim têm
+    prioridade sobre os blocos de todos os níveis da herança ({% extends %})
+
+    Returns:
+        str -- HTML da página
+    """
+    template = select_template(template_names).template
+    context = RequestContext(request, context) if request is not None else context
+    with context.render_context.push_state(template):
+        with context.bind_template(template):
+            block_context = BlockContext()
+            block_context.add_blocks({name: get_cached_block_node(name, html) for name, html in blocks.items()})
+            context.render_context[BLOCK_CONTEXT_KEY] = block_context
+            return template._render(context)
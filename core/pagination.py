@@ -0,0 +1,247 @@
+"""Paginação por cursor (keyset) para a listagem HTML e para a API.
+
+Ao invés de OFFSET e COUNT(*) a página seguinte é recuperada filtrando os registros
+a partir dos valores do último registro da página atual, de acordo com a ordenação
+do Meta.ordering do model acrescida da pk. Assim o custo de qualquer página é o mesmo
+da primeira, independente da quantidade de registros da tabela.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def get_keyset_ordering(model):
+    """Retorna a ordenação utilizada na paginação por cursor
+
+    São utilizados os campos do Meta.ordering até o primeiro campo que não pode
+    ser utilizado como chave (expressões, relacionamentos ou campos que aceitam null),
+    e a pk é acrescentada no final para garantir que a ordenação seja única
+
+    Arguments:
+        model {Model} -- Classe do model
+
+    Returns:
+        List -- Lista de tuplas (field, descending)
+    """
+    ordering = []
+    pk = model._meta.pk
+    for item in model._meta.ordering or []:
+        if not isinstance(item, str) or item == '?':
+            break
+        descending = item.startswith('-')
+        name = item.lstrip('-')
+        if name == 'pk':
+            name = pk.name
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            break
+        if not field.concrete or field.is_relation or field.null:
+            break
+        ordering.append((field, descending))
+        # a pk já garante a ordenação única
+        if field.primary_key:
+            return ordering
+    ordering.append((pk, False))
+    return ordering
+
+
+def estimate_count(queryset):
+    """Retorna a quantidade estimada de registros da queryset utilizando as
+    estatísticas do planejador do banco de dados, sem executar o COUNT(*)
+
+    Returns:
+        int -- Quantidade estimada ou None caso o banco de dados não seja suportado (apenas PostgreSQL)
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) %s' % sql, params)
+        plano = cursor.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage(object):
+    """Página da paginação por cursor
+
+    Attributes:
+        object_list {List} -- Registros da página
+        next_cursor {str} -- Cursor da próxima página ou None
+        previous_cursor {str} -- Cursor da página anterior ou None
+        count {int} -- Quantidade estimada de registros ou None
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator(object):
+    """Paginador por cursor (keyset)
+
+    Arguments:
+        queryset {QuerySet} -- Registros a serem paginados
+        per_page {int} -- Quantidade de registros por página
+
+    Keyword Arguments:
+        estimated_count {Bool} -- Calcula a quantidade estimada de registros (default: {False})
+    """
+
+    def __init__(self, queryset, per_page, estimated_count=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.estimated_count = estimated_count
+        self.ordering = get_keyset_ordering(queryset.model)
+
+    def encode_cursor(self, obj, reverse=False):
+        """Gera o cursor opaco a partir dos valores de ordenação do registro"""
+        valores = [field.value_to_string(obj) for field, descending in self.ordering]
+        dados = json.dumps({'v': valores, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(dados.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        """Recupera os valores de ordenação e a direção a partir do cursor
+
+        Raises:
+            InvalidCursor -- Caso o cursor não seja válido
+        """
+        try:
+            dados = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            valores = dados['v']
+            if len(valores) != len(self.ordering):
+                raise InvalidCursor()
+            valores = [field.to_python(valor) for (field, descending), valor in zip(self.ordering, valores)]
+            return valores, bool(dados.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeError, ValidationError):
+            raise InvalidCursor()
+
+    def get_order_by(self, reverse=False):
+        return ['{}{}'.format('-' if descending != reverse else '', field.name)
+                for field, descending in self.ordering]
+
+    def get_keyset_filter(self, valores, reverse=False):
+        """Monta o filtro (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ... a partir dos valores do cursor"""
+        filtro = Q()
+        iguais = Q()
+        for (field, descending), valor in zip(self.ordering, valores):
+            lookup = 'gt' if descending == reverse else 'lt'
+            filtro |= iguais & Q(**{'{}__{}'.format(field.name, lookup): valor})
+            iguais &= Q(**{field.name: valor})
+        return filtro
+
+    def page(self, cursor=None):
+        """Retorna a página a partir do cursor informado, ou a primeira página caso seja None
+
+        Raises:
+            InvalidCursor -- Caso o cursor não seja válido
+        """
+        valores, reverse = self.decode_cursor(cursor) if cursor else (None, False)
+        queryset = self.queryset.order_by(*self.get_order_by(reverse))
+        if valores is not None:
+            queryset = queryset.filter(self.get_keyset_filter(valores, reverse))
+
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if reverse:
+            object_list.reverse()
+
+        has_next = True if reverse else has_more
+        has_previous = has_more if reverse else valores is not None
+        next_cursor = previous_cursor = None
+        if object_list:
+            if has_next:
+                next_cursor = self.encode_cursor(object_list[-1])
+            if has_previous:
+                previous_cursor = self.encode_cursor(object_list[0], reverse=True)
+
+        count = estimate_count(self.queryset) if self.estimated_count else None
+        return KeysetPage(object_list, next_cursor, previous_cursor, count)
+
+
+class PaginacaoKeyset(BasePagination):
+    """Classe para configurar a paginação por cursor (keyset) da API
+        O padrão da paginação são 10 itens, caso queira
+        alterar o valor basta passar na URL o parametro
+        page_size = X
+        As páginas seguintes são acessadas pelos links next e previous
+    """
+
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    # retorna no count a quantidade estimada pelo banco de dados (PostgreSQL)
+    estimated_count = False
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(request.query_params[self.page_size_query_param],
+                                     strict=True, cutoff=self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.get_page_size(request), estimated_count=self.estimated_count)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Cursor inválido.')
+        return self.page.object_list
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
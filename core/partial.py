@@ -0,0 +1,102 @@
+"""Renderização parcial das listagens do BaseListView.
+
+Nas pesquisas e filtros feitos pela própria página (HTMX, jQuery ou fetch) apenas as linhas da tabela
+e a paginação são devolvidas, sem montar novamente o base.html, o menu das apps (get_apps),
+o breadcrumbs e os filtros. São dois modos:
+
+    ?_partial=rows (ou o cabeçalho HX-Request) -- HTML dos blocos list_app, size_itens e pagination
+                                                  do próprio template da view
+    ?_partial=json                             -- JSON compacto com os cabeçalhos e as linhas
+"""
+from django.http import HttpResponse, JsonResponse
+from django.template import RequestContext
+from django.template.loader import render_to_string, select_template
+from django.template.loader_tags import (BLOCK_CONTEXT_KEY, BlockContext,
+                                         BlockNode, ExtendsNode)
+from django.utils.safestring import mark_safe
+
+# Modos disponíveis, ex: ?_partial=rows
+PARTIAL_MODES = ('rows', 'json')
+# Blocos do template da listagem devolvidos no modo rows
+PARTIAL_BLOCKS = ('list_app', 'size_itens', 'pagination')
+
+
+def get_partial_mode(request, query_param='_partial'):
+    """Retorna o modo de renderização parcial da requisição ou None para a página completa
+
+    As requisições do HTMX (cabeçalho HX-Request) recebem as linhas, exceto quando
+    a navegação é feita pelo hx-boost, que espera a página completa
+    """
+    mode = request.GET.get(query_param)
+    if mode in PARTIAL_MODES:
+        return mode
+    if request.META.get('HTTP_HX_REQUEST') == 'true' and request.META.get('HTTP_HX_BOOSTED') != 'true':
+        return 'rows'
+    return None
+
+
+def _collect_blocks(template, context, block_context):
+    """Percorre a herança do template ({% extends %}) adicionando os blocos de cada nível"""
+    while template is not None:
+        block_context.add_blocks({node.name: node for node in template.nodelist.get_nodes_by_type(BlockNode)})
+        extends = template.nodelist.get_nodes_by_type(ExtendsNode)
+        template = extends[0].get_parent(context) if extends else None
+
+
+def render_blocks(template_names, block_names, context, request=None):
+    """Renderiza apenas os blocos informados do template, respeitando a herança e o {{ block.super }}
+
+    Arguments:
+        template_names {List} -- Templates da view (o primeiro encontrado é utilizado)
+        block_names {List} -- Nomes dos blocos
+        context {Dict} -- Contexto da view
+
+    Keyword Arguments:
+        request {HttpRequest} -- Requisição, utilizada pelos context processors (default: {None})
+
+    Returns:
+        Dict -- HTML de cada bloco, os blocos inexistentes não são retornados
+    """
+    template = select_template(template_names).template
+    context = RequestContext(request, context) if request is not None else context
+    rendered = {}
+    with context.bind_template(template):
+        block_context = BlockContext()
+        context.render_context[BLOCK_CONTEXT_KEY] = block_context
+        _collect_blocks(template, context, block_context)
+        for name in block_names:
+            block = block_context.get_block(name)
+            if block is not None:
+                rendered[name] = mark_safe(block.render(context))
+    return rendered
+
+
+def render_partial(view, context, mode):
+    """Retorna a resposta da renderização parcial da listagem
+
+    Arguments:
+        view {BaseListView} -- Instância da view da listagem
+        context {Dict} -- Contexto montado pelo get_context_data
+        mode {str} -- 'rows' ou 'json'
+
+    Returns:
+        HttpResponse -- HTML dos blocos ou JsonResponse com as linhas
+    """
+    if mode == 'json':
+        columns = view.get_list_display()
+        page = context.get('page_obj')
+        data = {
+            'columns': columns,
+            'headers': context.get('display', []),
+            'rows': [[row.get(column, '') for column in columns] for row in context.get('object_list', [])],
+            'next_cursor': context.get('next_cursor'),
+            'previous_cursor': context.get('previous_cursor'),
+        }
+        if page is not None and not view.keyset_pagination:
+            data['page'] = page.number
+            data['num_pages'] = page.paginator.num_pages
+            data['count'] = page.paginator.count
+        return JsonResponse(data)
+
+    blocks = render_blocks(view.get_template_names(), PARTIAL_BLOCKS, context, view.request)
+    return HttpResponse(render_to_string('core/block/list_partial.html', blocks))
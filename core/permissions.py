@@ -0,0 +1,106 @@
+"""Verificação de permissões por requisição.
+
+As permissões do usuário são carregadas uma única vez por requisição e armazenadas
+em um conjunto, assim todas as verificações de adicionar, alterar e deletar de
+qualquer model são respondidas em memória.
+"""
+from django.contrib.auth import get_permission_codename
+
+# Nome do atributo utilizado para armazenar as permissões no request
+REQUEST_ATTR = '_permission_snapshot'
+
+# Cache com os nomes das permissões de cada model, ex: {(Model, 'add'): 'app.add_model'}
+_codenames = {}
+
+
+def get_perm_name(model, action):
+    """Retorna o nome completo da permissão no formato app_label.codename
+
+    Arguments:
+        model {Model} -- Classe ou instância do model
+        action {str} -- Ação da permissão (add, change, delete ou view)
+
+    Returns:
+        str -- Nome da permissão
+    """
+    opts = model._meta
+    key = (opts.label_lower, action)
+    perm = _codenames.get(key)
+    if perm is None:
+        perm = '%s.%s' % (opts.app_label, get_permission_codename(action, opts))
+        _codenames[key] = perm
+    return perm
+
+
+class PermissionSnapshot(object):
+    """Conjunto com as permissões do usuário carregado apenas na primeira verificação
+
+    Arguments:
+        user {User} -- Usuário que terá as permissões verificadas
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._perms = None
+
+    @property
+    def is_active(self):
+        return self.user is not None and self.user.is_active
+
+    @property
+    def is_superuser(self):
+        return self.is_active and self.user.is_superuser
+
+    @property
+    def perms(self):
+        """Conjunto com todas as permissões do usuário"""
+        if self._perms is None:
+            if self.is_active:
+                self._perms = frozenset(self.user.get_all_permissions())
+            else:
+                self._perms = frozenset()
+        return self._perms
+
+    def has_perm(self, perm):
+        """Verifica se o usuário possui a permissão informada"""
+        if self.is_superuser:
+            return True
+        return perm in self.perms
+
+    def has_any_perm(self, perms):
+        """Verifica se o usuário possui pelo menos uma das permissões informadas"""
+        return any(self.has_perm(perm) for perm in perms)
+
+    def has_model_perm(self, model, action):
+        return self.has_perm(get_perm_name(model, action))
+
+    def has_add_permission(self, model):
+        return self.has_model_perm(model, 'add')
+
+    def has_change_permission(self, model):
+        return self.has_model_perm(model, 'change')
+
+    def has_delete_permission(self, model):
+        return self.has_model_perm(model, 'delete')
+
+    def has_view_permission(self, model):
+        return self.has_model_perm(model, 'view')
+
+
+def get_permission_snapshot(request):
+    """Retorna as permissões do usuário da requisição, criando-as apenas na primeira chamada
+
+    Arguments:
+        request {HttpRequest} -- Requisição corrente
+
+    Returns:
+        PermissionSnapshot -- Permissões do usuário logado
+    """
+    snapshot = getattr(request, REQUEST_ATTR, None)
+    if snapshot is None:
+        snapshot = PermissionSnapshot(getattr(request, 'user', None))
+        try:
+            setattr(request, REQUEST_ATTR, snapshot)
+        except AttributeError:
+            pass
+    return snapshot
@@ -0,0 +1,548 @@
+"""Backends de pesquisa utilizados pelo search_fields do BaseListView.
+
+O backend padrão (icontains) mantém o comportamento original, um icontains para cada campo
+do search_fields. Os backends de texto completo (PostgreSQL e SQLite FTS5) pesquisam os
+campos do próprio model em uma tabela de documentos (SearchDocument) indexada, mantida
+atualizada pelo Base.save(), e utilizam o icontains apenas para os campos de relacionamento.
+
+O backend é configurado no settings:
+    SEARCH_BACKEND = 'icontains' | 'postgresql' | 'sqlite' | 'auto'
+"""
+import logging
+import re
+import threading
+
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db import connections
+from django.db.models import Q
+
+from .settings import generic_search_index, search_backend, search_config
+
+# Configurando o logger
+logger = logging.getLogger(__name__)
+
+# Tipos de campos do search_fields, calculados uma única vez por model
+TEXT = 'text'
+OTHER = 'other'
+
+_kinds_cache = {}
+_document_fields_cache = {}
+# Campos pesquisados através das relações genéricas, ex: {Model: {'content_object': ('nome',)}}
+_generic_specs = None
+# Relações genéricas que podem referenciar cada model, ex: {Model: ((Dono, 'content_object', ('nome',)), )}
+_generic_targets = {}
+# Indica se a tabela FTS5 (trigram) do GenericSearchText existe em cada banco de dados
+_generic_fts = {}
+_lock = threading.Lock()
+
+
+def get_search_kind(model, field):
+    """Classifica o campo do search_fields, validando o lookup icontains uma única vez por model
+    ao invés de montar uma queryset de teste para cada campo em cada requisição
+
+    Returns:
+        str -- TEXT caso o campo aceite o icontains, OTHER caso contrário
+    """
+    key = (model, field)
+    kind = _kinds_cache.get(key)
+    if kind is None:
+        try:
+            model._base_manager.filter(**{'%s__icontains' % field: ''})
+            kind = TEXT
+        except (FieldError, FieldDoesNotExist, ValueError, TypeError):
+            kind = OTHER
+        _kinds_cache[key] = kind
+    return kind
+
+
+def get_document_fields(model):
+    """Retorna os campos que compõem o texto do SearchDocument: os informados no
+    Meta.search_document_fields do model ou os campos do próprio model utilizados no
+    search_fields das listagens registradas
+    """
+    fields = _document_fields_cache.get(model)
+    if fields is None:
+        from .indexes import get_list_views
+
+        declared = getattr(model._meta, 'search_document_fields', None)
+        if declared is not None:
+            with _lock:
+                _document_fields_cache[model] = fields = tuple(declared)
+            return fields
+
+        fields = []
+        try:
+            views = get_list_views()
+            if not views:
+                # urls ainda não carregadas (ex: migrations e shell), o resultado não é armazenado
+                return ()
+            for view in views:
+                if view.model is not model:
+                    continue
+                for name in view.search_fields:
+                    if name in fields or '__' in name:
+                        continue
+                    try:
+                        field = model._meta.get_field(name)
+                    except FieldDoesNotExist:
+                        continue
+                    if field.concrete and not field.is_relation and not field.primary_key:
+                        fields.append(name)
+        except Exception as error:
+            logger.error('Erro: %s; No Metodo: %s' % (error, 'get_document_fields()'))
+            return []
+        with _lock:
+            _document_fields_cache[model] = fields = tuple(fields)
+    return fields
+
+
+def clear_search_cache():
+    """Descarta os campos calculados, utilizado quando as urls/views são alteradas"""
+    global _generic_specs
+    with _lock:
+        _kinds_cache.clear()
+        _document_fields_cache.clear()
+        _generic_specs = None
+        _generic_targets.clear()
+        _generic_fts.clear()
+
+
+def get_document_text(instance, fields):
+    """Monta o texto do documento a partir dos valores dos campos do registro"""
+    valores = []
+    for name in fields:
+        valor = getattr(instance, name, None)
+        if valor is not None and valor != '':
+            valores.append(str(valor))
+    return ' '.join(valores)
+
+
+def get_terms(term):
+    """Separa o termo pesquisado em palavras, ignorando os caracteres especiais das
+    sintaxes de consulta do PostgreSQL e do FTS5
+    """
+    return re.findall(r'\w+', term or '')
+
+
+class IContainsSearchBackend(object):
+    """Backend padrão, um icontains para cada campo do search_fields"""
+
+    full_text = False
+
+    def __init__(self, model, search_fields):
+        self.model = model
+        self.search_fields = search_fields
+        self.text_fields = [field for field in search_fields if get_search_kind(model, field) == TEXT]
+        self.other_fields = [field for field in search_fields if field not in self.text_fields]
+
+    def get_filter(self, term):
+        """Retorna o filtro (Q) com os campos texto do search_fields"""
+        query = Q()
+        for field in self.text_fields:
+            query |= Q(**{'%s__icontains' % field: term})
+        return query
+
+    @classmethod
+    def is_available(cls, connection):
+        return True
+
+    def update_document(self, instance):
+        pass
+
+    def delete_document(self, instance):
+        pass
+
+
+class FullTextSearchBackend(IContainsSearchBackend):
+    """Base dos backends de texto completo, os campos do próprio model são pesquisados
+    no SearchDocument e os demais (relacionamentos) continuam com o icontains
+    """
+
+    full_text = True
+
+    def __init__(self, model, search_fields):
+        super(FullTextSearchBackend, self).__init__(model, search_fields)
+        document_fields = get_document_fields(model)
+        self.document_fields = [field for field in self.text_fields if field in document_fields]
+        self.text_fields = [field for field in self.text_fields if field not in self.document_fields]
+
+    def get_filter(self, term):
+        query = super(FullTextSearchBackend, self).get_filter(term)
+        if self.document_fields and get_terms(term):
+            query |= Q(pk__in=self.match(term))
+        elif self.document_fields:
+            for field in self.document_fields:
+                query |= Q(**{'%s__icontains' % field: term})
+        return query
+
+    def get_documents(self):
+        from django.contrib.contenttypes.models import ContentType
+
+        from .models import SearchDocument
+
+        content_type = ContentType.objects.get_for_model(self.model)
+        return SearchDocument.objects.filter(content_type=content_type)
+
+    def match(self, term):
+        """Retorna a subconsulta com o object_id dos documentos encontrados"""
+        raise NotImplementedError
+
+    def update_document(self, instance):
+        from django.contrib.contenttypes.models import ContentType
+
+        from .models import SearchDocument
+
+        fields = get_document_fields(instance.__class__)
+        if not fields:
+            return
+        SearchDocument.objects.update_or_create(
+            content_type=ContentType.objects.get_for_model(instance.__class__), object_id=instance.pk,
+            defaults={'text': get_document_text(instance, fields)})
+
+    def delete_document(self, instance):
+        if get_document_fields(instance.__class__):
+            self.get_documents().filter(object_id=instance.pk).delete()
+
+
+class PostgresSearchBackend(FullTextSearchBackend):
+    """Pesquisa com to_tsvector/to_tsquery utilizando o índice GIN do SearchDocument"""
+
+    @classmethod
+    def is_available(cls, connection):
+        return connection.vendor == 'postgresql'
+
+    def match(self, term):
+        # cada palavra é pesquisada pelo prefixo (palavra:*) para aproximar do icontains
+        query = ' & '.join('%s:*' % palavra for palavra in get_terms(term))
+        return self.get_documents().extra(
+            where=["to_tsvector(%s::regconfig, text) @@ to_tsquery(%s::regconfig, %s)"],
+            params=[search_config, search_config, query]).values('object_id')
+
+
+class SQLiteSearchBackend(FullTextSearchBackend):
+    """Pesquisa com a tabela virtual FTS5 do SearchDocument (utilizado localmente e nos testes)"""
+
+    @classmethod
+    def is_available(cls, connection):
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'core_searchdocument_fts'")
+            return cursor.fetchone() is not None
+
+    def match(self, term):
+        query = ' '.join('"%s"*' % palavra for palavra in get_terms(term))
+        return self.get_documents().extra(
+            # sem o nome da tabela pois nas subconsultas o Django utiliza um alias
+            where=["id IN (SELECT rowid FROM core_searchdocument_fts WHERE core_searchdocument_fts MATCH %s)"],
+            params=[query]).values('object_id')
+
+
+BACKENDS = {
+    'icontains': IContainsSearchBackend,
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+_backend_class = None
+
+
+def get_search_backend_class(using='default'):
+    """Retorna a classe do backend configurado no SEARCH_BACKEND, caso o backend não esteja
+    disponível no banco de dados (ex: FTS5 não criado) utiliza o icontains
+    """
+    global _backend_class
+    if _backend_class is None:
+        connection = connections[using]
+        if search_backend == 'auto':
+            backend = BACKENDS.get(connection.vendor, IContainsSearchBackend)
+        else:
+            backend = BACKENDS.get(search_backend, IContainsSearchBackend)
+        try:
+            if not backend.is_available(connection):
+                backend = IContainsSearchBackend
+        except Exception as error:
+            logger.error('Erro: %s; No Metodo: %s' % (error, 'get_search_backend_class()'))
+            return IContainsSearchBackend
+        _backend_class = backend
+    return _backend_class
+
+
+def get_search_backend(model, search_fields):
+    """Retorna o backend de pesquisa configurado para os campos do search_fields"""
+    return get_search_backend_class()(model, search_fields)
+
+
+def update_search_document(instance):
+    """Atualiza o documento de pesquisa do registro, chamado pelo Base.save()"""
+    backend = get_search_backend_class()
+    if backend.full_text:
+        backend(instance.__class__, []).update_document(instance)
+
+
+def _bulk_save_texts(queryset, texts, build=None):
+    """Grava o texto de vários registros com uma consulta das linhas existentes, um bulk_update
+    e um bulk_create (apenas quando build for informado) ao invés de uma gravação por registro
+
+    Arguments:
+        queryset {QuerySet} -- Linhas do SearchDocument ou GenericSearchText do content type
+        texts {Dict} -- Texto de cada object_id
+
+    Keyword Arguments:
+        build {function} -- Cria a linha dos object_id sem texto gravado (default: {None})
+    """
+    model = queryset.model
+    existing = dict(queryset.filter(object_id__in=list(texts)).values_list('object_id', 'pk'))
+    rows = [model(pk=existing[object_id], text=text) for object_id, text in texts.items() if object_id in existing]
+    if rows:
+        model.objects.bulk_update(rows, ['text'])
+    if build is not None:
+        rows = [build(object_id, text) for object_id, text in texts.items() if object_id not in existing]
+        if rows:
+            model.objects.bulk_create(rows)
+
+
+def update_search_documents(model, objects):
+    """Atualiza os documentos de pesquisa de vários registros do model, utilizado na gravação
+    em lote (bulk_create/bulk_update não chamam o Base.save())
+    """
+    backend = get_search_backend_class()
+    if not backend.full_text or not objects:
+        return
+    fields = get_document_fields(model)
+    if not fields:
+        return
+    from django.contrib.contenttypes.models import ContentType
+
+    from .models import SearchDocument
+
+    content_type = ContentType.objects.get_for_model(model)
+    _bulk_save_texts(SearchDocument.objects.filter(content_type=content_type),
+                     {obj.pk: get_document_text(obj, fields) for obj in objects},
+                     lambda object_id, text: SearchDocument(content_type=content_type, object_id=object_id,
+                                                            text=text))
+
+
+def delete_search_document(instance):
+    """Remove o documento de pesquisa do registro excluído do banco de dados"""
+    backend = get_search_backend_class()
+    if backend.full_text:
+        backend(instance.__class__, []).delete_document(instance)
+
+
+def get_generic_search_specs():
+    """Retorna os campos pesquisados através de relações genéricas (GenericForeignKey)
+    no search_fields das listagens registradas, ex: content_object__nome
+
+    Returns:
+        Dict -- {Model: {nome_da_relacao: (caminho_do_campo, ...)}}
+    """
+    global _generic_specs
+    if _generic_specs is None:
+        from django.contrib.contenttypes.fields import GenericForeignKey
+
+        from .indexes import get_list_views
+
+        specs = {}
+        try:
+            for view in get_list_views():
+                for name in view.search_fields:
+                    relation, _, path = name.partition('__')
+                    if not path or not isinstance(getattr(view.model, relation, None), GenericForeignKey):
+                        continue
+                    paths = specs.setdefault(view.model, {}).setdefault(relation, [])
+                    if path not in paths:
+                        paths.append(path)
+        except Exception as error:
+            logger.error('Erro: %s; No Metodo: %s' % (error, 'get_generic_search_specs()'))
+            return {}
+        with _lock:
+            _generic_specs = {model: {relation: tuple(paths) for relation, paths in relations.items()}
+                              for model, relations in specs.items()}
+    return _generic_specs
+
+
+def get_generic_targets(model):
+    """Retorna as relações genéricas pesquisadas que podem referenciar o model, aquelas cujos
+    caminhos (ex: nome em content_object__nome) existem no model, calculadas uma única vez por model.
+    Ver get_referencing_targets para as relações que de fato referenciam o model
+
+    Returns:
+        Tuple -- Tuplas (model da relação, nome da relação, caminhos)
+    """
+    targets = _generic_targets.get(model)
+    if targets is None:
+        specs = get_generic_search_specs()
+        targets = tuple((owner, relation, paths) for owner, relations in specs.items()
+                        for relation, paths in relations.items()
+                        if any(hasattr(model, path.split('__')[0]) for path in paths))
+        with _lock:
+            _generic_targets[model] = targets
+    return targets
+
+
+def get_referenced_content_types(owner, relation):
+    """Retorna os ids dos content types gravados nos registros da relação genérica, calculados com
+    um SELECT DISTINCT e armazenados no cache até que algum registro do model da relação seja
+    salvo ou excluído (versão do model, ver core/cache.py)
+    """
+    from django.core.cache import cache
+
+    from .cache import PREFIXO_CACHE, get_model_version
+
+    key = '{}:generic_ct:{}:{}:{}'.format(PREFIXO_CACHE, owner._meta.label_lower, relation, get_model_version(owner))
+    ids = cache.get(key)
+    if ids is None:
+        column = owner._meta.get_field(getattr(owner, relation).ct_field).attname
+        ids = set(owner._base_manager.order_by().values_list(column, flat=True).distinct())
+        cache.set(key, ids)
+    return ids
+
+
+def get_referencing_targets(model):
+    """Retorna as relações do get_generic_targets cujos registros referenciam o model (content type),
+    os models que apenas possuem um atributo com o mesmo nome do caminho não executam o UPDATE
+    """
+    targets = get_generic_targets(model)
+    if not targets:
+        return targets
+    from django.contrib.contenttypes.models import ContentType
+
+    content_type_id = ContentType.objects.get_for_model(model).pk
+    return tuple(target for target in targets if content_type_id in get_referenced_content_types(*target[:2]))
+
+
+def get_generic_text(target, paths):
+    """Monta o texto pesquisável do registro referenciado pela relação genérica"""
+    if target is None:
+        return ''
+    valores = []
+    for path in paths:
+        valor = target
+        for attr in path.split('__'):
+            valor = getattr(valor, attr, None)
+            if valor is None:
+                break
+        if valor is not None and valor != '':
+            valores.append(str(valor))
+    return ' '.join(valores)
+
+
+def update_generic_search_text(instance):
+    """Atualiza o GenericSearchText, chamado pelo Base.save()
+
+    Atualiza o texto do próprio registro, caso possua relações genéricas pesquisadas,
+    e o texto dos registros que referenciam o registro salvo através dessas relações
+    (um UPDATE por relação genérica que pode referenciar o model). Os models que não
+    participam de nenhuma relação genérica pesquisada não executam nenhuma consulta
+    """
+    if not generic_search_index:
+        return
+    specs = get_generic_search_specs()
+    if not specs:
+        return
+    model = instance.__class__
+    targets = get_referencing_targets(model)
+    if model not in specs and not targets:
+        return
+    from django.contrib.contenttypes.models import ContentType
+
+    from .models import GenericSearchText
+
+    for relation, paths in specs.get(model, {}).items():
+        try:
+            target = getattr(instance, relation)
+        except Exception:
+            target = None
+        GenericSearchText.objects.update_or_create(
+            content_type=ContentType.objects.get_for_model(model), object_id=instance.pk, field=relation,
+            defaults={'text': get_generic_text(target, paths)})
+
+    content_type = ContentType.objects.get_for_model(model)
+    for owner, relation, paths in targets:
+        generic = getattr(owner, relation)
+        referencing = owner._base_manager.filter(
+            **{generic.ct_field: content_type, generic.fk_field: instance.pk}).values('pk')
+        GenericSearchText.objects.filter(
+            content_type=ContentType.objects.get_for_model(owner), field=relation,
+            object_id__in=referencing).update(text=get_generic_text(instance, paths))
+
+
+def update_generic_search_texts(model, objects):
+    """Versão em lote do update_generic_search_text, utilizada na gravação em lote
+
+    As relações genéricas dos registros são carregadas com uma consulta por content type
+    (prefetch_related_objects) e os textos gravados com bulk_update/bulk_create, independente
+    da quantidade de registros
+    """
+    if not generic_search_index or not objects:
+        return
+    specs = get_generic_search_specs()
+    if not specs:
+        return
+    targets = get_referencing_targets(model)
+    if model not in specs and not targets:
+        return
+    from django.contrib.contenttypes.models import ContentType
+    from django.db.models import prefetch_related_objects
+
+    from .models import GenericSearchText
+
+    content_type = ContentType.objects.get_for_model(model)
+    for relation, paths in specs.get(model, {}).items():
+        prefetch_related_objects(objects, relation)
+        texts = {}
+        for instance in objects:
+            try:
+                target = getattr(instance, relation)
+            except Exception:
+                target = None
+            texts[instance.pk] = get_generic_text(target, paths)
+        _bulk_save_texts(GenericSearchText.objects.filter(content_type=content_type, field=relation), texts,
+                         lambda object_id, text, relation=relation: GenericSearchText(
+                             content_type=content_type, object_id=object_id, field=relation, text=text))
+
+    # o object_id das relações genéricas pode ser texto, os registros são identificados pela pk em texto
+    by_pk = {str(obj.pk): obj for obj in objects}
+    for owner, relation, paths in targets:
+        generic = getattr(owner, relation)
+        referencing = owner._base_manager.filter(**{
+            generic.ct_field: content_type, '{}__in'.format(generic.fk_field): [obj.pk for obj in objects]
+        }).values_list('pk', generic.fk_field)
+        texts = {pk: get_generic_text(by_pk.get(str(object_id)), paths) for pk, object_id in referencing}
+        if texts:
+            _bulk_save_texts(GenericSearchText.objects.filter(
+                content_type=ContentType.objects.get_for_model(owner), field=relation), texts)
+
+
+def has_generic_fts(connection):
+    """Verifica se a tabela FTS5 com o tokenizer trigram foi criada pela migration (SQLite)"""
+    if connection.alias not in _generic_fts:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'core_genericsearchtext_fts'")
+            _generic_fts[connection.alias] = cursor.fetchone() is not None
+    return _generic_fts[connection.alias]
+
+
+def match_generic_search(model, relation, term):
+    """Retorna a subconsulta com a pk dos registros cuja relação genérica contém o termo,
+    em uma única consulta indexada independente da quantidade de content types
+
+    No PostgreSQL o icontains utiliza o índice trigram (pg_trgm) e no SQLite a
+    tabela FTS5 com o tokenizer trigram, ambos criados pela migration. O FTS5 só utiliza
+    o índice no LIKE sem ESCAPE, os termos com % ou _ são pesquisados com o icontains
+    """
+    from django.contrib.contenttypes.models import ContentType
+
+    from .models import GenericSearchText
+
+    documents = GenericSearchText.objects.filter(content_type=ContentType.objects.get_for_model(model),
+                                                 field=relation)
+    connection = connections[documents.db]
+    if connection.vendor == 'sqlite' and has_generic_fts(connection) and not ('%' in term or '_' in term):
+        documents = documents.extra(
+            where=["id IN (SELECT rowid FROM core_genericsearchtext_fts WHERE text LIKE %s)"],
+            params=['%{}%'.format(term)])
+    else:
+        documents = documents.filter(text__icontains=term)
+    return documents.values('object_id')
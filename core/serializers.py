@@ -0,0 +1,312 @@
+"""Serializers base da API REST utilizados pelos serializers gerados pelo build.
+
+O BaseModelSerializer permite escolher pela query string os campos retornados, reduzindo o
+tamanho das respostas (ex: listagens do aplicativo que exibem apenas o nome):
+
+    ?fields=id,nome,categoria           -- apenas os campos informados
+    ?expand=categoria                   -- o relacionamento é retornado com os campos do registro relacionado
+    ?fields=id,categoria.nome&expand=categoria   -- campos do registro relacionado
+
+As views que herdam de BaseModelViewSet aplicam a mesma seleção na consulta (only, select_related
+e prefetch_related), assim os campos não retornados também não são lidos do banco de dados.
+
+Os relacionamentos utilizados pelos campos do serializer (ForeignKey exibidas pelo __str__, serializers
+aninhados, ManyToMany e relacionamentos reversos) também são carregados automaticamente na consulta
+da view (get_related_lookups), evitando uma consulta por registro (N+1).
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer, ModelSerializer
+
+# Parâmetros da query string
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+# Serializers criados para os relacionamentos expandidos, ex: {Model: Serializer}
+_expand_serializers = {}
+
+# Relacionamentos carregados na consulta de cada serializer, ex: {Serializer: {'campo': RelatedLookups}}
+_related_lookups_cache = {}
+
+
+class FieldSelection(object):
+    """Campos escolhidos na requisição
+
+    Attributes:
+        fields {List} -- Campos retornados ou None para todos
+        expand {List} -- Relacionamentos expandidos
+        nested {Dict} -- Campos de cada relacionamento expandido, ex: {'categoria': ['nome']}
+    """
+
+    def __init__(self, fields=None, expand=None, nested=None):
+        self.fields = fields
+        self.expand = expand or []
+        self.nested = nested or {}
+
+    def __bool__(self):
+        return self.fields is not None or bool(self.expand)
+
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def get_field_selection(request):
+    """Retorna os campos escolhidos nos parâmetros fields e expand da requisição
+
+    Returns:
+        FieldSelection -- Campos escolhidos
+    """
+    query_params = getattr(request, 'query_params', None)
+    if query_params is None:
+        query_params = getattr(request, 'GET', {})
+    fields = None
+    nested = {}
+    if query_params.get(FIELDS_QUERY_PARAM):
+        fields = []
+        for name in _split(query_params.get(FIELDS_QUERY_PARAM)):
+            if '.' in name:
+                name, sub = name.split('.', 1)
+                nested.setdefault(name, []).append(sub)
+            if name not in fields:
+                fields.append(name)
+    return FieldSelection(fields, _split(query_params.get(EXPAND_QUERY_PARAM)), nested)
+
+
+def get_expand_serializer(model):
+    """Retorna o serializer utilizado nos relacionamentos expandidos do model, criado apenas uma vez"""
+    serializer = _expand_serializers.get(model)
+    if serializer is None:
+        meta = type('Meta', (), {'model': model, 'fields': '__all__'})
+        serializer = type('{}ExpandSerializer'.format(model.__name__), (BaseModelSerializer,), {'Meta': meta})
+        _expand_serializers[model] = serializer
+    return serializer
+
+
+def get_expandable_field(model, name):
+    """Retorna o campo do model que pode ser expandido (ForeignKey, OneToOne ou ManyToMany) ou None"""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.is_relation or not field.concrete or field.related_model is None:
+        return None
+    return field
+
+
+class BaseModelSerializer(ModelSerializer):
+    """ModelSerializer padrão das APIs geradas pelo build, com a seleção de campos da requisição
+
+    Keyword Arguments:
+        fields {List} -- Campos retornados, utilizado nos relacionamentos expandidos (default: {None})
+        expand {List} -- Relacionamentos expandidos (default: {None})
+    """
+    # serializers dos relacionamentos expandidos, ex: {'categoria': CategoriaSerializer}
+    expand_serializers = {}
+
+    def __init__(self, *args, **kwargs):
+        self._selected_fields = kwargs.pop('fields', None)
+        self._selected_expand = kwargs.pop('expand', None)
+        super(BaseModelSerializer, self).__init__(*args, **kwargs)
+
+    def _is_request_serializer(self):
+        # apenas o serializer da view utiliza os parâmetros da requisição, os aninhados recebem os campos
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_field_selection(self):
+        if self._selected_fields is not None or self._selected_expand is not None:
+            return FieldSelection(self._selected_fields, self._selected_expand)
+        request = self.context.get('request')
+        if request is None or not self._is_request_serializer():
+            return FieldSelection()
+        return get_field_selection(request)
+
+    def get_fields(self):
+        fields = super(BaseModelSerializer, self).get_fields()
+        selection = self.get_field_selection()
+        if not selection:
+            return fields
+        model = self.Meta.model
+        for name in selection.expand:
+            if name not in fields:
+                continue
+            field = get_expandable_field(model, name)
+            if field is None:
+                continue
+            serializer = self.expand_serializers.get(name) or get_expand_serializer(field.related_model)
+            fields[name] = serializer(fields=selection.nested.get(name), many=field.many_to_many, read_only=True)
+        if selection.fields is not None:
+            fields = fields.__class__((name, field) for name, field in fields.items() if name in selection.fields)
+        return fields
+
+
+def narrow_queryset(queryset, selection):
+    """Limita a consulta aos campos escolhidos na requisição
+
+    Os campos simples são carregados com only(), as ForeignKey expandidas com select_related
+    e os ManyToMany expandidos com prefetch_related
+
+    Arguments:
+        queryset {QuerySet} -- Registros da view
+        selection {FieldSelection} -- Campos escolhidos
+
+    Returns:
+        QuerySet -- Consulta limitada
+    """
+    if not selection:
+        return queryset
+    model = queryset.model
+    only = [model._meta.pk.name]
+    select_related = []
+    prefetch_related = []
+    for name in selection.expand:
+        field = get_expandable_field(model, name)
+        if field is None or (selection.fields is not None and name not in selection.fields):
+            continue
+        if field.many_to_many:
+            prefetch_related.append(name)
+        else:
+            select_related.append(name)
+            only.extend('{}__{}'.format(name, sub) for sub in selection.nested.get(name, ()))
+    if selection.fields is not None:
+        for name in selection.fields:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # propriedades e campos calculados do serializer não limitam a consulta
+                return _apply_related(queryset, select_related, prefetch_related)
+            if field.concrete and not field.many_to_many:
+                if name in select_related and selection.nested.get(name):
+                    # a ForeignKey é carregada pelos campos informados do registro relacionado
+                    only.append('{}__{}'.format(name, field.related_model._meta.pk.name))
+                only.append(name)
+        queryset = queryset.only(*only)
+    return _apply_related(queryset, select_related, prefetch_related)
+
+
+def _apply_related(queryset, select_related, prefetch_related):
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class RelatedLookups(object):
+    """Relacionamentos carregados na consulta para um campo do serializer
+
+    Attributes:
+        select_related {List} -- Caminhos das ForeignKey e OneToOne, ex: ['categoria', 'categoria__pai']
+        prefetch_related {List} -- Caminhos dos ManyToMany e relacionamentos reversos, ex: ['tags']
+    """
+
+    def __init__(self):
+        self.select_related = []
+        self.prefetch_related = []
+
+    def __bool__(self):
+        return bool(self.select_related or self.prefetch_related)
+
+    def add(self, path, many):
+        lookups = self.prefetch_related if many else self.select_related
+        if path and path not in lookups:
+            lookups.append(path)
+
+
+def _loads_related(field):
+    """Verifica se o campo precisa do registro relacionado, o PrimaryKeyRelatedField de uma
+    ForeignKey utiliza apenas o valor da coluna (categoria_id)
+    """
+    if isinstance(field, RelatedField):
+        return not field.use_pk_only_optimization()
+    return True
+
+
+def _collect_related(fields, model, lookups, prefix='', many=False):
+    for field in fields:
+        if field.write_only:
+            continue
+        if field.source == '*':
+            if isinstance(field, BaseSerializer) and not isinstance(field, ListSerializer):
+                _collect_related(field.fields.values(), model, lookups, prefix, many)
+            continue
+        current = model
+        path = prefix
+        path_many = many
+        for index, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # propriedades e métodos do model não são carregados
+                break
+            if not model_field.is_relation:
+                break
+            last = index == len(field.source_attrs) - 1
+            path = '{}__{}'.format(path, attr) if path else attr
+            path_many = path_many or model_field.one_to_many or model_field.many_to_many
+            if model_field.related_model is None:
+                # GenericForeignKey é carregada apenas pelo prefetch_related
+                lookups.add(path, True)
+                break
+            if not last:
+                lookups.add(path, path_many)
+                current = model_field.related_model
+                continue
+            nested = field.child if isinstance(field, ListSerializer) else field
+            if isinstance(nested, BaseSerializer):
+                lookups.add(path, path_many)
+                _collect_related(nested.fields.values(), model_field.related_model, lookups, path, path_many)
+            elif isinstance(field, ManyRelatedField) or path_many or _loads_related(field):
+                lookups.add(path, path_many)
+
+
+def get_related_lookups(serializer_class):
+    """Retorna os relacionamentos utilizados pelos campos do serializer, analisados apenas uma vez
+    para cada classe
+
+    Returns:
+        Dict -- RelatedLookups de cada campo, ex: {'categoria': RelatedLookups}
+    """
+    related = _related_lookups_cache.get(serializer_class)
+    if related is None:
+        related = {}
+        model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+        if model is not None:
+            serializer = serializer_class()
+            for name, field in serializer.fields.items():
+                lookups = RelatedLookups()
+                _collect_related([field], model, lookups)
+                if lookups:
+                    related[name] = lookups
+        _related_lookups_cache[serializer_class] = related
+    return related
+
+
+def select_related_fields(queryset, serializer_class, selection=None):
+    """Aplica na consulta o select_related e o prefetch_related dos campos do serializer
+
+    Os campos não escolhidos na requisição e os relacionamentos expandidos (carregados pelo
+    narrow_queryset) são desconsiderados
+
+    Arguments:
+        queryset {QuerySet} -- Registros da view
+        serializer_class {Serializer} -- Serializer da view
+
+    Keyword Arguments:
+        selection {FieldSelection} -- Campos escolhidos na requisição (default: {None})
+
+    Returns:
+        QuerySet -- Consulta com os relacionamentos
+    """
+    select_related = []
+    prefetch_related = []
+    for name, lookups in get_related_lookups(serializer_class).items():
+        if selection is not None:
+            if name in selection.expand or (selection.fields is not None and name not in selection.fields):
+                continue
+        select_related.extend(path for path in lookups.select_related if path not in select_related)
+        prefetch_related.extend(path for path in lookups.prefetch_related if path not in prefetch_related)
+    return _apply_related(queryset, select_related, prefetch_related)
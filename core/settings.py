@@ -16,6 +16,87 @@ try:
 except:
     use_default_manager = False
 
+try:
+    """Quantidade de níveis de relacionamentos percorridos ao marcar
+    os registros como deleted (soft delete). Se for None percorre
+    todos os níveis até não existirem mais registros a serem marcados
+    """
+    soft_delete_depth = settings.SOFT_DELETE_DEPTH
+except:
+    soft_delete_depth = 1
+
+try:
+    """Variável responsável por criar em todos os models que herdam de Base
+    o índice parcial (WHERE deleted = false) com os campos do Meta.ordering.
+    Pode ser alterado em cada model com o soft_delete_index do Meta
+    """
+    soft_delete_indexes = settings.SOFT_DELETE_INDEXES
+except:
+    soft_delete_indexes = False
+
+try:
+    """Variável responsável por criar em todos os models que herdam de Base o índice
+    (updated_on, pk) utilizado pela sincronização incremental da API (core/sync.py).
+    Pode ser alterado em cada model com o sync_index do Meta
+    """
+    sync_indexes = settings.SYNC_INDEXES
+except:
+    sync_indexes = False
+
+try:
+    """Tempo (em segundos) desconsiderado no final da sincronização, os registros alterados
+    nesse intervalo são enviados na próxima sincronização, evitando que uma transação ainda
+    não confirmada com updated_on anterior ao cursor deixe de ser sincronizada
+    """
+    sync_safety_window = settings.SYNC_SAFETY_WINDOW
+except:
+    sync_safety_window = 2
+
+try:
+    """Versão do UUID utilizado como chave primária dos models que herdam de Base.
+    Se for 7 utiliza o UUID ordenado pelo tempo (UUIDv7), caso contrário o UUIDv4.
+    Ao alterar o valor é necessário executar o makemigrations
+    """
+    uuid_version = settings.UUID_VERSION
+except:
+    uuid_version = 4
+
+try:
+    # Tempo (em segundos) que as opções dos filtros das listagens ficam armazenadas no cache
+    facets_cache_timeout = settings.FACETS_CACHE_TIMEOUT
+except:
+    facets_cache_timeout = 300
+
+try:
+    # Tempo (em segundos) que os blocos das páginas com page_cache = True ficam armazenados no cache
+    page_cache_timeout = settings.PAGE_CACHE_TIMEOUT
+except:
+    page_cache_timeout = 300
+
+try:
+    """Backend utilizado na pesquisa (search_fields) das listagens:
+    'icontains' (padrão), 'postgresql' (to_tsvector com índice GIN),
+    'sqlite' (FTS5) ou 'auto' (de acordo com o banco de dados)
+    """
+    search_backend = settings.SEARCH_BACKEND
+except:
+    search_backend = 'icontains'
+
+try:
+    # Configuração de idioma do PostgreSQL utilizada na pesquisa de texto completo
+    search_config = settings.SEARCH_CONFIG
+except:
+    search_config = 'portuguese'
+
+try:
+    """Variável responsável por habilitar a tabela de texto pesquisável (GenericSearchText)
+    das relações genéricas do search_fields (ex: content_object__nome), pesquisada com uma
+    única consulta indexada ao invés de uma consulta para cada content type
+    """
+    generic_search_index = settings.GENERIC_SEARCH_INDEX
+except:
+    generic_search_index = False
+
 
 try:
     from django.conf import settings
@@ -0,0 +1,131 @@
+"""Sincronização incremental (delta sync) dos registros dos models que herdam de Base.
+
+Os clientes offline (ex: o Data gerado para o Flutter) recebem apenas os registros alterados
+desde a última sincronização ao invés da tabela inteira. Os registros são percorridos na ordem
+(updated_on, pk) e cada página devolve um cursor com a posição do último registro enviado,
+utilizado na próxima requisição. Os registros marcados como deleted são enviados apenas
+com a pk (tombstone) para que o cliente os remova da base local.
+
+    GET api/app/model/sync/?since=2020-01-01T00:00:00Z  -- primeira sincronização a partir de uma data
+    GET api/app/model/sync/?cursor=...                  -- próximas páginas e sincronizações
+"""
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .settings import sync_safety_window
+
+# Campo utilizado para identificar os registros alterados
+SYNC_FIELD = 'updated_on'
+
+
+class InvalidSyncCursor(Exception):
+    pass
+
+
+class SyncPage(object):
+    """Página da sincronização
+
+    Attributes:
+        changed {List} -- Registros criados ou alterados
+        deleted {List} -- Pk dos registros marcados como deleted
+        cursor {str} -- Posição do último registro enviado, utilizado na próxima requisição
+        has_more {Bool} -- Indica se existem mais registros a serem sincronizados
+    """
+
+    def __init__(self, changed, deleted, cursor, has_more):
+        self.changed = changed
+        self.deleted = deleted
+        self.cursor = cursor
+        self.has_more = has_more
+
+
+def _make_aware(value):
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value, timezone.utc)
+    if not settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value, timezone.utc)
+    return value
+
+
+def encode_sync_cursor(obj):
+    """Gera o cursor opaco a partir do updated_on e da pk do registro"""
+    dados = json.dumps({'t': getattr(obj, SYNC_FIELD).isoformat(), 'p': str(obj.pk)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode('utf-8')).decode('ascii')
+
+
+def decode_sync_cursor(model, cursor):
+    """Recupera o updated_on e a pk a partir do cursor
+
+    Raises:
+        InvalidSyncCursor -- Caso o cursor não seja válido
+    """
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        data = parse_datetime(dados['t'])
+        if data is None:
+            raise InvalidSyncCursor()
+        return _make_aware(data), model._meta.pk.to_python(dados['p'])
+    except (TypeError, ValueError, KeyError, binascii.Error, UnicodeError, ValidationError):
+        raise InvalidSyncCursor()
+
+
+def parse_since(value):
+    """Converte o parâmetro since (ISO 8601) em datetime
+
+    Raises:
+        InvalidSyncCursor -- Caso a data não seja válida
+    """
+    try:
+        data = parse_datetime(value)
+    except ValueError:
+        data = None
+    if data is None:
+        raise InvalidSyncCursor()
+    return _make_aware(data)
+
+
+def get_sync_page(queryset, since=None, cursor=None, limit=500):
+    """Retorna os registros alterados e excluídos a partir do cursor (ou da data since)
+
+    Arguments:
+        queryset {QuerySet} -- Registros sincronizados, incluindo os marcados como deleted (ex: objects_all)
+
+    Keyword Arguments:
+        since {datetime} -- Data inicial, utilizada quando o cursor não for informado (default: {None})
+        cursor {str} -- Cursor devolvido na página anterior (default: {None})
+        limit {int} -- Quantidade máxima de registros da página (default: {500})
+
+    Raises:
+        InvalidSyncCursor -- Caso o cursor não seja válido
+
+    Returns:
+        SyncPage -- Página da sincronização
+    """
+    model = queryset.model
+    if cursor:
+        data, pk = decode_sync_cursor(model, cursor)
+        queryset = queryset.filter(Q(**{'{}__gt'.format(SYNC_FIELD): data}) |
+                                   Q(**{SYNC_FIELD: data, 'pk__gt': pk}))
+    elif since is not None:
+        queryset = queryset.filter(**{'{}__gte'.format(SYNC_FIELD): since})
+    if sync_safety_window:
+        # os registros mais recentes são enviados na próxima sincronização
+        queryset = queryset.filter(**{'{}__lt'.format(SYNC_FIELD): timezone.now() - timedelta(
+            seconds=sync_safety_window)})
+
+    # um registro a mais indica se existe a próxima página, sem COUNT(*)
+    items = list(queryset.order_by(SYNC_FIELD, 'pk')[:limit + 1])
+    has_more = len(items) > limit
+    items = items[:limit]
+    changed = [obj for obj in items if not getattr(obj, 'deleted', False)]
+    deleted = [obj.pk for obj in items if getattr(obj, 'deleted', False)]
+    # sem registros novos o cliente continua a partir do mesmo cursor
+    return SyncPage(changed, deleted, encode_sync_cursor(items[-1]) if items else cursor, has_more)
@@ -1,7 +1,11 @@
 
 from django import template
+from django.apps import apps as django_apps
 import pprint
 
+from ..cache import get_versions_key
+from ..permissions import get_permission_snapshot
+
 register = template.Library()
 
 @register.simple_tag(takes_context=True)
@@ -47,6 +51,8 @@ def has_add_permission(model=None, request=None):
     """
     if model and hasattr(model, 'has_add_permission') and request:
         return model.has_add_permission(request=request)
+    elif model and hasattr(model, '_meta') and request:
+        return get_permission_snapshot(request).has_add_permission(model)
     else:
         return False
 
@@ -59,6 +65,8 @@ def has_change_permission(model=None, request=None):
     """
     if model and hasattr(model, 'has_change_permission') and request:
         return model.has_change_permission(request=request)
+    elif model and hasattr(model, '_meta') and request:
+        return get_permission_snapshot(request).has_change_permission(model)
     else:
         return False
 
@@ -71,5 +79,34 @@ def has_delete_permission(model=None, request=None):
     """
     if model and hasattr(model, 'has_delete_permission') and request:
         return model.has_delete_permission(request=request)
+    elif model and hasattr(model, '_meta') and request:
+        return get_permission_snapshot(request).has_delete_permission(model)
+    else:
+        return False
+
+
+@register.filter()
+def has_perm(perm=None, request=None):
+    """
+    Verifica se o usuario tem a permissão informada, utilizando as permissões já carregadas na requisição
+    ex: {if 'app.add_model'|has_perm:request %}
+    """
+    if perm and request:
+        return get_permission_snapshot(request).has_perm(perm)
     else:
         return False
+
+
+@register.simple_tag()
+def model_version(*models, scope=None):
+    """
+    Retorna as versões dos models (core/cache.py) para compor a chave do {% cache %},
+    alteradas sempre que algum registro dos models é salvo ou excluído
+    ex: {% model_version 'app.model' 'app.outro' as versao %}{% cache 600 lista versao %}
+    """
+    classes = []
+    for model in models:
+        if isinstance(model, str):
+            model = django_apps.get_model(model)
+        classes.append(model if isinstance(model, type) else model.__class__)
+    return get_versions_key(*classes, scope=scope)
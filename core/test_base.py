@@ -26,3 +26,11 @@ class BaseApiTestCase(APITestCase):
     def get_url_atualizar_excluir(self, app, modelo, pk):
         return '/core/api/{0}/{1}/{2}/?format=json'.format(app, modelo, pk)
 
+    def assertListQueries(self, url, num, **kwargs):
+        """Verifica a quantidade de consultas de uma requisição GET (ex: listagem da API), que
+        deve ser a mesma independente da quantidade de registros retornados (sem N+1)
+        """
+        with self.assertNumQueries(num):
+            response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response
@@ -1,3 +1,893 @@
-from django.test import TestCase
+import csv
+import io
+import time
+import uuid
+import zipfile
+from datetime import timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, models
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils.http import http_date
+from rest_framework.permissions import BasePermission
+from rest_framework.routers import DefaultRouter
+from rest_framework.serializers import CharField, StringRelatedField
+from rest_framework.test import APIClient
+
+from .indexes import get_existing_indexes, get_soft_delete_index, get_sync_index, get_view_path, propose_indexes
+from . import search, sync, uuids, views
+from .api import BaseModelViewSet
+from .cache import get_model_version
+from .models import Base, GenericSearchText
+from .serializers import BaseModelSerializer
+from .test_base import BaseApiTestCase
+from .urls import urlpatterns as core_urlpatterns
+from .views import BaseDetailView, BaseListView
+
+
+# Models de exemplo utilizados apenas nos testes, as tabelas são criadas no setUpClass (managed = False
+# evita que sejam incluídos nas migrations e na serialização do banco de testes)
+class CategoriaTeste(Base):
+    nome = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'core'
+        managed = False
+
+    def __str__(self):
+        return self.nome
+
+
+class EtiquetaTeste(Base):
+    nome = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'core'
+        managed = False
+
+    def __str__(self):
+        return self.nome
+
+
+class ProdutoTeste(Base):
+    nome = models.CharField(max_length=50)
+    categoria = models.ForeignKey(CategoriaTeste, on_delete=models.CASCADE)
+    etiquetas = models.ManyToManyField(EtiquetaTeste, blank=True)
+
+    class Meta:
+        app_label = 'core'
+        managed = False
+        ordering = ['nome']
+        soft_delete_index = True
+        sync_index = True
+
+    def __str__(self):
+        return self.nome
+
+
+class ComentarioTeste(Base):
+    produto = models.ForeignKey(ProdutoTeste, on_delete=models.CASCADE, related_name='comentarios')
+    texto = models.CharField(max_length=100)
+
+    class Meta:
+        app_label = 'core'
+        managed = False
+
+    def __str__(self):
+        return self.texto
+
+
+class NotaTeste(Base):
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=36)
+    content_object = GenericForeignKey('content_type', 'object_id')
+    texto = models.CharField(max_length=100)
+
+    class Meta:
+        app_label = 'core'
+        managed = False
+
+
+class ProdutoTesteListView(BaseListView):
+    model = ProdutoTeste
+    template_name = 'core/index_list.html'
+    list_display = ['nome', 'categoria', 'categoria__nome', 'etiquetas']
+    search_fields = ['nome']
+    paginate_by = 50
+
+
+class ProdutoTesteFiltrosListView(ProdutoTesteListView):
+    list_filter = ['categoria']
+
+
+class ProdutoTesteRestritoListView(ProdutoTesteFiltrosListView):
+
+    def get_queryset(self):
+        # simula uma listagem limitada aos registros do usuário
+        return super(ProdutoTesteRestritoListView, self).get_queryset().filter(categoria__nome='Categoria 0')
+
+
+class ProdutoTesteOutraCategoriaListView(ProdutoTesteFiltrosListView):
+
+    def get_queryset(self):
+        return super(ProdutoTesteOutraCategoriaListView, self).get_queryset().filter(categoria__nome='Categoria 1')
+
+
+class NotaTesteListView(BaseListView):
+    model = NotaTeste
+    template_name = 'core/index_list.html'
+    list_display = ['texto']
+    search_fields = ['texto', 'content_object__nome']
+
+
+class ProdutoTesteCacheListView(ProdutoTesteListView):
+    page_cache = True
+
+
+class ProdutoTesteDoUsuarioCacheListView(ProdutoTesteCacheListView):
+
+    def get_queryset(self):
+        # simula uma listagem com os registros do usuário, sem o escopo da versão
+        return super(ProdutoTesteDoUsuarioCacheListView, self).get_queryset().filter(
+            nome__startswith=self.request.user.username)
+
+
+class ProdutoTesteCacheDetailView(BaseDetailView):
+    model = ProdutoTeste
+    template_name = 'core/index.html'
+    page_cache = True
+
+
+class CategoriaTesteDetailView(BaseDetailView):
+    model = CategoriaTeste
+    template_name = 'core/index.html'
+
+    def get_queryset(self):
+        # simula um detalhe limitado aos registros do usuário
+        return super(CategoriaTesteDetailView, self).get_queryset().exclude(nome='Categoria 2')
+
+
+class CategoriaTesteSemProdutosDetailView(BaseDetailView):
+    model = CategoriaTeste
+    template_name = 'core/index.html'
+    # o relacionamento reverso é excluído pelo nome do campo (related_query_name)
+    exclude = ['produtoteste']
+
+
+class ProdutoTesteSerializer(BaseModelSerializer):
+
+    class Meta:
+        model = ProdutoTeste
+        fields = ['id', 'nome', 'categoria', 'etiquetas']
+
+
+class ProdutoTesteBloqueadoPermission(BasePermission):
+    """Simula uma permissão de objeto, os produtos com o nome iniciado por Bloqueado não podem ser alterados"""
+
+    def has_object_permission(self, request, view, obj):
+        return not obj.nome.startswith('Bloqueado')
+
+
+class ProdutoTesteViewSet(BaseModelViewSet):
+    queryset = ProdutoTeste.objects.all()
+    serializer_class = ProdutoTesteSerializer
+    permission_classes = [ProdutoTesteBloqueadoPermission]
+
+
+class CategoriaTesteSerializer(BaseModelSerializer):
+
+    class Meta:
+        model = CategoriaTeste
+        fields = ['id', 'nome']
+
+
+class ComentarioTesteSerializer(BaseModelSerializer):
+
+    class Meta:
+        model = ComentarioTeste
+        fields = ['id', 'texto']
+
+
+class ProdutoTesteRelacionamentosSerializer(BaseModelSerializer):
+    # ForeignKey exibida pelo __str__, pelo source e por um serializer aninhado, ManyToMany e ForeignKey reverso
+    categoria_label = StringRelatedField(source='categoria')
+    categoria_nome = CharField(source='categoria.nome', read_only=True)
+    categoria = CategoriaTesteSerializer(read_only=True)
+    etiquetas = StringRelatedField(many=True)
+    comentarios = ComentarioTesteSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ProdutoTeste
+        fields = ['id', 'nome', 'categoria_label', 'categoria_nome', 'categoria', 'etiquetas', 'comentarios']
+
+
+class ProdutoTesteRelacionamentosViewSet(BaseModelViewSet):
+    queryset = ProdutoTeste.objects.all()
+    serializer_class = ProdutoTesteRelacionamentosSerializer
+
+
+router = DefaultRouter()
+router.register('produtoteste', ProdutoTesteViewSet)
+router.register('produtoteste-relacionamentos', ProdutoTesteRelacionamentosViewSet,
+                basename='produtoteste-relacionamentos')
+
+urlpatterns = [
+    path('api/', include(router.urls)),
+    path('core/', include((core_urlpatterns + [
+        path('produtoteste/', ProdutoTesteListView.as_view(), name='produtoteste-list'),
+        # a listagem sem restrições é registrada antes, as opções dos filtros não podem vir dela
+        path('produtoteste/filtros/', ProdutoTesteFiltrosListView.as_view(), name='produtoteste-filtros'),
+        path('produtoteste/restrito/', ProdutoTesteRestritoListView.as_view(), name='produtoteste-restrito'),
+        path('produtoteste/outra/', ProdutoTesteOutraCategoriaListView.as_view(), name='produtoteste-outra'),
+        path('produtoteste/create/', ProdutoTesteListView.as_view(), name='produtoteste-create'),
+        path('notateste/', NotaTesteListView.as_view(), name='notateste-list'),
+        path('produtoteste/cache/', ProdutoTesteCacheListView.as_view(), name='produtoteste-cache'),
+        path('produtoteste/cache/usuario/', ProdutoTesteDoUsuarioCacheListView.as_view(),
+             name='produtoteste-cache-usuario'),
+        path('produtoteste/<uuid:pk>/', ProdutoTesteCacheDetailView.as_view(), name='produtoteste-detail'),
+        path('categoriateste/<uuid:pk>/', CategoriaTesteDetailView.as_view(), name='categoriateste-detail'),
+        path('categoriateste/<uuid:pk>/resumo/', CategoriaTesteSemProdutosDetailView.as_view(),
+             name='categoriateste-resumo'),
+    ], 'core'))),
+]
+
+MODELS_TESTE = (CategoriaTeste, EtiquetaTeste, ProdutoTeste, ComentarioTeste, NotaTeste)
+
+
+class BaseModelTestCase(TestCase):
+    """Cria as tabelas dos models de exemplo e o usuário logado"""
+
+    @classmethod
+    def setUpClass(cls):
+        # o schema_editor do SQLite não pode ser utilizado dentro da transação do TestCase
+        with connection.schema_editor() as editor:
+            for model in MODELS_TESTE:
+                editor.create_model(model)
+                # o create_model não cria os índices do Meta.indexes dos models com managed = False
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+        super(BaseModelTestCase, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(BaseModelTestCase, cls).tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in reversed(MODELS_TESTE):
+                editor.delete_model(model)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('teste', 'teste@teste.com', 'teste')
+        cls.categorias = [CategoriaTeste.objects.create(nome='Categoria {}'.format(i)) for i in range(3)]
+        cls.etiquetas = [EtiquetaTeste.objects.create(nome='Etiqueta {}'.format(i)) for i in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def criar_produtos(self, quantidade):
+        for i in range(quantidade):
+            produto = ProdutoTeste.objects.create(nome='Produto {}'.format(i), categoria=self.categorias[i % 3])
+            produto.etiquetas.set(self.etiquetas[:i % 3 + 1])
+
+
+class SoftDeleteTest(BaseModelTestCase):
+
+    def criar_comentarios(self):
+        # sem etiquetas, o ManyToManyField também seria percorrido pelo soft delete
+        for i in range(6):
+            produto = ProdutoTeste.objects.create(nome='Produto {}'.format(i), categoria=self.categorias[i % 3])
+            ComentarioTeste.objects.create(produto=produto, texto='Comentário {}'.format(i))
+
+    def test_quantidade_por_model_e_profundidade(self):
+        """A profundidade limita os níveis de relacionamentos marcados como deleted"""
+        self.criar_comentarios()
+        counts = CategoriaTeste.objects.filter(pk=self.categorias[0].pk).soft_delete(depth=1)
+        self.assertEqual(counts, {'core.CategoriaTeste': 1, 'core.ProdutoTeste': 2})
+        self.assertEqual(ComentarioTeste.objects.count(), 6)
+
+        counts = self.categorias[1].delete(depth=2)
+        self.assertEqual(counts, {'core.CategoriaTeste': 1, 'core.ProdutoTeste': 2, 'core.ComentarioTeste': 2})
+        self.assertEqual(ProdutoTeste.objects.count(), 2)
+        self.assertEqual(ProdutoTeste.objects_all.filter(deleted=True, enabled=False).count(), 4)
+        self.assertEqual(ComentarioTeste.objects.count(), 4)
+
+    def test_registros_ja_excluidos_nao_repassam_a_exclusao(self):
+        """Os registros marcados anteriormente não marcam os seus relacionamentos novamente"""
+        self.criar_comentarios()
+        produto = ProdutoTeste.objects.filter(categoria=self.categorias[0]).first()
+        produto.delete(depth=0)
+
+        counts = CategoriaTeste.objects.filter(pk=self.categorias[0].pk).soft_delete(depth=2)
+        self.assertEqual(counts, {'core.CategoriaTeste': 1, 'core.ProdutoTeste': 1, 'core.ComentarioTeste': 1})
+        self.assertTrue(ComentarioTeste.objects.filter(produto=produto).exists())
+
+        # a queryset com registros já marcados também não os percorre novamente
+        counts = CategoriaTeste.objects_all.filter(pk=self.categorias[0].pk).soft_delete(depth=2)
+        self.assertEqual(counts, {})
+        self.assertTrue(ComentarioTeste.objects.filter(produto=produto).exists())
+
+
+class IndexesTest(BaseModelTestCase):
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' '.join('{}'.format(linha[-1]) for linha in cursor.fetchall())
+
+    def test_indices_do_soft_delete_e_da_sincronizacao(self):
+        """Os índices do Meta.soft_delete_index e Meta.sync_index são criados e utilizados pelas consultas"""
+        soft_delete = get_soft_delete_index(ProdutoTeste)
+        sync = get_sync_index(ProdutoTeste)
+        self.assertEqual(soft_delete.fields, ['nome', 'id'])
+        self.assertEqual(sync.fields, ['updated_on', 'id'])
+        self.assertIn(soft_delete.name, [index.name for index in ProdutoTeste._meta.indexes])
+        existing = get_existing_indexes(ProdutoTeste, connection)
+        self.assertEqual(existing[soft_delete.name], ['nome', 'id'])
+        self.assertEqual(existing[sync.name], ['updated_on', 'id'])
+        self.assertEqual(propose_indexes(ProdutoTeste, connection), [])
+        # os campos do list_filter sem índice recebem a sugestão do índice parcial
+        propostas = propose_indexes(CategoriaTeste, connection, list_filter=['nome'])
+        self.assertEqual([(proposta.index.fields, proposta.reason) for proposta in propostas],
+                         [(['nome'], 'list_filter: nome')])
+
+        self.assertIn(soft_delete.name, self.explain(ProdutoTeste.objects.all()))
+        self.assertIn(sync.name, self.explain(ProdutoTeste.objects_all.order_by('updated_on', 'pk')))
+
+
+class Uuid7Test(SimpleTestCase):
+
+    def test_versao_e_ordem_de_criacao(self):
+        """Os UUIDs gerados são versão 7, crescentes e possuem a data de criação"""
+        inicio = time.time()
+        valores = [uuids.uuid7() for _ in range(5000)]
+        self.assertTrue(all(valor.version == 7 and valor.variant == uuid.RFC_4122 for valor in valores))
+        self.assertEqual(valores, sorted(valores))
+        # o UUIDField do SQLite grava o hex, que também segue a ordem de criação
+        self.assertEqual([valor.hex for valor in valores], sorted(valor.hex for valor in valores))
+        criado = uuids.uuid7_datetime(valores[0])
+        self.assertEqual(criado.tzinfo, timezone.utc)
+        self.assertAlmostEqual(criado.timestamp(), inicio, delta=1)
+        self.assertIsNone(uuids.uuid7_datetime(uuid.uuid4()))
+
+    def test_contador_no_mesmo_milissegundo(self):
+        """No mesmo milissegundo o contador é incrementado e, quando esgotado, o timestamp avança"""
+        agora = time.time()
+        ms = int(agora * 1000)
+        with mock.patch.object(uuids, 'time') as relogio:
+            relogio.time.return_value = agora
+            primeiro, segundo = uuids.uuid7(), uuids.uuid7()
+            self.assertEqual(primeiro.int >> 80, ms)
+            self.assertEqual(segundo.int >> 80, ms)
+            self.assertEqual((segundo.int >> 64) & 0xFFF, ((primeiro.int >> 64) & 0xFFF) + 1)
+
+            with mock.patch.object(uuids, '_contador', 0xFFF):
+                esgotado = uuids.uuid7()
+            self.assertEqual(esgotado.int >> 80, ms + 1)
+            self.assertEqual((esgotado.int >> 64) & 0xFFF, 0)
+            self.assertLess(segundo, esgotado)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+class GenericSearchTextTest(BaseModelTestCase):
+
+    def setUp(self):
+        super(GenericSearchTextTest, self).setUp()
+        patcher = mock.patch.object(search, 'generic_search_index', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        search.clear_search_cache()
+        self.addCleanup(search.clear_search_cache)
+
+    def test_apenas_os_models_referenciados_atualizam_o_texto(self):
+        """Os models com um campo de mesmo nome que não são referenciados pela relação não executam o UPDATE"""
+        categoria = self.categorias[0]
+        nota = NotaTeste.objects.create(content_object=categoria, texto='Nota')
+        texto = GenericSearchText.objects.get(object_id=nota.pk, field='content_object')
+        self.assertEqual(texto.text, 'Categoria 0')
+
+        with CaptureQueriesContext(connection) as consultas:
+            EtiquetaTeste.objects.create(nome='Etiqueta nova')
+        self.assertFalse([consulta for consulta in consultas.captured_queries
+                          if GenericSearchText._meta.db_table in consulta['sql']])
+
+        categoria.nome = 'Categoria renomeada'
+        categoria.save()
+        texto.refresh_from_db()
+        self.assertEqual(texto.text, 'Categoria renomeada')
+
+        # a etiqueta passa a ser referenciada depois que a primeira nota é gravada
+        etiqueta = self.etiquetas[0]
+        nota = NotaTeste.objects.create(content_object=etiqueta, texto='Nota da etiqueta')
+        etiqueta.nome = 'Etiqueta renomeada'
+        etiqueta.save()
+        self.assertEqual(GenericSearchText.objects.get(object_id=nota.pk).text, 'Etiqueta renomeada')
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+class ExportTest(BaseModelTestCase):
+    url = '/core/produtoteste/'
+
+    def exportar(self, formato, **parametros):
+        parametros['export'] = formato
+        response = self.client.get(self.url, parametros)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('.{}"'.format(formato), response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_csv_com_as_colunas_e_a_pesquisa_da_listagem(self):
+        """O CSV possui as colunas do list_display, respeita a pesquisa e não executa fórmulas"""
+        self.criar_produtos(3)
+        ProdutoTeste.objects.create(nome='=HYPERLINK("http://exemplo.com")', categoria=self.categorias[0])
+        ProdutoTeste.objects.create(nome='-10', categoria=self.categorias[0])
+
+        conteudo = self.exportar('csv').decode('utf-8')
+        self.assertTrue(conteudo.startswith('\ufeff'))
+        linhas = list(csv.reader(io.StringIO(conteudo[1:])))
+        # a primeira coluna é a pk do registro
+        self.assertEqual(linhas[0], ['pk', 'Nome', 'Categoria', 'Nome Categoria', 'Etiquetas'])
+        self.assertEqual(len(linhas), 6)
+        linha = [linha for linha in linhas if linha[1] == 'Produto 2'][0]
+        self.assertEqual(linha[2:4], ['Categoria 2', 'Categoria 2'])
+        self.assertEqual(sorted(linha[4].split(', ')), ['Etiqueta 0', 'Etiqueta 1', 'Etiqueta 2'])
+        nomes = [linha[1] for linha in linhas[1:]]
+        self.assertIn('\'=HYPERLINK("http://exemplo.com")', nomes)
+        self.assertIn('-10', nomes)
+
+        linhas = list(csv.reader(io.StringIO(self.exportar('csv', q='Produto 2').decode('utf-8')[1:])))
+        self.assertEqual([linha[1] for linha in linhas[1:]], ['Produto 2'])
+
+    def test_xlsx(self):
+        """O XLSX é um arquivo zip com o workbook e a planilha com as linhas"""
+        self.criar_produtos(3)
+        arquivo = zipfile.ZipFile(io.BytesIO(self.exportar('xlsx')))
+        self.assertIn('xl/workbook.xml', arquivo.namelist())
+        planilha = arquivo.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(planilha.count('<row '), 4)
+        self.assertIn('Produto 2', planilha)
+        self.assertIn('Etiqueta 2', planilha)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+class ListQueryPlanTest(BaseModelTestCase):
+    url = '/core/produtoteste/'
+    # sessão, usuário, COUNT da paginação, registros com a categoria (select_related),
+    # etiquetas (prefetch_related) e a coluna categoria__nome
+    num_queries = 6
+
+    def test_quantidade_de_consultas_fixa(self):
+        """As colunas ForeignKey, categoria__nome e ManyToMany não executam uma consulta por registro"""
+        self.criar_produtos(3)
+        with self.assertNumQueries(self.num_queries):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # o template core/index_list.html não possui o bloco list_app, as linhas são verificadas no contexto
+        linhas = '{}'.format(response.context['object_list'])
+        self.assertIn('Categoria 1', linhas)
+        self.assertIn('Etiqueta 2', linhas)
+
+        self.criar_produtos(30)
+        with self.assertNumQueries(self.num_queries):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+class FacetsTest(BaseModelTestCase):
+
+    def test_filtros_utilizam_os_registros_da_view(self):
+        """As opções dos filtros não incluem os registros que a view não exibe"""
+        self.criar_produtos(6)
+        response = self.client.get('/core/produtoteste/restrito/')
+        self.assertEqual(response.status_code, 200)
+        opcoes = response.context['filters'][0]['categoria']['list']
+        self.assertEqual([(str(opcao), opcao.count) for opcao in opcoes], [('Categoria 0', 2)])
+
+    def get_options(self, view_class):
+        response = self.client.get('/core/facets/', {'model': 'core.produtoteste', 'field': 'categoria',
+                                                      'view': get_view_path(view_class)})
+        self.assertEqual(response.status_code, 200)
+        return [opcao['label'] for opcao in response.json()['results']]
+
+    def test_opcoes_sob_demanda_da_view_que_exibiu_o_filtro(self):
+        """O endpoint facet-options calcula as opções com a view informada, não com a primeira do model"""
+        self.criar_produtos(6)
+        self.assertEqual(self.get_options(ProdutoTesteRestritoListView), ['Categoria 0'])
+        self.assertEqual(self.get_options(ProdutoTesteOutraCategoriaListView), ['Categoria 1'])
+        self.assertEqual(self.get_options(ProdutoTesteFiltrosListView), ['Categoria 0', 'Categoria 1', 'Categoria 2'])
+
+        # sem a view, ou com uma view sem o campo no list_filter, o filtro não é encontrado
+        parametros = {'model': 'core.produtoteste', 'field': 'categoria'}
+        self.assertEqual(self.client.get('/core/facets/', parametros).status_code, 404)
+        parametros['view'] = get_view_path(ProdutoTesteListView)
+        self.assertEqual(self.client.get('/core/facets/', parametros).status_code, 404)
+        parametros['view'] = 'nuvols.core.views.FacetOptionsView'
+        self.assertEqual(self.client.get('/core/facets/', parametros).status_code, 404)
+
+    def test_cache_dos_filtros_por_view(self):
+        """As listagens do mesmo model e usuário não compartilham as opções armazenadas no cache"""
+        self.criar_produtos(6)
+        for url, categoria in (('/core/produtoteste/restrito/', 'Categoria 0'),
+                               ('/core/produtoteste/outra/', 'Categoria 1')):
+            opcoes = self.client.get(url).context['filters'][0]['categoria']['list']
+            self.assertEqual([str(opcao) for opcao in opcoes], [categoria])
+
+    def test_url_das_opcoes_informa_a_view(self):
+        """A url_options dos filtros com mais opções que o facet_limit identifica a view"""
+        self.criar_produtos(6)
+        with mock.patch.object(ProdutoTesteFiltrosListView, 'facet_limit', 1):
+            facet = self.client.get('/core/produtoteste/filtros/').context['filters'][0]['categoria']
+        self.assertTrue(facet['has_more'])
+        self.assertIn('view={}'.format(get_view_path(ProdutoTesteFiltrosListView)), facet['url_options'])
+        self.assertEqual(self.client.get(facet['url_options']).status_code, 200)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+class RelatedObjectsTest(BaseModelTestCase):
+
+    def get_permission(self, model, action):
+        content_type = ContentType.objects.get_for_model(model)
+        codename = '{}_{}'.format(action, model._meta.model_name)
+        return Permission.objects.get_or_create(content_type=content_type, codename=codename,
+                                                defaults={'name': codename})[0]
+
+    def test_permissao_no_model_relacionado(self):
+        """A permissão no model do registro não permite visualizar os registros de outro model"""
+        self.criar_produtos(3)
+        usuario = User.objects.create_user('usuario', 'usuario@teste.com', 'usuario')
+        usuario.user_permissions.add(self.get_permission(CategoriaTeste, 'change'))
+        self.client.force_login(usuario)
+        parametros = self.get_parametros(self.categorias[0], CategoriaTesteDetailView)
+
+        self.assertEqual(self.client.get('/core/related/', parametros).status_code, 403)
+
+        usuario.user_permissions.add(self.get_permission(ProdutoTeste, 'view'))
+        response = self.client.get('/core/related/', parametros)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['label'] for item in response.json()['results']], ['Produto 0'])
+
+    def get_parametros(self, categoria, view_class):
+        return {'model': 'core.categoriateste', 'pk': categoria.pk, 'relation': 'produtoteste_set',
+                'view': get_view_path(view_class)}
+
+    def test_relacionamento_excluido_pela_view(self):
+        """O relacionamento oculto pelo exclude da view de detalhe não é carregado"""
+        self.criar_produtos(3)
+        parametros = self.get_parametros(self.categorias[0], CategoriaTesteDetailView)
+        self.assertEqual(self.client.get('/core/related/', parametros).status_code, 200)
+
+        parametros = self.get_parametros(self.categorias[0], CategoriaTesteSemProdutosDetailView)
+        self.assertEqual(self.client.get('/core/related/', parametros).status_code, 404)
+
+    def test_registro_fora_do_queryset_da_view(self):
+        """O registro é buscado no get_queryset da view de detalhe"""
+        self.criar_produtos(3)
+        parametros = self.get_parametros(self.categorias[2], CategoriaTesteDetailView)
+        self.assertEqual(self.client.get('/core/related/', parametros).status_code, 404)
+
+        parametros = self.get_parametros(self.categorias[1], CategoriaTesteDetailView)
+        self.assertEqual(self.client.get('/core/related/', parametros).status_code, 200)
+
+    def test_view_nao_registrada(self):
+        """Sem a view de detalhe do model o endpoint não expõe os relacionamentos"""
+        self.criar_produtos(3)
+        parametros = self.get_parametros(self.categorias[0], CategoriaTesteDetailView)
+        del parametros['view']
+        self.assertEqual(self.client.get('/core/related/', parametros).status_code, 404)
+
+        parametros['view'] = get_view_path(ProdutoTesteCacheDetailView)
+        self.assertEqual(self.client.get('/core/related/', parametros).status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+class BulkApiTest(BaseModelTestCase):
+    client_class = APIClient
+
+    def test_erros_por_item(self):
+        """Os erros são retornados pelo índice do item, sem o bulk_atomic os itens válidos são gravados"""
+        itens = [{'nome': 'Produto 0', 'categoria': self.categorias[0].pk}, {'categoria': self.categorias[0].pk}]
+        response = self.client.post('/api/produtoteste/', itens, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([erro['index'] for erro in response.data['errors']], [1])
+        self.assertIn('nome', response.data['errors'][0]['errors'])
+        self.assertFalse(ProdutoTeste.objects.exists())
+
+        with mock.patch.object(ProdutoTesteViewSet, 'bulk_atomic', False):
+            response = self.client.post('/api/produtoteste/', itens, format='json')
+            self.assertEqual(response.status_code, 207)
+            self.assertEqual([item['index'] for item in response.data['results']], [0])
+            self.assertEqual([erro['index'] for erro in response.data['errors']], [1])
+
+            response = self.client.post('/api/produtoteste/', itens[1:], format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(ProdutoTeste.objects.values_list('nome', flat=True)), ['Produto 0'])
+
+    def test_many_to_many_na_criacao(self):
+        """Os ManyToMany dos itens são gravados junto com a criação em lote"""
+        itens = [{'nome': 'Produto {}'.format(i), 'categoria': self.categorias[0].pk,
+                  'etiquetas': [etiqueta.pk for etiqueta in self.etiquetas[:i + 1]]} for i in range(3)]
+        response = self.client.post('/api/produtoteste/', itens, format='json')
+        self.assertEqual(response.status_code, 201)
+        for i, produto in enumerate(ProdutoTeste.objects.order_by('nome')):
+            self.assertEqual(set(produto.etiquetas.all()), set(self.etiquetas[:i + 1]))
+
+    def test_permissao_de_objeto_na_alteracao(self):
+        """Os registros sem permissão de objeto não são alterados e retornam nos erros do item"""
+        self.criar_produtos(2)
+        liberado, bloqueado = ProdutoTeste.objects.order_by('nome')
+        bloqueado.nome = 'Bloqueado'
+        bloqueado.save()
+        itens = [{'id': str(liberado.pk), 'nome': 'Alterado'}, {'id': str(bloqueado.pk), 'nome': 'Alterado'}]
+
+        response = self.client.patch('/api/produtoteste/bulk/', itens, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(erro['index'], list(erro['errors'])) for erro in response.data['errors']],
+                         [(1, ['detail'])])
+
+        with mock.patch.object(ProdutoTesteViewSet, 'bulk_atomic', False):
+            response = self.client.patch('/api/produtoteste/bulk/', itens, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([item['index'] for item in response.data['results']], [0])
+        self.assertEqual(ProdutoTeste.objects.get(pk=liberado.pk).nome, 'Alterado')
+        self.assertEqual(ProdutoTeste.objects.get(pk=bloqueado.pk).nome, 'Bloqueado')
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests',
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ModelVersionTest(BaseModelTestCase):
+    client_class = APIClient
+
+    def assertVersoesAlteradas(self, models, funcao, *args, **kwargs):
+        """Verifica se a função incrementa a versão de cada model (e apenas desses models)"""
+        anteriores = {model: get_model_version(model) for model in MODELS_TESTE}
+        funcao(*args, **kwargs)
+        alterados = [model for model in MODELS_TESTE if get_model_version(model) != anteriores[model]]
+        self.assertEqual(alterados, list(models))
+
+    def test_save_e_delete(self):
+        """O save e o delete incrementam a versão do model e dos relacionados marcados como deleted"""
+        produto = ProdutoTeste(nome='Produto', categoria=self.categorias[0])
+        self.assertVersoesAlteradas([ProdutoTeste], produto.save)
+        ComentarioTeste.objects.create(produto=produto, texto='Comentário')
+        # o soft delete também marca os comentários do produto
+        self.assertVersoesAlteradas([ProdutoTeste, ComentarioTeste], produto.delete)
+
+    def test_many_to_many(self):
+        """O add, remove e clear não chamam o save, as versões dos dois lados são incrementadas"""
+        produto = ProdutoTeste.objects.create(nome='Produto', categoria=self.categorias[0])
+        self.assertVersoesAlteradas([EtiquetaTeste, ProdutoTeste], produto.etiquetas.add, *self.etiquetas)
+        self.assertVersoesAlteradas([EtiquetaTeste, ProdutoTeste], produto.etiquetas.remove, self.etiquetas[0])
+        self.assertVersoesAlteradas([EtiquetaTeste, ProdutoTeste], produto.etiquetas.clear)
+
+    def test_alteracoes_em_lote(self):
+        """O soft delete da queryset e a gravação em lote da API não chamam o save de cada registro"""
+        self.criar_produtos(3)
+        self.assertVersoesAlteradas([ProdutoTeste], ProdutoTeste.objects.filter(nome='Produto 0').soft_delete,
+                                    depth=0)
+
+        itens = [{'nome': 'Lote {}'.format(i), 'categoria': self.categorias[0].pk} for i in range(3)]
+        self.assertVersoesAlteradas([ProdutoTeste], self.client.post, '/api/produtoteste/', itens, format='json')
+        itens = [{'id': str(pk), 'nome': 'Alterado'}
+                 for pk in ProdutoTeste.objects.filter(nome__startswith='Lote').values_list('pk', flat=True)]
+        self.assertVersoesAlteradas([ProdutoTeste], self.client.patch, '/api/produtoteste/bulk/', itens,
+                                    format='json')
+        self.assertEqual(ProdutoTeste.objects.filter(nome='Alterado').count(), 3)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests',
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConditionalApiTest(BaseModelTestCase):
+    client_class = APIClient
+
+    def test_list_if_none_match(self):
+        """O list responde 304 enquanto os registros não forem alterados"""
+        self.criar_produtos(3)
+        url = '/api/produtoteste/?format=json'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # apenas a consulta agregada do ETag, os registros não são serializados
+        consultas = [query['sql'] for query in consultas.captured_queries if 'core_produtoteste' in query['sql']]
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('COUNT', consultas[0])
+
+        ProdutoTeste.objects.filter(nome='Produto 0').get().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_retrieve_if_none_match(self):
+        """O retrieve compara o If-None-Match com o ETag do registro"""
+        self.criar_produtos(1)
+        produto = ProdutoTeste.objects.get()
+        url = '/api/produtoteste/{}/?format=json'.format(produto.pk)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='W/"outro"').status_code, 200)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+class SparseFieldsApiTest(BaseModelTestCase):
+    client_class = APIClient
+
+    def get_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # desconsidera a consulta agregada do ETag (ConditionalModelMixin)
+        return response.json(), [query['sql'] for query in consultas.captured_queries
+                                 if 'core_produtoteste' in query['sql'] and 'COUNT(' not in query['sql']]
+
+    def test_fields(self):
+        """Os campos não escolhidos não são retornados nem lidos do banco de dados"""
+        self.criar_produtos(3)
+        registros, consultas = self.get_consultas('/api/produtoteste/?format=json&fields=id,nome')
+        self.assertEqual([sorted(registro) for registro in registros], [['id', 'nome']] * 3)
+        # o ManyToMany não é carregado e a consulta não lê a categoria_id
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(consultas[0].split(' FROM ')[0],
+                         'SELECT "core_produtoteste"."id", "core_produtoteste"."nome"')
+
+    def test_fields_e_expand(self):
+        """O relacionamento expandido é carregado apenas com os campos escolhidos"""
+        self.criar_produtos(3)
+        url = '/api/produtoteste/?format=json&fields=id,categoria.nome&expand=categoria'
+        registros, consultas = self.get_consultas(url)
+        self.assertEqual([registro['categoria'] for registro in registros],
+                         [{'nome': 'Categoria {}'.format(i)} for i in range(3)])
+        self.assertEqual([sorted(registro) for registro in registros], [['categoria', 'id']] * 3)
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('JOIN "core_categoriateste"', consultas[0])
+        colunas = consultas[0].split(' FROM ')[0]
+        self.assertIn('"core_categoriateste"."nome"', colunas)
+        self.assertNotIn('"core_produtoteste"."nome"', colunas)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+class ListQueriesApiTest(BaseModelTestCase, BaseApiTestCase):
+    """Quantidade de consultas da listagem da API com os relacionamentos do serializer (get_related_lookups)"""
+    url = '/api/produtoteste-relacionamentos/?format=json'
+
+    def criar_registros(self, quantidade):
+        for i in range(quantidade):
+            produto = ProdutoTeste.objects.create(nome='Produto {}'.format(i), categoria=self.categorias[i % 3])
+            produto.etiquetas.set(self.etiquetas[:i % 3 + 1])
+            for j in range(2):
+                ComentarioTeste.objects.create(produto=produto, texto='Comentário {}.{}'.format(i, j))
+
+    def test_quantidade_fixa_de_consultas(self):
+        """A listagem executa as mesmas consultas independente da quantidade de registros"""
+        # sessão, usuário, ETag, produtos com a categoria (JOIN), etiquetas e comentários
+        self.criar_registros(2)
+        response = self.assertListQueries(self.url, 6)
+        self.assertEqual(len(response.json()), 2)
+
+        self.criar_registros(10)
+        response = self.assertListQueries(self.url, 6)
+        registros = response.json()
+        self.assertEqual(len(registros), 12)
+        registro = registros[0]
+        self.assertEqual((registro['categoria_label'], registro['categoria_nome'], registro['categoria']['nome']),
+                         ('Categoria 0', 'Categoria 0', 'Categoria 0'))
+        self.assertEqual(registro['etiquetas'], ['Etiqueta 0'])
+        self.assertEqual(len(registro['comentarios']), 2)
+
+    def test_campos_escolhidos(self):
+        """Apenas os relacionamentos dos campos escolhidos em ?fields= são carregados"""
+        self.criar_registros(4)
+        self.assertListQueries(self.url + '&fields=id,categoria_label', 4)
+        self.assertListQueries(self.url + '&fields=id,etiquetas', 5)
+        self.assertListQueries(self.url + '&fields=id,comentarios', 5)
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests')
+@mock.patch.object(sync, 'sync_safety_window', 0)
+class SyncApiTest(BaseModelTestCase):
+    client_class = APIClient
+    url = '/api/produtoteste/sync/'
+
+    def sincronizar(self, **parametros):
+        response = self.client.get(self.url, dict(parametros, format='json'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_continuacao_pelo_cursor(self):
+        """As páginas seguem pelo cursor sem repetir registros, inclusive com o mesmo updated_on"""
+        self.criar_produtos(5)
+        ProdutoTeste.objects.update(updated_on=ProdutoTeste.objects.first().updated_on)
+        nomes = []
+        paginas = []
+        pagina = self.sincronizar(since='2000-01-01T00:00:00Z', limit=2)
+        while True:
+            nomes.extend(registro['nome'] for registro in pagina['results'])
+            paginas.append((len(pagina['results']), pagina['has_more']))
+            if not pagina['has_more']:
+                break
+            pagina = self.sincronizar(cursor=pagina['cursor'], limit=2)
+        self.assertEqual(paginas, [(2, True), (2, True), (1, False)])
+        self.assertEqual(sorted(nomes), ['Produto {}'.format(i) for i in range(5)])
+
+        # sem alterações o cliente continua a partir do mesmo cursor
+        vazia = self.sincronizar(cursor=pagina['cursor'])
+        self.assertEqual((vazia['results'], vazia['deleted'], vazia['cursor']), ([], [], pagina['cursor']))
+
+        produto = ProdutoTeste.objects.get(nome='Produto 2')
+        produto.nome = 'Alterado'
+        produto.save()
+        alterada = self.sincronizar(cursor=pagina['cursor'])
+        self.assertEqual([registro['nome'] for registro in alterada['results']], ['Alterado'])
+
+    def test_registros_excluidos(self):
+        """Os registros marcados como deleted são enviados apenas com a pk"""
+        self.criar_produtos(3)
+        cursor = self.sincronizar(since='2000-01-01T00:00:00Z')['cursor']
+        produto = ProdutoTeste.objects.get(nome='Produto 1')
+        produto.delete()
+
+        pagina = self.sincronizar(cursor=cursor)
+        self.assertEqual(pagina['results'], [])
+        self.assertEqual(pagina['deleted'], [str(produto.pk)])
+
+    def test_cursor_invalido(self):
+        """O cursor inválido retorna 400 ao invés de reiniciar a sincronização"""
+        response = self.client.get(self.url, {'cursor': 'invalido', 'format': 'json'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+
+
+@override_settings(ROOT_URLCONF='nuvols.core.tests',
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PageCacheTest(BaseModelTestCase):
+
+    def test_pagina_completa_e_linhas_do_htmx(self):
+        """A página completa e as linhas do HTMX não compartilham o ETag"""
+        self.criar_produtos(3)
+        url = '/core/produtoteste/cache/'
+        pagina = self.client.get(url)
+        linhas = self.client.get(url, HTTP_HX_REQUEST='true')
+        self.assertEqual((pagina.status_code, linhas.status_code), (200, 200))
+        self.assertIn('HX-Request', pagina['Vary'])
+        self.assertNotEqual(pagina['ETag'], linhas['ETag'])
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=linhas['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=pagina['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=linhas['ETag'],
+                                         HTTP_HX_REQUEST='true').status_code, 304)
+
+    def test_listagem_com_registros_do_usuario(self):
+        """Os usuários com as mesmas permissões não compartilham os blocos das listagens com get_queryset próprio"""
+        outro = User.objects.create_superuser('outro', 'outro@teste.com', 'outro')
+        for nome in ('teste produto', 'outro produto'):
+            ProdutoTeste.objects.create(nome=nome, categoria=self.categorias[0])
+
+        for url, armazenados in (('/core/produtoteste/cache/', 1), ('/core/produtoteste/cache/usuario/', 2)):
+            with mock.patch.object(views, 'set_cached_blocks', wraps=views.set_cached_blocks) as set_cached_blocks:
+                for usuario in (self.user, outro):
+                    self.client.force_login(usuario)
+                    self.assertEqual(self.client.get(url).status_code, 200)
+            # a listagem sem get_queryset próprio é armazenada uma única vez para os dois usuários
+            self.assertEqual(set_cached_blocks.call_count, armazenados)
+
+    def test_detalhe_if_modified_since(self):
+        """O If-Modified-Since é comparado com o updated_on do registro"""
+        self.criar_produtos(1)
+        produto = ProdutoTeste.objects.get()
+        url = '/core/produtoteste/{}/'.format(produto.pk)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(int(produto.updated_on.timestamp())))
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        anterior = http_date(int(produto.updated_on.timestamp()) - 60)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=anterior).status_code, 200)
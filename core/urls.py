@@ -1,8 +1,8 @@
 from django.urls import path
 
-from nuvols.core.views import (IndexAdminTemplateView, LoginView,
-                               LogoutView, ProfileView, ProfileUpdateView, UpdatePassword,
-                               ResetPassword, SettingsView)
+from nuvols.core.views import (FacetOptionsView, IndexAdminTemplateView, LoginView,
+                               LogoutView, ProfileView, ProfileUpdateView, RelatedObjectsView,
+                               UpdatePassword, ResetPassword, SettingsView)
 
 app_name = 'core'
 urlpatterns = [
@@ -16,4 +16,6 @@ urlpatterns = [
     path('profile/update/password/',
          UpdatePassword.as_view(), name='password-update'),
     path('settings/', SettingsView.as_view(), name='settings'),
+    path('facets/', FacetOptionsView.as_view(), name='facet-options'),
+    path('related/', RelatedObjectsView.as_view(), name='related-objects'),
 ]
@@ -0,0 +1,83 @@
+"""Geração de UUIDs ordenados pelo tempo (UUIDv7) para as chaves primárias de Base.
+
+No UUIDv4 todos os bits são aleatórios, por isso cada insert cai em uma posição
+aleatória do índice da chave primária (B-tree) e a ordenação padrão por id não tem
+significado. No UUIDv7 os primeiros 48 bits são o timestamp em milissegundos, assim os
+novos registros são inseridos sempre no final do índice e a ordenação por id
+segue a ordem de criação.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+from .settings import uuid_version
+
+_lock = threading.Lock()
+_ultimo_ms = 0
+_contador = 0
+
+
+def uuid7():
+    """Gera um UUID versão 7 (timestamp em milissegundos + bits aleatórios)
+
+    Os 12 bits do rand_a são utilizados como contador dos UUIDs gerados no mesmo milissegundo,
+    garantindo que os UUIDs gerados pelo processo sejam sempre crescentes.
+
+    Returns:
+        UUID -- UUID versão 7
+    """
+    global _ultimo_ms, _contador
+    with _lock:
+        ms = int(time.time() * 1000)
+        if ms <= _ultimo_ms:
+            ms = _ultimo_ms
+            _contador += 1
+            if _contador > 0xFFF:
+                # contador esgotado no milissegundo, avança o timestamp
+                ms += 1
+                _contador = 0
+        else:
+            # inicia o contador na metade inferior para sobrar espaço no mesmo milissegundo
+            _contador = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        _ultimo_ms = ms
+        contador = _contador
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    valor = ((ms & ((1 << 48) - 1)) << 80) | (0x7 << 76) | (contador << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=valor)
+
+
+def uuid7_datetime(value):
+    """Retorna a data de criação (UTC) contida no UUIDv7 ou None caso não seja um UUIDv7"""
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(str(value))
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=timezone.utc)
+
+
+def get_uuid_default():
+    """Retorna a função utilizada como default do Base.id de acordo com o UUID_VERSION do settings"""
+    return uuid7 if uuid_version == 7 else uuid.uuid4
+
+
+def uuid_default_operations(*model_names):
+    """Método auxiliar para as migrations escritas manualmente, retorna as operações
+    que alteram o default do id dos models informados para a função configurada no settings.
+
+    A alteração do default não gera SQL, os registros existentes mantêm os seus ids e
+    apenas os novos registros passam a utilizar o UUID configurado.
+
+    Exemplo:
+        operations = uuid_default_operations('produto', 'categoria')
+
+    Returns:
+        List -- Lista de migrations.AlterField
+    """
+    return [migrations.AlterField(model_name=model_name, name='id',
+                                  field=models.UUIDField(default=get_uuid_default(), editable=False,
+                                                         primary_key=True, serialize=False))
+            for model_name in model_names]
@@ -4,11 +4,9 @@ as customizações implementadas.
 import logging
 import secrets
 import string
-from datetime import date, datetime
 from locale import normalize
 
-import pytz
-from django.conf import settings
+from django.apps import apps as django_apps
 from django.contrib import messages
 from django.contrib.auth.hashers import check_password
 from django.contrib.auth.mixins import (LoginRequiredMixin,
@@ -16,41 +14,60 @@ from django.contrib.auth.mixins import (LoginRequiredMixin,
 from django.contrib.auth.models import User
 from django.contrib.auth.views import (LoginView, LogoutView,
                                        PasswordResetCompleteView)
-from django.core.exceptions import (FieldDoesNotExist, FieldError,
-                                    ValidationError)
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldError, ValidationError
 from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor, ManyToManyDescriptor
 from django.core.mail import EmailMessage
-from django.db.models import (AutoField, ForeignKey, ManyToManyField,
+from django.db.models import (AutoField, ManyToManyField,
                               ManyToManyRel, ManyToOneRel, Q)
 from django.db.models.fields import AutoField
-from django.db.models.fields import BooleanField as BooleanFieldModel
 from django.db.models.query_utils import DeferredAttribute
-from django.forms.fields import BooleanField
+from django.forms.fields import BooleanField, DateTimeField
 from django.forms.models import inlineformset_factory
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.http.response import HttpResponseRedirect
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.urls.base import resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, urlencode
 from django.utils.text import camel_case_to_spaces, slugify
 from django.views import View
 from django.views.generic import DetailView, ListView, TemplateView
 from django.views.generic.edit import (CreateView, DeleteView, UpdateView)
 
+from .detail import (get_detail_plan, get_related_field, get_related_page,
+                     get_related_panels, has_related_permission)
+from .export import export_response
+from .facets import get_facet_options, get_facets
 from .forms import BaseForm
+from .indexes import get_registered_view, get_view_path
+from .listing import (fetch_lookup_values, fetch_many_values, get_columns,
+                      get_headers, get_query_plan,
+                      is_multi_valued_path, resolve_list_display)
+# mantido em core.views para os projetos que importam o has_fk_attr daqui
+from .listing import has_fk_attr  # noqa: F401
 from .models import Base
-from .settings import SYSTEM_NAME
+from .navigation import get_apps_user
+from .pagination import InvalidCursor, KeysetPaginator
+from .page_cache import (get_cached_blocks, get_etag, get_page_cache_key,
+                         get_related_models, has_pending_messages,
+                         render_with_blocks, set_cached_blocks)
+from .partial import (PARTIAL_BLOCKS, get_partial_mode, render_blocks,
+                      render_partial)
+from .permissions import get_perm_name, get_permission_snapshot
+from .search import get_search_backend, match_generic_search
+from .settings import SYSTEM_NAME, generic_search_index
 
 # Configurando o logger
 logger = logging.getLogger(__name__)
 
 
-def has_fk_attr(classe=None, attr=None):
-    try:
-        classe.objects.values(attr)
-    except Exception as e:
-        return False
-    return True
+def get_detail_exclude(view, obj):
+    """Retorna os campos que não devem ser exibidos no detalhe, definidos na view e no model"""
+    return tuple(view.exclude or ()) + tuple(getattr(obj, 'exclude', None) or ())
 
 
 def get_breadcrumbs(url_str):
@@ -79,45 +96,36 @@ def get_breadcrumbs(url_str):
     return breadcrumbs
 
 
+def get_model_permissions(request, model):
+    """Método para recuperar as permissões de adicionar, alterar e deletar do model
+
+    Caso o model não sobrescreva os métodos has_*_permission do Base as permissões
+    são verificadas direto no conjunto de permissões da requisição, sem instanciar o model.
+
+    Arguments:
+        request {HttpRequest} -- Requisição corrente
+        model {Model} -- Classe do model
+
+    Returns:
+        Dict -- Dicionário com as chaves has_add_permission, has_change_permission e has_delete_permission
+    """
+    nomes = ('has_add_permission', 'has_change_permission', 'has_delete_permission')
+    if all(getattr(model, nome, None) is getattr(Base, nome) for nome in nomes):
+        snapshot = get_permission_snapshot(request)
+        return {'has_add_permission': snapshot.has_add_permission(model),
+                'has_change_permission': snapshot.has_change_permission(model),
+                'has_delete_permission': snapshot.has_delete_permission(model)}
+    instancia = model()
+    return {nome: getattr(instancia, nome)(request) for nome in nomes}
+
+
 def get_apps(self):
     """Método para recuperar todas as apps
 
     Returns:
         List -- Lista com as apps que o usuário tem acesso
     """
-
-    from django.apps import apps
-    _apps = []
-    for app in apps.get_app_configs():
-        try:
-            if (app.name.lower().__contains__('django') or
-                    app.name.lower().__contains__('rest_framework') or
-                    app.name.lower().__contains__('core') or
-                    app.name.lower().__contains__('ckeditor') or
-                    app.name.lower().__contains__('corsheaders')):
-                continue
-            _models = []
-            for model in app.get_models():
-                _models.append({'name_model': model._meta.verbose_name,
-                                'url_list_model': '/{app}/{model}/'.format(
-                                    app=model._meta.app_label,
-                                    model=model._meta.model_name),
-                                'path_url': '{app}:{model}-list'.format(
-                                    app=model._meta.app_label.lower(),
-                                    model=model._meta.model_name.lower()
-                                ),
-                                'real_name_model': model._meta.model_name
-                                })
-            _apps.append({'name_app': '%s' % app.verbose_name,
-                          'models_app': _models,
-                          'index_url_app': '{}:{}-index'.format(model._meta.app_label,
-                                                                model._meta.app_label),
-                          'real_name_app': app.name,
-                          'real_name_model': model._meta.model_name})
-        except Exception as error:
-            print(error)
-            continue
-    return _apps
+    return get_apps_user(get_permission_snapshot(self.request))
 
 
 class BaseTemplateView(TemplateView):
@@ -189,6 +197,33 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     query_params_filters = []
     paginate_by = 1000
     template_name_suffix = '_list'
+    # aplica automaticamente select_related/prefetch_related/only de acordo com o list_display
+    auto_query_plan = True
+    # paginação por cursor (keyset) ao invés de OFFSET, utilizando o Meta.ordering do model e a pk
+    keyset_pagination = False
+    cursor_query_param = 'cursor'
+    # exibe a quantidade estimada de registros (PostgreSQL) na paginação por cursor
+    estimated_count = False
+    # quantidade máxima de opções carregadas com a página em cada filtro do list_filter
+    facet_limit = 50
+    # quantidade máxima de valores exibidos nas colunas ManyToMany do list_display (ex: 'a, b, c +12'),
+    # se None todos os valores são exibidos
+    list_display_many_limit = None
+    # backend de pesquisa do search_fields, se None utiliza o SEARCH_BACKEND do settings
+    search_backend_class = None
+    # exportação da listagem com a pesquisa e os filtros aplicados, ex: ?export=csv
+    export_query_param = 'export'
+    export_formats = ('csv', 'xlsx')
+    export_chunk_size = 2000
+    export_csv_delimiter = ','
+    # renderização apenas das linhas e da paginação, ex: ?_partial=rows, ?_partial=json ou cabeçalho HX-Request
+    partial_query_param = '_partial'
+    partial_mode = None
+    # armazena no cache as linhas e a paginação, ver core/page_cache.py
+    page_cache = False
+    page_cache_timeout = None
+    # o get_queryset não aplica a pesquisa e os filtros da requisição, ver get_facet_queryset
+    skip_request_filters = False
 
     def __init__(self):
         if self.template_name is None:
@@ -213,30 +248,38 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
         retorna True
         """
         perms = self.get_permission_required()
-        # o retorno usa a função any para retornar True caso tenha pelo menos uma das permissões na lista perms
-        return any(self.request.user.has_perm(perm) for perm in perms)
+        # retorna True caso tenha pelo menos uma das permissões na lista perms
+        return get_permission_snapshot(self.request).has_any_perm(perms)
+
+    def get_search_backend(self):
+        """Retorna o backend de pesquisa dos campos do search_fields, definido pelo
+        search_backend_class da view ou pelo SEARCH_BACKEND do settings
+        """
+        if self.search_backend_class is not None:
+            return self.search_backend_class(self.model, self.search_fields)
+        return get_search_backend(self.model, self.search_fields)
 
     def get_queryset(self):
         queryset = super(BaseListView, self).get_queryset()
+        field = None
 
         if ((hasattr(self.model, '_meta') and hasattr(self.model._meta, 'ordering') and self.model._meta.ordering) or
                 ((hasattr(self.model, 'Meta') and hasattr(self.model.Meta, 'ordering') and self.model.Meta.ordering))):
             queryset = queryset.order_by(
                 *(self.model._meta.ordering or self.model.Meta.ordering))
 
+        if self.skip_request_filters:
+            return queryset
+
         try:
             param_filter = self.request.GET.get('q')
             query_dict = self.request.GET
             query_params = Q()
-            for field in self.search_fields:
-                try:
-                    queryset.filter(**{"%s__icontains" % field: param_filter})
-                    query_params |= Q(**{"%s__icontains" %
-                                         field: param_filter})
-                    continue
-                except Exception as e:
-                    pass
-
+            # os campos texto são pesquisados pelo backend configurado (icontains ou texto completo)
+            backend = self.get_search_backend()
+            if param_filter:
+                query_params |= backend.get_filter(param_filter)
+            for field in backend.other_fields:
                 if hasattr(self.model, field) and field != '' and (field in ['pk', 'id'] or (field.split('__')[-1] in ['pk', 'id'])):
                     # se for um atributo de relacionamento então olha se é numero pois pk só aceita numero.
                     if not param_filter or (param_filter and param_filter.isnumeric()):
@@ -265,6 +308,11 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
 
                 elif ('content_object' == field.split('__')[0] and hasattr(self.model, 'content_object') and
                       type(getattr(self.model, 'content_object')) == GenericForeignKey):
+                    if generic_search_index:
+                        # pesquisa indexada no texto das relações genéricas, uma única consulta para todos os content types
+                        if param_filter:
+                            query_params |= Q(pk__in=match_generic_search(self.model, 'content_object', param_filter))
+                        continue
                     try:
                         # lista de objetos genericos usados pelo model
                         list_object = queryset.values(
@@ -292,12 +340,17 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
                     if hasattr(self.model, field) and type(getattr(self.model, field)) != ManyToManyDescriptor:
                         query_params |= Q(**{field: param_filter})
 
+            # caminhos que passam por relacionamentos com vários registros geram linhas repetidas
+            multi_valued = False
             if param_filter:
                 queryset = queryset.filter(query_params)
+                multi_valued = any(is_multi_valued_path(self.model, field) for field in self.search_fields)
 
             for chave, valor in query_dict.items():
                 if valor is not None and valor != 'None' and valor != '':
-                    if chave not in ['q', 'csrfmiddlewaretoken', 'page']:
+                    if chave not in ['q', 'csrfmiddlewaretoken', 'page', self.cursor_query_param,
+                                     self.export_query_param, self.partial_query_param]:
+                        multi_valued = multi_valued or is_multi_valued_path(self.model, chave)
                         not_exact = False
                         if "__not_exact" in chave:
                             not_exact = True
@@ -311,11 +364,16 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
                                 queryset = queryset.filter(
                                     **{chave: campo_date})
                             continue
+                        except ValidationError:
+                            # o valor do filtro não é uma data
+                            pass
                         except Exception as e_date:
                             logger.error('Erro: %s; No Metodo: %s' %
                                          (e_date, 'BaseListView.get_queryset()'))
                             pass
                         queryset = queryset.filter(**{chave: valor})
+            if multi_valued:
+                queryset = queryset.distinct()
             return queryset
         except FieldError as fe:
             if field:
@@ -333,138 +391,169 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
                          (e, 'BaseListView.get_queryset()'))
             return queryset.none()
 
-    def list_display_verbose_name(self):
-        list_display_verbose_name = []
-        for name in self.get_list_display():
-            try:
-                if name == '__str__':
-                    if hasattr(self.model, name) and hasattr(self.model._meta, 'verbose_name'):
-                        list_display_verbose_name.append(
-                            getattr(self.model._meta, 'verbose_name'))
-                elif '__' in name and name != '__str__' and has_fk_attr(self.model, name):
-                    list_name = name.split('__')
-                    list_name.reverse()
-                    list_display_verbose_name.append(
-                        ' '.join(list_name).title())
-                elif name != 'pk' and name != 'id':
-                    # verifica se existe auguma função feita na view e usada no display
-                    # verifica se é do tipo allow_tags
-                    # e verifica se tem o short_description para usa-lo no cabeçario da tabela do list
-                    if hasattr(self, name) and hasattr(getattr(self, name), 'allow_tags') \
-                            and getattr(self, name).allow_tags and \
-                            hasattr(getattr(self, name), 'short_description'):
-                        list_display_verbose_name.append(
-                            getattr(self, name).short_description)
-                    elif hasattr(self.model, name):
-                        field = self.model._meta.get_field(name)
-                        if hasattr(field, 'verbose_name'):
-                            verbose_name = field.verbose_name.title()
-                            list_display_verbose_name.append(verbose_name)
-                        else:
-                            list_display_verbose_name.append(name)
-                    else:
-                        list_display_verbose_name.append(name)
-                else:
-                    list_display_verbose_name.append(name)
-            except FieldDoesNotExist as e:
-                raise FieldDoesNotExist("%s não tem nenhum campo chamado '%s'" % (
-                    self.model._meta.model_name, name))
-        return list_display_verbose_name
-
-    def list_display_plural_verbose_name(self):
-        list_display_plural_verbose_name = []
-        for name in self.get_list_display():
-            try:
-                field = self.model._meta.get_field(name)
-                if name == '__str__':
-                    if hasattr(self.model, name) and hasattr(self.model._meta, 'verbose_name_plural'):
-                        list_display_plural_verbose_name.append(
-                            getattr(self.model._meta, 'verbose_name_plural'))
-                elif '__' in name and name != '__str__' and has_fk_attr(self.model, name):
-                    list_name = name.split('__')
-                    list_name.reverse()
-                    list_display_plural_verbose_name.append(
-                        ' '.join(list_name).title())
-                elif name != 'pk' and name != 'id':
-                    # verifica se existe auguma função feita na view e usada no display
-                    # verifica se é do tipo allow_tags
-                    # e verifica se tem o short_description para usa-lo no cabeçario da tabela do list
-                    if hasattr(self, name) and hasattr(getattr(self, name), 'allow_tags') \
-                            and getattr(self, name).allow_tags and \
-                            hasattr(getattr(self, name), 'short_description'):
-                        list_display_plural_verbose_name.append(
-                            getattr(self, name).short_description)
-                    elif hasattr(self.model, name):
-                        field = self.model._meta.get_field(name)
-                        if hasattr(field, 'verbose_name_plural'):
-                            verbose_name = self.model._meta.get_field(
-                                name).verbose_name_plural.title()
-                            list_display_plural_verbose_name.append(
-                                verbose_name)
-                        else:
-                            list_display_plural_verbose_name.append(name)
-                else:
-                    list_display_plural_verbose_name.append(name)
-            except FieldDoesNotExist as e:
-                raise FieldDoesNotExist("%s não tem nenhum campo chamado '%s'" % (
-                    self.model._meta.model_name, name))
-        return list_display_plural_verbose_name
+    def list_display_verbose_name(self, list_display=None):
+        """Retorna o cabeçalho (verbose_name) de cada coluna do list_display"""
+        if list_display is None:
+            list_display = self.get_list_display()
+        return get_headers(self.__class__, self.model, list_display)
+
+    def list_display_plural_verbose_name(self, list_display=None):
+        """Retorna o cabeçalho no plural (verbose_name_plural) de cada coluna do list_display"""
+        if list_display is None:
+            list_display = self.get_list_display()
+        return get_headers(self.__class__, self.model, list_display, plural=True)
 
     def get_list_display(self):
-        list_display = []
-        # define os campos padrões
-        if not self.list_display:
-            self.list_display = ['pk', '__str__']
-        # define os campos padrões
-        if self.list_display and 'pk' in self.list_display and len(self.list_display) <= 1 and hasattr(self.model,
-                                                                                                       '__str__'):
-            self.list_display += ['__str__']
-
-        # ordena para que o id sempre venha primeiro ou em segundo caso tenha o pk
-        if 'id' in self.list_display:
-            self.list_display.remove('id')
-            self.list_display = ['id'] + self.list_display
-        # ordena para que o pk sempre venha primeiro
-        if 'pk' in self.list_display:
-            self.list_display.remove('pk')
-            self.list_display = ['pk'] + self.list_display
+        """Retorna o list_display ordenado e validado. A validação é feita apenas
+        uma vez por view, as mensagens dos campos inválidos são exibidas a cada requisição
+        """
+        list_display, errors = resolve_list_display(self.__class__, self.model, self.list_display)
+        for error in errors:
+            messages.error(self.request, error, extra_tags='danger')
+        return list(list_display)
+
+    def get_columns(self, list_display):
+        """Retorna as colunas do list_display compiladas em funções especializadas
+        para renderizar cada célula da listagem
+        """
+        return get_columns(self.__class__, self.model, list_display)
+
+    def get_filters(self):
+        """Retorna as opções dos filtros do list_filter com a quantidade de registros de cada opção.
+        Os filtros com mais opções do que o facet_limit possuem has_more = True e a url_options
+        para carregar as demais opções sob demanda
+        """
+        # as listagens que sobrescrevem o get_queryset (ex: registros do usuário) sem o escopo da versão
+        # armazenam os filtros por usuário
+        scope = self.get_version_scope()
+        user = self.request.user if scope is None and self.has_custom_queryset() else None
+        view = get_view_path(type(self))
+        filters = get_facets(self.get_facet_queryset(), self.list_filter, self.facet_limit, scope=scope, user=user,
+                             view=view)
+        for filter in filters:
+            for name, facet in filter.items():
+                if facet.get('has_more'):
+                    facet['url_options'] = '{}?{}'.format(reverse('core:facet-options'), urlencode({
+                        'model': self.model._meta.label_lower, 'field': name, 'view': view}))
+        return filters
+
+    def get_facet_queryset(self):
+        """Retorna os registros utilizados nos filtros: o get_queryset da view, com as restrições
+        das subclasses (ex: registros do usuário), sem a pesquisa e os filtros da requisição
+        """
+        self.skip_request_filters = True
+        try:
+            return self.get_queryset()
+        finally:
+            self.skip_request_filters = False
+
+    def has_custom_queryset(self):
+        """Verifica se a view sobrescreve o get_queryset, que pode limitar os registros ao usuário"""
+        return type(self).get_queryset is not BaseListView.get_queryset
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get(self.export_query_param)
+        if export_format in self.export_formats:
+            return self.export(export_format)
+        self.partial_mode = get_partial_mode(request, self.partial_query_param)
+        if self.page_cache and self.partial_mode != 'json':
+            return self.get_cached_response(request)
+        if self.partial_mode:
+            self.object_list = self.get_queryset()
+            return render_partial(self, self.get_context_data() or {}, self.partial_mode)
+        return super(BaseListView, self).get(request, *args, **kwargs)
+
+    def get_version_scope(self):
+        """Escopo da versão do model utilizado no page_cache (ex: empresa do usuário), ver core/cache.py"""
+        return None
+
+    def get_cached_response(self, request):
+        """Retorna a listagem utilizando os blocos das linhas e da paginação armazenados no cache,
+        as requisições condicionais (If-None-Match) sem alterações recebem 304
+        """
+        # as linhas vindas do cache não executam a consulta da listagem
+        self.object_list = self.model._default_manager.none()
+        template_names = self.get_template_names()
+        # as listagens que sobrescrevem o get_queryset (ex: registros do usuário) sem o escopo da versão
+        # armazenam os blocos por usuário, como os filtros (get_filters)
+        scope = self.get_version_scope()
+        user = request.user if scope is None and self.has_custom_queryset() else None
+        key = get_page_cache_key(request, template_names, get_related_models(self.model),
+                                 ignore=(self.export_query_param, self.partial_query_param),
+                                 scope=scope, partial_mode=self.partial_mode, user=user)
+        etag = get_etag(request, key)
+        if not has_pending_messages(request):
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                patch_vary_headers(not_modified, ['HX-Request', 'HX-Boosted'])
+                return not_modified
+
+        blocks = get_cached_blocks(key)
+        if blocks is None:
+            self.object_list = self.get_queryset()
+            context = self.get_context_data() or {}
+            blocks = render_blocks(template_names, PARTIAL_BLOCKS, context, request)
+            # apenas os templates com todos os blocos são armazenados
+            if len(blocks) == len(PARTIAL_BLOCKS):
+                set_cached_blocks(key, blocks, self.page_cache_timeout)
+        elif self.partial_mode:
+            context = None
+        else:
+            context = self.get_context_data() or {}
+
+        if self.partial_mode:
+            response = HttpResponse(render_to_string('core/block/list_partial.html', blocks))
         else:
-            self.list_display = ['pk'] + self.list_display
-
-        # faz a checagem dos campos
-        for name in self.list_display:
-            # verifica casos onde pega campos dos filhos ex: pai__name
-            if '__' in name and name != '__str__' and not has_fk_attr(self.model, name):
-                messages.error(self.request, "%s ou a View não tem nenhum campo chamado '%s'" % (
-                    self.model._meta.model_name, name),
-                               extra_tags='danger')
-            elif not '__' in name and not hasattr(self.model, name) and not hasattr(self, name):
-                messages.error(self.request,
-                               "%s ou a View não tem nenhum campo chamado '%s'" % (
-                                   self.model._meta.model_name, name),
-                               extra_tags='danger')
-                continue
-            elif not '__' in name and not hasattr(self.model, name) and hasattr(self, name) and (
-                    not hasattr(getattr(self, name), 'allow_tags') or
-                    (hasattr(getattr(self, name), 'allow_tags') and not getattr(self, name).allow_tags)):
-                messages.error(self.request,
-                               "%s não tem nenhum campo chamado '%s'" % (
-                                   self.model._meta.model_name, name),
-                               extra_tags='danger')
-                continue
-
-            if not name in list_display:
-                list_display.append(name)
-        return list_display
+            response = HttpResponse(render_with_blocks(template_names, context, blocks, request))
+        response['ETag'] = etag
+        # os caches intermediários não podem devolver as linhas do HTMX no lugar da página completa
+        patch_vary_headers(response, ['HX-Request', 'HX-Boosted'])
+        return response
+
+    def export(self, export_format):
+        """Retorna o arquivo (CSV ou XLSX) com todos os registros da listagem, utilizando
+        a mesma pesquisa, filtros e colunas do list_display, gerado sob demanda
+        """
+        self.object_list = self.get_queryset()
+        return export_response(self, self.object_list, self.get_list_display(), export_format,
+                               chunk_size=self.export_chunk_size)
+
+    def get_query_plan(self, list_display):
+        """Retorna o plano de consulta (select_related, prefetch_related e only)
+        utilizado para carregar os registros exibidos na listagem
+        """
+        return get_query_plan(self.model, list_display)
+
+    def paginate_queryset(self, queryset, page_size):
+        """Pagina a queryset por cursor quando keyset_pagination estiver habilitado,
+        caso contrário utiliza a paginação padrão do ListView
+        """
+        if not self.keyset_pagination:
+            return super(BaseListView, self).paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, estimated_count=self.estimated_count)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_query_param))
+        except InvalidCursor:
+            # cursor alterado manualmente ou de uma ordenação antiga, retorna para a primeira página
+            page = paginator.page()
+        return (paginator, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs):
         try:
+            list_display = self.get_list_display()
+            # colunas do list_display compiladas uma única vez por view
+            columns = self.get_columns(list_display)
+            # com o limite as colunas ManyToMany são recuperadas pelo fetch_many_values ao invés do prefetch_related
+            many = [column.name for column in columns if column.many] if self.list_display_many_limit else []
+            if self.auto_query_plan and kwargs.get('object_list') is None:
+                kwargs['object_list'] = self.get_query_plan(list_display).apply(self.object_list,
+                                                                                skip_prefetch=many)
             # se colocar o do super da erro de paginação
             # context = super().get_context_data(**kwargs)
             context = super(BaseListView, self).get_context_data(**kwargs)
             context['user_ip'] = self.request.META.get(
                 'HTTP_X_FORWARDED_FOR') or self.request.META.get('REMOTE_ADDR')
-            context['display'] = self.list_display_verbose_name()
+            context['display'] = self.list_display_verbose_name(list_display)
 
             # processa os parametros para retorna-los ao template
             query_params = dict(self.request.GET)
@@ -472,6 +561,12 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
                 # retira o parametro page e add ele em outra variavel, apensas dele
                 if query_params.get('page'):
                     query_params.pop('page')
+                if query_params.get(self.cursor_query_param):
+                    query_params.pop(self.cursor_query_param)
+                if query_params.get(self.export_query_param):
+                    query_params.pop(self.export_query_param)
+                if query_params.get(self.partial_query_param):
+                    query_params.pop(self.partial_query_param)
                 # retira o csrf token caso exista
                 if query_params.get('csrfmiddlewaretoken'):
                     query_params.pop('csrfmiddlewaretoken')
@@ -488,76 +583,32 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
                 # O apos todas as verificações sobram os filtros que são add em outra variavel no context apenas dele.
                 context['query_params_filters'] = query_params
 
-            # manipulo a lista para tratar de forma diferente
-            list_item = []
-            for obj in context['object_list']:
+            object_list = list(context['object_list'])
 
-                field_dict = {}
+            if self.keyset_pagination and context.get('page_obj'):
+                context['next_cursor'] = context['page_obj'].next_cursor
+                context['previous_cursor'] = context['page_obj'].previous_cursor
+                context['estimated_count'] = context['page_obj'].count
 
-                obj._meta.get_fields(include_parents=True)
+            # recupera em uma única consulta os valores dos campos de relacionamento (ex: pai__nome) da página
+            pks = [obj.pk for obj in object_list]
+            lookups = [column.name for column in columns if column.lookup]
+            lookup_values = fetch_lookup_values(self.model, pks, lookups)
+            # uma consulta por coluna ManyToMany, limitada a list_display_many_limit valores por registro
+            for pk, valores in fetch_many_values(self.model, pks, many, self.list_display_many_limit).items():
+                lookup_values.setdefault(pk, {}).update(valores)
 
-                # percorre os atributos setados no list_display
-                for field_display in self.get_list_display():
+            # manipulo a lista para tratar de forma diferente
+            list_item = []
+            for obj in object_list:
+                field_dict = {}
+                # percorre as colunas compiladas do list_display
+                for column in columns:
                     try:
-                        if '__' in field_display and field_display != '__str__' and has_fk_attr(obj.__class__,
-                                                                                                field_display):
-                            lista_fk = context['object_list'].values(
-                                'id', field_display)
-                            for item_fk in lista_fk:
-                                if item_fk['id'] == obj.id:
-                                    field_dict[field_display] = "{}".format(
-                                        item_fk[field_display])
-                        elif hasattr(obj, field_display) and field_display != '__str__':
-                            # verifica se o campo não é None se sim entra no if
-                            if obj.__getattribute__(field_display) is not None:
-                                # Verificando se o campo possui o metodo do CHOICE
-                                str_metodo_choice = 'get_{nome}_display'.format(
-                                    nome=field_display)
-                                if hasattr(obj, str_metodo_choice):
-                                    field_dict[field_display] = "{}".format(
-                                        getattr(obj, str_metodo_choice)().__str__())
-                                else:
-                                    if type(getattr(obj, field_display)) == datetime:
-                                        campo_date_time = getattr(
-                                            obj, field_display)
-                                        tz = pytz.timezone(settings.TIME_ZONE)
-                                        date_tz = tz.normalize(campo_date_time)
-                                        field_dict[field_display] = "{}".format(
-                                            date_tz.strftime(settings.DATETIME_INPUT_FORMATS[0] or
-                                                             "%d/%m/%Y %H:%M"))
-                                    elif type(getattr(obj, field_display)) == date:
-                                        field_dict[field_display] = "{}".format(
-                                            getattr(obj, field_display).strftime(settings.DATE_INPUT_FORMATS[0] or
-                                                                                 "%d/%m/%Y"))
-                                    #     verifica se é um ManyToMany
-                                    elif hasattr(getattr(obj, field_display), 'all'):
-                                        list_many = []
-                                        # pega uma string feita com o str de cada objeto da lista
-                                        for sub_obj in getattr(obj, field_display).all():
-                                            list_many.append(
-                                                '{}'.format(sub_obj))
-                                        field_dict[field_display] = ', '.join(
-                                            list_many)
-                                    else:
-                                        field_dict[field_display] = "{}".format(
-                                            getattr(obj, field_display).__str__())
-                            else:
-                                # no caso de campos None ele coloca para aparecer vasio
-                                field_dict[field_display] = ""
-                        elif field_display == '__str__':
-                            field_dict[field_display] = "{}".format(
-                                getattr(obj, field_display)())
-
-                        elif hasattr(self, field_display) and self.__getattribute__(
-                                field_display) and field_display != '__str__':
-                            # elif verifica se existe auguma função feita na view e usada no display
-                            # elif verifica se é do tipo allow_tags
-                            # elif então usa o retorno da função para aparecer na lista
-                            field_dict[field_display] = getattr(
-                                self, field_display)(obj)
+                        field_dict[column.name] = column.render(self, obj, lookup_values)
                     except Exception as e:
                         logger.error(e)
-                        messages.error(self.request, "Erro com o campo '%s' no model '%s'!" % (field_display, str(obj)),
+                        messages.error(self.request, "Erro com o campo '%s' no model '%s'!" % (column.name, str(obj)),
                                        extra_tags='danger')
                         continue
                 list_item.append(field_dict)
@@ -566,63 +617,8 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
             context['object_list'] = list_item
             context['system_name'] = SYSTEM_NAME
 
-            object_filters = []
-            # Refatorar para não precisar pecorrer os itens duas vezes
-            for field in self.model._meta.fields:
-                if field.name in self.list_filter:
-                    # o label do choices.
-                    filter = {}
-                    # variavel para ficar no label do campo
-                    label_name = ' '.join(str(field.name).split('_')).title()
-                    if hasattr(field, 'verbose_name') and field.verbose_name:
-                        label_name = field.verbose_name
-                    # Verificando se o campo e relacionamento
-                    if isinstance(field, ForeignKey):
-                        filter[field.name] = {'label': label_name, 'list': field.related_model.objects.distinct(),
-                                              'type_filter': 'ForeignKey'}
-                    # Verificando se o campo eh booleano
-                    elif isinstance(field, BooleanFieldModel):
-                        filter[field.name] = {'label': label_name, 'list': ['True', 'False'],
-                                              'type_filter': 'BooleanFieldModel'}
-                    elif isinstance(field, DateField) or isinstance(field, DateTimeField):
-                        # cria um choice list com  os operadores que poderá usar
-                        choice_date_list = []
-                        choice_date_list.append(
-                            {'choice_id': '__exact', 'choice_label': 'Igual'})
-                        choice_date_list.append(
-                            {'choice_id': '__not_exact', 'choice_label': 'Diferente'})
-                        choice_date_list.append(
-                            {'choice_id': '__lt', 'choice_label': 'Menor que'})
-                        choice_date_list.append(
-                            {'choice_id': '__gt', 'choice_label': 'Maior que'})
-                        choice_date_list.append(
-                            {'choice_id': '__lte', 'choice_label': 'Menor Igual a'})
-                        choice_date_list.append(
-                            {'choice_id': '__gte', 'choice_label': 'Maior Igual a'})
-
-                        filter[field.name] = {'label': label_name, 'list': choice_date_list,
-                                              'type_filter': str(type(field))[:-2].split('.')[-1]}
-                    else:
-                        # Verificando se o campo possui o atributo CHOICE
-                        if hasattr(field, 'choices') and len(getattr(field, 'choices')) > 0 \
-                                and hasattr(field, 'flatchoices') and len(getattr(field, 'flatchoices')) > 0:
-                            choice_list = []
-                            for choice in getattr(field, 'flatchoices'):
-                                item = {
-                                    'choice_id': choice[0], 'choice_label': choice[1]}
-                                choice_list.append(item)
-                            filter[field.name] = {'label': label_name, 'list': choice_list,
-                                                  'type_filter': 'ChoiceField'}
-                        else:
-                            # ele ja faz o distinct e ordena de acordo com o nome do campo
-                            # add um dicionario com o nome do label, lista do filtro e o tipo de campo
-                            filter[field.name] = {'label': label_name, 'list': self.get_queryset().
-                                values_list(field.name, flat=True).order_by(
-                                field.attname).distinct(field.attname),
-                                                  'type_filter': str(type(field))[:-2].split('.')[-1]}
-                    object_filters.append(filter)
-
-            context['filters'] = object_filters
+            context['export_formats'] = self.export_formats
+            context['export_query_param'] = self.export_query_param
 
             context['url_create'] = '{app}:{model}-create'.format(app=self.model._meta.app_label,
                                                                   model=self.model._meta.model_name)
@@ -635,20 +631,17 @@ class BaseListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
             context['url_list'] = '{app}:{model}-list'.format(app=self.model._meta.app_label,
                                                               model=self.model._meta.model_name)
 
-            url_str = reverse(context['url_list']) + ' Listar'
-
-            context['breadcrumbs'] = get_breadcrumbs(url_str)
-
             context['model_name'] = '%s' % (
                     self.model._meta.verbose_name_plural or self.model._meta.object_name).title()
-            context['apps'] = get_apps(self)
 
-            context['has_add_permission'] = self.model(
-            ).has_add_permission(self.request)
-            context['has_change_permission'] = self.model(
-            ).has_change_permission(self.request)
-            context['has_delete_permission'] = self.model(
-            ).has_delete_permission(self.request)
+            # na renderização parcial apenas as linhas e a paginação são devolvidas
+            if not self.partial_mode:
+                context['filters'] = self.get_filters()
+                url_str = reverse(context['url_list']) + ' Listar'
+                context['breadcrumbs'] = get_breadcrumbs(url_str)
+                context['apps'] = get_apps(self)
+
+            context.update(get_model_permissions(self.request, self.model))
 
             return context
 
@@ -671,6 +664,20 @@ class BaseDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
     model = Base
     exclude = []
     template_name_suffix = '_detail'
+    # quantidade máxima de registros exibidos de cada relacionamento (ManyToMany e ForeignKey reverso)
+    related_limit = 20
+    # armazena no cache o bloco detail_body, ver core/page_cache.py
+    page_cache = False
+    page_cache_timeout = None
+    page_cache_blocks = None
+
+    def get_queryset(self):
+        """Carrega junto com o registro as ForeignKey e OneToOne exibidas na página"""
+        queryset = super(BaseDetailView, self).get_queryset()
+        select_related = get_detail_plan(queryset.model, self.exclude).select_related
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        return queryset
 
     def get_template_names(self):
         if self.template_name:
@@ -693,16 +700,71 @@ class BaseDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
         retorna True
         """
         perms = self.get_permission_required()
-        # o retorno usa a função any para retornar True caso tenha pelo menos uma das permissões na lista perms
-        return any(self.request.user.has_perm(perm) for perm in perms)
+        # retorna True caso tenha pelo menos uma das permissões na lista perms
+        return get_permission_snapshot(self.request).has_any_perm(perms)
+
+    def get(self, request, *args, **kwargs):
+        if not self.page_cache:
+            return super(BaseDetailView, self).get(request, *args, **kwargs)
+        return self.get_cached_response(request)
+
+    def get_version_scope(self):
+        """Escopo da versão do model utilizado no page_cache (ex: empresa do usuário), ver core/cache.py"""
+        return None
+
+    def get_cached_response(self, request):
+        """Retorna o detalhe utilizando o bloco detail_body armazenado no cache,
+        as requisições condicionais (If-None-Match ou If-Modified-Since) sem alterações recebem 304
+        """
+        template_names = self.get_template_names()
+        key = get_page_cache_key(request, template_names, get_related_models(self.model),
+                                 scope=self.get_version_scope())
+        etag = get_etag(request, key)
+        self.object = None
+        if not has_pending_messages(request):
+            last_modified = None
+            if request.META.get('HTTP_IF_MODIFIED_SINCE') and not request.META.get('HTTP_IF_NONE_MATCH'):
+                # o registro só é consultado quando o cliente não envia o ETag
+                self.object = self.get_object()
+                last_modified = self.get_last_modified(self.object)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+
+        if self.object is None:
+            self.object = self.get_object()
+        self.page_cache_blocks = get_cached_blocks(key)
+        context = self.get_context_data(object=self.object)
+        blocks = self.page_cache_blocks
+        if blocks is None:
+            blocks = render_blocks(template_names, ('detail_body',), context, request)
+            if blocks:
+                set_cached_blocks(key, blocks, self.page_cache_timeout)
+        response = HttpResponse(render_with_blocks(template_names, context, blocks, request))
+        response['ETag'] = etag
+        last_modified = self.get_last_modified(self.object)
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_last_modified(self, obj):
+        """Data da última alteração do registro em segundos (timestamp), utilizada no Last-Modified"""
+        updated_on = getattr(obj, 'updated_on', None)
+        return int(updated_on.timestamp()) if updated_on else None
 
     def get_context_data(self, **kwargs):
         context = super(BaseDetailView, self).get_context_data(**kwargs)
-        object_list, many_fields = self.object.get_all_related_fields()
         context['user_ip'] = self.request.META.get(
             'HTTP_X_FORWARDED_FOR') or self.request.META.get('REMOTE_ADDR')
-        context['object_list'] = object_list
-        context['many_fields'] = many_fields
+        if self.page_cache_blocks is None:
+            object_list, many_fields = self.object.get_all_related_fields(
+                get_detail_exclude(self, self.object), self.related_limit)
+            context['object_list'] = object_list
+            context['many_fields'] = many_fields
+            context['related_panels'] = get_related_panels(self.object, get_detail_exclude(self, self.object),
+                                                          get_permission_snapshot(self.request))
+        context['related_model_label'] = self.model._meta.label_lower
+        context['related_view'] = get_view_path(type(self))
         context['system_name'] = SYSTEM_NAME
         context['url_create'] = '{app}:{model}-create'.format(app=self.model._meta.app_label,
                                                               model=self.model._meta.model_name)
@@ -724,12 +786,7 @@ class BaseDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
                 self.model._meta.verbose_name or self.model._meta.object_name or '').title()
         context['apps'] = get_apps(self)
 
-        context['has_add_permission'] = self.model(
-        ).has_add_permission(self.request)
-        context['has_change_permission'] = self.model(
-        ).has_change_permission(self.request)
-        context['has_delete_permission'] = self.model(
-        ).has_delete_permission(self.request)
+        context.update(get_model_permissions(self.request, self.model))
 
         return context
 
@@ -800,12 +857,7 @@ class BaseUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
                 self.model._meta.verbose_name_plural or self.model._meta.object_name or '').title()
         context['apps'] = get_apps(self)
 
-        context['has_add_permission'] = self.model(
-        ).has_add_permission(self.request)
-        context['has_change_permission'] = self.model(
-        ).has_change_permission(self.request)
-        context['has_delete_permission'] = self.model(
-        ).has_delete_permission(self.request)
+        context.update(get_model_permissions(self.request, self.model))
 
         return context
 
@@ -817,7 +869,9 @@ class BaseUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
         formset_inlines = []
         if hasattr(self, 'inlines') and self.inlines:
             for item in self.inlines:
-                if item.model().has_change_permission(self.request):
+                # instancia o model do inline apenas uma vez para verificar as permissões
+                inline_model = item.model()
+                if inline_model.has_change_permission(self.request):
                     if self.request.POST:
                         formset = item(self.request.POST, self.request.FILES, instance=self.object,
                                        prefix=item.model._meta.model_name)
@@ -826,12 +880,12 @@ class BaseUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
                                        prefix=item.model._meta.model_name)
                     lista_instance_inline = formset.queryset.all() or []
                     # só seta True caso os valores definidos na permissão do usuario e o can_delete do inlineformset_factory seja True
-                    formset.can_delete = item.model().has_delete_permission(
+                    formset.can_delete = inline_model.has_delete_permission(
                         self.request) and item.can_delete
                     if not formset.can_delete:
                         # se não tem permisão de excluir, então seta o valor minimo para 0
                         formset.min_num = 0
-                    if not item.model().has_add_permission(self.request):
+                    if not inline_model.has_add_permission(self.request):
                         # se não tem permisão de adcionar, então seta o valor minimo para 0
                         formset.max_num = 0
                     if hasattr(formset, 'prefix') and formset.prefix:
@@ -957,12 +1011,7 @@ class BaseCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
                 self.model._meta.verbose_name_plural or self.model._meta.object_name or '').title()
         context['apps'] = get_apps(self)
 
-        context['has_add_permission'] = self.model(
-        ).has_add_permission(self.request)
-        context['has_change_permission'] = self.model(
-        ).has_change_permission(self.request)
-        context['has_delete_permission'] = self.model(
-        ).has_delete_permission(self.request)
+        context.update(get_model_permissions(self.request, self.model))
 
         return context
 
@@ -985,7 +1034,9 @@ class BaseCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
         formset_inlines = []
         if hasattr(self, 'inlines') and self.inlines:
             for item in self.inlines:
-                if item.model().has_change_permission(self.request):
+                # instancia o model do inline apenas uma vez para verificar as permissões
+                inline_model = item.model()
+                if inline_model.has_change_permission(self.request):
                     if self.request.POST:
                         formset = item(self.request.POST, self.request.FILES, instance=self.object,
                                        prefix=item.model._meta.model_name)
@@ -993,10 +1044,10 @@ class BaseCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
                         formset = item(instance=self.object,
                                        prefix=item.model._meta.model_name)
                     lista_instance_inline = formset.queryset.all() or []
-                    formset.can_delete = item.model().has_delete_permission(self.request)
+                    formset.can_delete = inline_model.has_delete_permission(self.request)
                     if not formset.can_delete:
                         formset.min_num = len(lista_instance_inline)
-                    if not item.model().has_add_permission(self.request):
+                    if not inline_model.has_add_permission(self.request):
                         formset.max_num = len(lista_instance_inline)
                     if hasattr(formset, 'prefix') and formset.prefix:
                         # pode ser colocado o user aqui para utilizar na validação do forms
@@ -1050,11 +1101,22 @@ class BaseDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
     """
 
     model = Base
+    exclude = []
     template_name_suffix = '_confirm_delete'
+    # quantidade máxima de registros exibidos de cada relacionamento (ManyToMany e ForeignKey reverso)
+    related_limit = 20
 
     def __init__(self):
         super(BaseDeleteView, self).__init__()
 
+    def get_queryset(self):
+        """Carrega junto com o registro as ForeignKey e OneToOne exibidas na página"""
+        queryset = super(BaseDeleteView, self).get_queryset()
+        select_related = get_detail_plan(queryset.model, self.exclude).select_related
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        return queryset
+
     def get_template_names(self):
         if self.template_name:
             return [self.template_name, ]
@@ -1087,9 +1149,14 @@ class BaseDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
         context = super(BaseDeleteView, self).get_context_data(**kwargs)
         context['user_ip'] = self.request.META.get(
             'HTTP_X_FORWARDED_FOR') or self.request.META.get('REMOTE_ADDR')
-        object_list, many_fields = self.object.get_all_related_fields()
+        object_list, many_fields = self.object.get_all_related_fields(
+            get_detail_exclude(self, self.object), self.related_limit)
         context['object_list'] = object_list
         context['many_fields'] = many_fields
+        context['related_panels'] = get_related_panels(self.object, get_detail_exclude(self, self.object),
+                                                          get_permission_snapshot(self.request))
+        context['related_model_label'] = self.model._meta.label_lower
+        context['related_view'] = get_view_path(type(self))
         context['system_name'] = SYSTEM_NAME
 
         context['url_create'] = '{app}:{model}-create'.format(app=self.model._meta.app_label,
@@ -1112,16 +1179,100 @@ class BaseDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
                 self.model._meta.verbose_name_plural or self.model._meta.object_name or '').title()
         context['apps'] = get_apps(self)
 
-        context['has_add_permission'] = self.model(
-        ).has_add_permission(self.request)
-        context['has_change_permission'] = self.model(
-        ).has_change_permission(self.request)
-        context['has_delete_permission'] = self.model(
-        ).has_delete_permission(self.request)
+        context.update(get_model_permissions(self.request, self.model))
 
         return context
 
 
+class FacetOptionsView(LoginRequiredMixin, View):
+    """Retorna em JSON as opções de um filtro do list_filter, utilizado para carregar
+    sob demanda as opções dos filtros com mais opções do que o facet_limit da listagem
+
+    Parâmetros:
+        model -- app_label.model_name
+        field -- Nome do campo do list_filter
+        view -- Identificador da listagem que exibiu o filtro (ver indexes.get_view_path)
+        q -- Termo para filtrar as opções (opcional)
+        offset -- Quantidade de opções ignoradas (opcional)
+    """
+    limit = 50
+
+    def get(self, request, *args, **kwargs):
+        try:
+            model = django_apps.get_model(request.GET.get('model', ''))
+        except (LookupError, ValueError):
+            raise Http404('Model não encontrado.')
+        name = request.GET.get('field')
+
+        # apenas os campos do list_filter da listagem que exibiu o filtro podem ser consultados
+        view_class = get_registered_view(request.GET.get('view'), BaseListView)
+        if view_class is None or view_class.model is not model or name not in view_class.list_filter:
+            raise Http404('Filtro não encontrado.')
+        snapshot = get_permission_snapshot(request)
+        if not snapshot.has_any_perm([get_perm_name(model, action) for action in ('add', 'change', 'delete')]):
+            return JsonResponse({'detail': 'Sem permissão.'}, status=403)
+
+        # as opções são calculadas sobre os registros da listagem (ex: apenas os registros do usuário)
+        view = view_class()
+        view.setup(request, *args, **kwargs)
+        try:
+            offset = max(int(request.GET.get('offset', 0)), 0)
+        except ValueError:
+            offset = 0
+        options, has_more = get_facet_options(view.get_facet_queryset(), model._meta.get_field(name),
+                                              limit=self.limit, offset=offset, term=request.GET.get('q'))
+        return JsonResponse({'results': [option.as_dict() for option in options], 'has_more': has_more,
+                             'next_offset': offset + len(options) if has_more else None})
+
+
+class RelatedObjectsView(LoginRequiredMixin, View):
+    """Retorna em JSON uma página dos registros de um relacionamento, utilizado pelos
+    painéis das páginas de detalhe e exclusão para carregar os registros sob demanda
+
+    Parâmetros:
+        model -- app_label.model_name
+        pk -- pk do registro
+        relation -- Nome do relacionamento (ex: filho_set)
+        view -- Identificador da view de detalhe ou exclusão que exibiu o painel (ver indexes.get_view_path)
+        page -- Número da página (opcional)
+    """
+    per_page = 20
+
+    def get(self, request, *args, **kwargs):
+        try:
+            model = django_apps.get_model(request.GET.get('model', ''))
+        except (LookupError, ValueError):
+            raise Http404('Model não encontrado.')
+        # o registro e os relacionamentos são os da view que exibiu o painel (get_queryset, exclude e permissões)
+        view_class = get_registered_view(request.GET.get('view'), (BaseDetailView, BaseDeleteView))
+        if view_class is None or view_class.model is not model:
+            raise Http404('View não encontrada.')
+        view = view_class()
+        view.setup(request, pk=request.GET.get('pk'))
+        if not view.has_permission():
+            return JsonResponse({'detail': 'Sem permissão.'}, status=403)
+        snapshot = get_permission_snapshot(request)
+        try:
+            obj = view.get_object()
+            exclude = get_detail_exclude(view, obj)
+            field = get_related_field(model, request.GET.get('relation'), exclude)
+        except (ValidationError, ValueError):
+            raise Http404('Registro não encontrado.')
+        except LookupError:
+            raise Http404('Relacionamento não encontrado.')
+        # os registros do relacionamento exigem a permissão no model relacionado
+        if not has_related_permission(snapshot, field):
+            return JsonResponse({'detail': 'Sem permissão.'}, status=403)
+
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        items, has_next = get_related_page(obj, field.name, page, self.per_page, exclude)
+        return JsonResponse({'results': [{'id': str(item.pk), 'label': str(item)} for item in items],
+                             'page': page, 'next_page': page + 1 if has_next else None})
+
+
 class LoginView(LoginView):
     redirect_authenticated_user = True
     template_name = 'core/registration/login.html'